@@ -0,0 +1,319 @@
+import asyncio, math, threading, time
+import chess, chess.engine
+
+# arrow colours for the first, second, third... line, the best line is the most opaque
+ARROW_COLORS = [(20, 150, 60, 190), (30, 110, 200, 150), (200, 140, 20, 130), (150, 60, 180, 120), (120, 120, 120, 110)]
+PV_PLIES = 6
+# queued instead of a board to stop the search
+STOP = "stop"
+
+
+# one principal variation as the UI sees it: score from white's point of view and the moves
+class AnalysisLine:
+
+    def __init__(self, rank, score, pv, depth):
+        self.rank = rank
+        self.score = score
+        self.pv = pv
+        self.depth = depth
+
+
+# background analysis of the position on the board with a second UCI engine, through
+# python-chess's streaming analysis() iterator ("go infinite" with MultiPV).
+#
+# the engine process is started once. a new position stops the running search and starts
+# another one on the same process, and positions that arrive while it is switching are
+# collapsed into the newest. the engine thread only overwrites the latest line per rank, so a
+# flood of info lines costs the pygame loop nothing: on_update is called at most once every
+# `interval` seconds, and the overlay reads the lines when it is woken up.
+
+class AnalysisEngine:
+
+    def __init__(self, command, lines=3, options=None, interval=0.25, on_update=None):
+        self.command = command
+        self.lines = lines
+        self.options = dict(options or {})
+        self.interval = interval
+        self.on_update = on_update
+
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="analysis-loop", daemon=True)
+        self.protocol = None
+        self.transport = None
+        self.switch = None
+        self.analysis = None
+        self.reader = None
+        # the next board to analyse or STOP, None once the switch is done
+        self.pending = None
+
+        # written by the engine thread, read by the pygame loop
+        self.lock = threading.Lock()
+        self.fen = None
+        self.latest = {}
+        self.version = 0
+        self.notify_handle = None
+        self.notified_at = 0.0
+
+    # spawns the engine and blocks until it answered uci/isready
+    def start(self, timeout=10):
+        self.thread.start()
+        future = asyncio.run_coroutine_threadsafe(self.open(), self.loop)
+        try:
+            future.result(timeout)
+        except BaseException:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            raise
+        return self
+
+    async def open(self):
+        self.transport, self.protocol = await chess.engine.popen_uci(self.command)
+        if self.options:
+            await self.protocol.configure(self.options)
+        self.switch = asyncio.Lock()
+
+    # analyses board from now on, never blocks
+    def set_position(self, board):
+        self.pending = board.copy()
+        asyncio.run_coroutine_threadsafe(self.restart(), self.loop)
+
+    # stops searching, the engine process stays up for the next set_position()
+    def stop(self):
+        self.pending = STOP
+        asyncio.run_coroutine_threadsafe(self.restart(), self.loop)
+
+    # version, fen and lines (best first) of the newest results
+    def snapshot(self):
+        with self.lock:
+            return self.version, self.fen, [self.latest[rank] for rank in sorted(self.latest)]
+
+    def quit(self):
+        if not self.thread.is_alive():
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(self.shutdown(), self.loop).result(5)
+        except Exception as e:
+            print("Analysis engine shutdown failed:", e)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(5)
+
+    async def shutdown(self):
+        self.pending = STOP
+        await self.restart()
+        if self.protocol is not None:
+            await self.protocol.quit()
+
+    async def restart(self):
+        async with self.switch:
+            board, self.pending = self.pending, None
+            if board is None:
+                return
+            await self.stop_search()
+            if board is STOP:
+                self.publish(None)
+                return
+            self.publish(board.fen())
+            if board.is_game_over():
+                return
+            self.analysis = await self.protocol.analysis(
+                board, multipv=self.lines, info=chess.engine.INFO_SCORE | chess.engine.INFO_PV)
+            self.reader = asyncio.create_task(self.read(self.analysis, board))
+
+    async def stop_search(self):
+        analysis, reader = self.analysis, self.reader
+        self.analysis = self.reader = None
+        if analysis is not None:
+            analysis.stop()
+            try:
+                await analysis.wait()
+            except Exception:
+                pass
+        if reader is not None:
+            await reader
+
+    async def read(self, analysis, board):
+        try:
+            async for info in analysis:
+                if "pv" not in info or "score" not in info:
+                    continue
+                rank = info.get("multipv", 1)
+                line = AnalysisLine(rank, info["score"].white(), tuple(info["pv"][:PV_PLIES]), info.get("depth"))
+                with self.lock:
+                    self.latest[rank] = line
+                    self.version += 1
+                self.changed()
+        except chess.engine.AnalysisComplete:
+            pass
+        except Exception as e:
+            print("Analysis failed:", e)
+
+    # clears the lines for a new position (or none)
+    def publish(self, fen):
+        with self.lock:
+            self.fen = fen
+            self.latest = {}
+            self.version += 1
+        self.changed()
+
+    # wakes the UI now, or once the interval since the last wake-up has passed
+    def changed(self):
+        if self.notify_handle is not None:
+            return
+        delay = self.notified_at + self.interval - time.perf_counter()
+        if delay <= 0:
+            self.notify()
+        else:
+            self.notify_handle = self.loop.call_later(delay, self.notify)
+
+    def notify(self):
+        self.notify_handle = None
+        self.notified_at = time.perf_counter()
+        if self.on_update is not None:
+            self.on_update()
+
+
+# white's share of the eval bar, 0.5 for an equal position
+def bar_fraction(score):
+    if score.is_mate():
+        return 1.0 if score.mate() > 0 else 0.0
+    return 1 / (1 + math.exp(-score.score() / 250))
+
+
+def format_score(score):
+    if score.is_mate():
+        return f"#{score.mate()}"
+    return f"{score.score() / 100:+.2f}"
+
+
+# evaluation bar at the left edge, an arrow per line and the lines as text in the bottom left
+# corner. same protocol as the other overlays: update() rebuilds it only when the analysis has
+# new results, so the board under it is repainted at most at the engine's notify rate.
+# board is the board on screen, lines the analysis found for an older position are not shown.
+# analysis can be set later, once its engine is up.
+
+class AnalysisOverlay:
+
+    def __init__(self, board, square, analysis=None):
+        import pygame
+        self.pygame = pygame
+        self.board = board
+        self.analysis = analysis
+        self.square = square
+        self.font = pygame.font.SysFont(None, max(14, square // 4))
+        self.visible = False
+        self.parts = []
+        self.bounds = pygame.Rect(0, 0, 0, 0)
+        self.shown = None
+
+    def toggle(self):
+        covered = self.rect()
+        self.visible = not self.visible
+        self.shown = None
+        self.parts = []
+        self.bounds = self.pygame.Rect(0, 0, 0, 0)
+        return covered
+
+    def resize(self, square):
+        covered = self.rect()
+        self.square = square
+        self.font = self.pygame.font.SysFont(None, max(14, square // 4))
+        self.shown = None
+        return covered
+
+    # the analysis wakes the loop itself when it has something new
+    def next_refresh(self):
+        return None
+
+    def rect(self):
+        return self.bounds.copy()
+
+    def update(self):
+        if not self.visible or self.analysis is None:
+            return None
+        version, fen, lines = self.analysis.snapshot()
+        board = self.board
+        if fen != board.fen():
+            lines = []
+        shown = (version, bool(lines))
+        if shown == self.shown:
+            return None
+        self.shown = shown
+        old = self.rect()
+
+        # the parts are drawn on small surfaces, so only the area they cover is repainted
+        parts = [self.arrow(line.pv[0], ARROW_COLORS[min(line.rank, len(ARROW_COLORS)) - 1]) for line in reversed(lines)]
+        parts += self.bar(lines[0].score if lines else None)
+        if lines:
+            parts += self.text_lines(board, lines)
+        self.parts = parts
+        self.bounds = parts[0][1].unionall([rect for _, rect in parts[1:]])
+        return old.union(self.bounds)
+
+    def draw(self, screen):
+        for part, rect in self.parts:
+            screen.blit(part, rect)
+        return self.bounds
+
+    def center(self, sq):
+        return ((chess.square_file(sq) + 0.5) * self.square, (7.5 - chess.square_rank(sq)) * self.square)
+
+    # each part is a (surface, rect) pair in board coordinates
+
+    def arrow(self, move, color):
+        (x1, y1), (x2, y2) = self.center(move.from_square), self.center(move.to_square)
+        length = math.hypot(x2 - x1, y2 - y1)
+        ux, uy = (x2 - x1) / length, (y2 - y1) / length
+        width = max(3, self.square // 8)
+        head = self.square * 0.35
+        # the shaft stops where the head starts
+        bx, by = x2 - ux * head, y2 - uy * head
+        nx, ny = -uy, ux
+        shaft = [(x1 + nx * width / 2, y1 + ny * width / 2), (bx + nx * width / 2, by + ny * width / 2),
+                 (bx - nx * width / 2, by - ny * width / 2), (x1 - nx * width / 2, y1 - ny * width / 2)]
+        tip = [(x2, y2), (bx + nx * head / 2, by + ny * head / 2), (bx - nx * head / 2, by - ny * head / 2)]
+        # drawn opaque and made translucent as a whole, so the shaft and the head do not add up
+        points = shaft + tip
+        left, top = int(min(x for x, _ in points)), int(min(y for _, y in points))
+        right, bottom = int(max(x for x, _ in points)) + 2, int(max(y for _, y in points)) + 2
+        layer = self.pygame.Surface((right - left, bottom - top), self.pygame.SRCALPHA)
+        self.pygame.draw.polygon(layer, color[:3], [(x - left, y - top) for x, y in shaft])
+        self.pygame.draw.polygon(layer, color[:3], [(x - left, y - top) for x, y in tip])
+        layer.set_alpha(color[3])
+        return layer, layer.get_rect(topleft=(left, top))
+
+    def bar(self, score):
+        height = self.square * 8
+        width = max(8, self.square // 7)
+        white = round(height * (bar_fraction(score) if score is not None else 0.5))
+        bar = self.pygame.Surface((width, height), self.pygame.SRCALPHA)
+        bar.fill((40, 40, 40, 230), (0, 0, width, height - white))
+        bar.fill((245, 245, 245, 230), (0, height - white, width, white))
+        parts = [(bar, bar.get_rect())]
+        if score is not None:
+            box = self.text_box([self.font.render(format_score(score), True, (255, 255, 255))])
+            parts.append((box, box.get_rect(midleft=(width + 2, height // 2))))
+        return parts
+
+    def text_lines(self, board, lines):
+        rendered = []
+        for line in lines:
+            try:
+                sans = board.variation_san(line.pv)
+            except ValueError:
+                continue
+            depth = f"d{line.depth} " if line.depth else ""
+            rendered.append(self.font.render(f"{format_score(line.score):>6} {depth}{sans}", True, (255, 255, 255)))
+        if not rendered:
+            return []
+        box = self.text_box(rendered)
+        return [(box, box.get_rect(bottomleft=(max(8, self.square // 7) + 4, self.square * 8 - 4)))]
+
+    def text_box(self, rendered):
+        width = max(r.get_width() for r in rendered) + 12
+        height = sum(r.get_height() for r in rendered) + 8
+        box = self.pygame.Surface((width, height), self.pygame.SRCALPHA)
+        box.fill((0, 0, 0, 170))
+        y = 4
+        for r in rendered:
+            box.blit(r, (6, y))
+            y += r.get_height()
+        return box
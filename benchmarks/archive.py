@@ -0,0 +1,121 @@
+# size and speed of the binary game archive against PGN text as game.pgn is written
+# (pgn_journal.build_pgn) and read back (chess.pgn.read_game).
+#   python -m benchmarks.archive --games 2000
+#   python -m benchmarks.archive --pgn games.pgn      the games of a PGN file instead
+# archive reads are timed three ways: whole games as chess.pgn.Game, the moves of every game
+# through moves(), and every move of the archive at once through decode_all() (needs numpy).
+
+import argparse, os, random, tempfile, time
+import chess
+
+from game_archive import ArchiveReader, ArchiveWriter, read_pgn_games
+from pgn_journal import build_pgn
+
+
+# random legal games, like unattended self-play at the lowest level
+def generated_games(count, seed):
+    rng = random.Random(seed)
+    games = []
+    for index in range(count):
+        board = chess.Board()
+        while not board.is_game_over() and board.ply() < rng.randrange(40, 300):
+            board.push(rng.choice(list(board.legal_moves)))
+        headers = {"Event": "Self-play", "Date": "2024.01.01", "Round": str(index + 1),
+                   "White": "Engine", "Black": "Engine"}
+        games.append((headers, board.move_stack, board.result()))
+    return games
+
+
+def file_games(path, count):
+    games = []
+    for game in read_pgn_games(path):
+        if len(games) == count:
+            break
+        if game.headers.get("FEN") or game.headers.get("Variant"):
+            continue
+        headers = {name: game.headers[name] for name in ("Event", "Date", "Round", "White", "Black")}
+        games.append((headers, list(game.mainline_moves()), game.headers.get("Result", "*")))
+    return games
+
+
+def timed(function):
+    start = time.perf_counter()
+    result = function()
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Binary archive against PGN: size and speed.")
+    parser.add_argument("--games", type=int, default=1000)
+    parser.add_argument("--pgn", help="benchmark the games of this PGN file instead")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    games = file_games(args.pgn, args.games) if args.pgn else generated_games(args.games, args.seed)
+    plies = sum(len(moves) for _, moves, _ in games)
+    directory = tempfile.mkdtemp()
+    pgn_path = os.path.join(directory, "games.pgn")
+    archive_path = os.path.join(directory, "games.chga")
+
+    def write_pgn():
+        with open(pgn_path, "w") as out:
+            for headers, moves, result in games:
+                print(build_pgn(headers, [move.uci() for move in moves], result), file=out, end="\n\n")
+
+    def write_archive():
+        writer = ArchiveWriter(archive_path, append=False)
+        for headers, moves, result in games:
+            writer.add(moves, dict(headers, Result=result))
+        writer.close()
+
+    def read_pgn():
+        return sum(1 for game in read_pgn_games(pgn_path) for _ in game.mainline_moves())
+
+    def read_archive(count_moves):
+        def read():
+            reader = ArchiveReader(archive_path)
+            moves = sum(count_moves(reader, i) for i in range(reader.count))
+            reader.close()
+            return moves
+        return read
+
+    def decode_all():
+        reader = ArchiveReader(archive_path)
+        starts = reader.decode_all()[0]
+        reader.close()
+        return int(starts[-1])
+
+    # numpy's import is not part of the decode
+    try:
+        import numpy
+    except ImportError:
+        pass
+    rows = [("write PGN", timed(write_pgn)[0], None), ("write archive", timed(write_archive)[0], None)]
+    reads = [("read PGN", read_pgn),
+             ("read archive games", read_archive(lambda reader, i: len(list(reader.game(i).mainline_moves())))),
+             ("read archive moves", read_archive(lambda reader, i: len(reader.moves(i)))),
+             ("decode_all", decode_all)]
+    for name, function in reads:
+        try:
+            seconds, moves = timed(function)
+        except ImportError:
+            print(f"{name}: skipped (numpy is not installed)")
+            continue
+        if moves != plies:
+            raise SystemExit(f"{name} read {moves} moves, {plies} were written")
+        rows.append((name, seconds, moves))
+
+    pgn_size, archive_size = os.path.getsize(pgn_path), os.path.getsize(archive_path)
+    print(f"{len(games)} games, {plies} plies")
+    print(f"size: PGN {pgn_size} bytes ({pgn_size / len(games):.0f}/game), archive {archive_size} bytes "
+          f"({archive_size / len(games):.0f}/game), {pgn_size / archive_size:.1f}x smaller")
+    print(f"{'':20} {'seconds':>9} {'games/s':>10} {'plies/s':>12}")
+    for name, seconds, _ in rows:
+        print(f"{name:20} {seconds:9.3f} {len(games) / seconds:10.0f} {plies / seconds:12.0f}")
+    os.remove(pgn_path)
+    os.remove(archive_path)
+    os.rmdir(directory)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+# compares the vectorized evaluate_many against evaluating the same boards one by one in python.
+#   python -m benchmarks.batch_eval [number of positions]
+
+import random, sys, time
+import chess
+from batch_eval import evaluate_many
+from builtin_engine import PST, evaluate
+
+
+def random_positions(count, seed=0):
+    rng = random.Random(seed)
+    boards = []
+    board = chess.Board()
+    while len(boards) < count:
+        moves = list(board.legal_moves)
+        if not moves or board.ply() > 120:
+            board = chess.Board()
+            continue
+        board.push(rng.choice(moves))
+        boards.append(board.copy(stack=False))
+    return boards
+
+
+# the per-board loop the batch evaluator replaces: walk the piece map like board_from_chess does
+def evaluate_loop(boards):
+    scores = []
+    for board in boards:
+        score = 0
+        for sq, piece in board.piece_map().items():
+            value = PST[piece.color][piece.piece_type][sq]
+            score += value if piece.color == chess.WHITE else -value
+        scores.append(score)
+    return scores
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    boards = random_positions(count)
+
+    start = time.perf_counter()
+    loop_scores = evaluate_loop(boards)
+    loop_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    engine_scores = [evaluate(b) if b.turn == chess.WHITE else -evaluate(b) for b in boards]
+    engine_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batch_scores = evaluate_many(boards)
+    batch_time = time.perf_counter() - start
+
+    assert list(batch_scores) == loop_scores == engine_scores
+    print(f"{count} positions")
+    print(f"piece_map loop:      {loop_time:.3f}s  {count / loop_time:10.0f} pos/s")
+    print(f"bitboard loop:       {engine_time:.3f}s  {count / engine_time:10.0f} pos/s")
+    print(f"evaluate_many:       {batch_time:.3f}s  {count / batch_time:10.0f} pos/s")
+    print(f"speedup over loop:   {loop_time / batch_time:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
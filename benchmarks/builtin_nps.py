@@ -0,0 +1,33 @@
+# nodes-per-second benchmark for the built-in engine: fixed-depth searches on a few
+# opening, middlegame and endgame positions, so the numbers are comparable between builds.
+#   python -m benchmarks.builtin_nps
+
+import time
+import chess, chess.engine
+from builtin_engine import BuiltinEngine
+
+POSITIONS = [
+    (chess.STARTING_FEN, 5),
+    ("r1bqkb1r/pppp1ppp/2n2n2/4p3/2B1P3/5N2/PPPP1PPP/RNBQK2R w KQkq - 4 4", 5),
+    ("r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1", 4),
+    ("8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1", 7),
+]
+
+
+def main():
+    total_nodes = 0
+    total_time = 0.0
+    for fen, depth in POSITIONS:
+        engine = BuiltinEngine()
+        start = time.perf_counter()
+        result = engine.play(chess.Board(fen), chess.engine.Limit(depth=depth))
+        elapsed = time.perf_counter() - start
+        nodes = result.info["nodes"]
+        total_nodes += nodes
+        total_time += elapsed
+        print(f"depth {depth}  nodes {nodes:8}  {elapsed:6.2f}s  {nodes / elapsed:8.0f} nps  {fen}")
+    print(f"total {total_nodes} nodes in {total_time:.2f}s: {total_nodes / total_time:.0f} nps")
+
+
+if __name__ == "__main__":
+    main()
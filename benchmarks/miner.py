@@ -0,0 +1,66 @@
+# throughput of the puzzle miner for growing worker counts: the same games are mined into a
+# fresh database for each count, and positions/sec is compared with one worker.
+#   python -m benchmarks.miner --workers 1,2,4,8 --games 20
+#   python -m benchmarks.miner --pgn game.pgn --engine stockfish --time 0.05
+# without --engine the stub UCI engine (tools/stub_uci.py) is used. it spends the search time
+# waiting, not computing, so it shows how the miner itself scales; a real engine scales the
+# same way up to the number of cores.
+
+import argparse, os, random, sys, tempfile
+import chess, chess.engine
+
+from puzzle_miner import PuzzleMiner
+from puzzles import PuzzleStore
+
+STUB = [sys.executable, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tools", "stub_uci.py")]
+
+
+# random legal games written as PGN, no position repeats across them after the opening
+def write_games(path, count, seed):
+    import chess.pgn
+    rng = random.Random(seed)
+    with open(path, "w") as out:
+        for index in range(count):
+            board = chess.Board()
+            while not board.is_game_over() and board.ply() < 120:
+                board.push(rng.choice(list(board.legal_moves)))
+            game = chess.pgn.Game.from_board(board)
+            game.headers["Round"] = str(index + 1)
+            print(game, file=out, end="\n\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Puzzle miner throughput by worker count.")
+    parser.add_argument("--workers", default="1,2,4,8", help="comma separated worker counts")
+    parser.add_argument("--games", type=int, default=20, help="generated games, without --pgn")
+    parser.add_argument("--pgn", help="mine the games of this PGN file instead")
+    parser.add_argument("--engine", help="UCI engine (default: the stub engine)")
+    parser.add_argument("--time", type=float, default=0.05, help="engine seconds per position")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    path = args.pgn
+    if path is None:
+        path = os.path.join(directory, "games.pgn")
+        write_games(path, args.games, args.seed)
+
+    print(f"{'workers':>7} {'positions':>9} {'seconds':>8} {'pos/sec':>8} {'speedup':>8} {'puzzles':>8}")
+    base = None
+    for workers in [int(n) for n in args.workers.split(",")]:
+        db = os.path.join(directory, f"puzzles-{workers}.sqlite")
+        store = PuzzleStore(db)
+        miner = PuzzleMiner(store, args.engine or STUB, chess.engine.Limit(time=args.time), workers, progress=False)
+        stats = miner.run([path])
+        store.close()
+        os.remove(db)
+        rate = stats["positions_per_second"]
+        base = base or rate
+        print(f"{workers:7} {stats['evaluated']:9} {stats['seconds']:8.1f} {rate:8.1f} {rate / base:7.2f}x {stats['puzzles']:8}")
+    if args.pgn is None:
+        os.remove(path)
+    os.rmdir(directory)
+
+
+if __name__ == "__main__":
+    main()
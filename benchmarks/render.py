@@ -0,0 +1,76 @@
+# compares the frame time of the full draw_board repaint against the dirty-rect BoardRenderer.
+# runs headless on the dummy SDL video driver:  python -m benchmarks.render
+
+import os, time
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import pygame, chess
+from chessV2 import SQUARE, WINDOW, load_images, draw_board
+from renderer import BoardRenderer
+from position_state import PositionState
+
+FRAMES = 300
+MOVES = ["e2e4", "e7e5", "g1f3", "b8c6", "f1c4", "g8f6", "e1g1", "f8c5", "d2d4", "e5d4"]
+
+
+def board_state_of(b):
+    state = [None] * 64
+    for sq, piece in b.piece_map().items():
+        color = 'w' if piece.color == chess.WHITE else 'b'
+        state[sq ^ 56] = color + piece.symbol().lower()
+    return state
+
+
+# builds the frame sequence: mostly idle frames, with a selection and a move every few frames
+def scenario():
+    b = chess.Board()
+    frames = []
+    moves = [chess.Move.from_uci(m) for m in MOVES]
+    for i in range(FRAMES):
+        step = i // 30
+        if i % 30 == 0 and step < len(moves):
+            b.push(moves[step])
+        legal = None
+        if i % 30 in range(10, 20):
+            legal = [m for m in b.legal_moves if m.from_square == moves[min(step + 1, len(moves) - 1)].from_square]
+        position = PositionState(b)
+        targets = frozenset(m.to_square for m in legal) if legal else frozenset()
+        frames.append((board_state_of(b), legal, b.copy(stack=False), targets, position))
+    return frames
+
+
+def bench_full(screen, images, frames):
+    start = time.perf_counter()
+    for state, legal, b, _, _ in frames:
+        screen.fill((0, 0, 0))
+        draw_board(screen, state, images, legal, b)
+        pygame.display.flip()
+    return (time.perf_counter() - start) / len(frames)
+
+
+def bench_dirty(screen, images, frames):
+    renderer = BoardRenderer(images, SQUARE)
+    start = time.perf_counter()
+    for state, _, _, targets, position in frames:
+        dirty = renderer.render(screen, state, targets, position)
+        if dirty:
+            pygame.display.update(dirty)
+    return (time.perf_counter() - start) / len(frames)
+
+
+def main():
+    pygame.init()
+    screen = pygame.display.set_mode((WINDOW, WINDOW))
+    images = load_images()
+    frames = scenario()
+
+    full = bench_full(screen, images, frames)
+    dirty = bench_dirty(screen, images, frames)
+    print(f"full redraw:  {full * 1000:.3f} ms/frame")
+    print(f"dirty rects:  {dirty * 1000:.3f} ms/frame")
+    print(f"speedup:      {full / dirty:.1f}x")
+    pygame.quit()
+
+
+if __name__ == "__main__":
+    main()
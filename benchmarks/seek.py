@@ -0,0 +1,112 @@
+# seek latency in the game history: random jumps and single steps to earlier plies through
+# GameDriver.view(), against replaying the moves from the start, for growing game lengths.
+#   python -m benchmarks.seek --lengths 100,1000,10000
+#   python -m benchmarks.seek --pgn games.pgn      imported games instead of generated ones
+# the checkpointed seek should stay flat while the replay grows with the game.
+
+import argparse, random, time
+import chess
+
+from game_driver import GameDriver
+from instrumentation import percentile
+
+# knight moves that return to the starting position, to stretch a game to any length
+SHUFFLE = [chess.Move.from_uci(m) for m in ("g1f3", "g8f6", "f3g1", "f6g8")]
+
+
+def generated_game(length, seed):
+    rng = random.Random(seed)
+    board = chess.Board()
+    moves = []
+    # a few random plies so the game does not start from the initial position
+    while len(moves) < min(20, length):
+        move = rng.choice(list(board.legal_moves))
+        if board.is_capture(move) or board.gives_check(move):
+            continue
+        board.push(move)
+        moves.append(move)
+    shuffle = [m for m in SHUFFLE if m in board.legal_moves][:1]
+    while len(moves) < length:
+        legal = list(board.legal_moves)
+        # plays king/knight shuffles once the random prefix is done
+        move = next((m for m in legal if board.piece_type_at(m.from_square) in (chess.KNIGHT, chess.KING)
+                     and not board.is_capture(m)), legal[0]) if not shuffle else shuffle[0]
+        board.push(move)
+        moves.append(move)
+        shuffle = [m for m in SHUFFLE if m in board.legal_moves][:1]
+    return moves
+
+
+def pgn_games(path, count):
+    import chess.pgn
+    games = []
+    with open(path) as f:
+        while len(games) < count:
+            game = chess.pgn.read_game(f)
+            if game is None:
+                break
+            moves = list(game.mainline_moves())
+            if moves:
+                games.append(moves)
+    return games
+
+
+def measure(moves, seeks, interval, seed):
+    rng = random.Random(seed)
+    driver = GameDriver(checkpoint_interval=interval)
+    for move in moves:
+        driver.push(move)
+    plies = len(moves)
+
+    jumps = []
+    for _ in range(seeks):
+        ply = rng.randrange(plies)
+        start = time.perf_counter()
+        driver.view(ply)
+        jumps.append(time.perf_counter() - start)
+
+    steps = []
+    ply = plies
+    for _ in range(min(seeks, plies)):
+        ply -= 1
+        start = time.perf_counter()
+        driver.view(ply)
+        steps.append(time.perf_counter() - start)
+
+    # what a seek costs without checkpoints: a fresh board and every move up to the ply
+    replays = []
+    for _ in range(max(1, seeks // 10)):
+        ply = rng.randrange(plies)
+        start = time.perf_counter()
+        board = chess.Board()
+        for move in moves[:ply]:
+            board.push(move)
+        replays.append(time.perf_counter() - start)
+
+    return sorted(jumps), sorted(steps), sorted(replays)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Seek latency in the game history.")
+    parser.add_argument("--lengths", default="100,1000,10000", help="comma separated game lengths in plies")
+    parser.add_argument("--pgn", help="measure the games in this PGN file instead")
+    parser.add_argument("--games", type=int, default=5, help="games to read from --pgn")
+    parser.add_argument("--seeks", type=int, default=500)
+    parser.add_argument("--interval", type=int, default=16, help="plies between checkpoints")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.pgn:
+        games = pgn_games(args.pgn, args.games)
+    else:
+        games = [generated_game(int(n), args.seed) for n in args.lengths.split(",")]
+
+    print(f"{'plies':>6} {'jump p50':>9} {'jump p99':>9} {'step p50':>9} {'replay p50':>11}  us")
+    for moves in games:
+        jumps, steps, replays = measure(moves, args.seeks, args.interval, args.seed)
+        print(f"{len(moves):6} {percentile(jumps, 0.5) * 1e6:9.1f} {percentile(jumps, 0.99) * 1e6:9.1f} "
+              f"{percentile(steps, 0.5) * 1e6:9.1f} {percentile(replays, 0.5) * 1e6:11.1f}")
+
+
+if __name__ == "__main__":
+    main()
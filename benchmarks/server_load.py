@@ -0,0 +1,106 @@
+# load generator for game_server.py: N clients play random legal moves against the engine at
+# the same time, for growing N. reports engine moves per second and the move latency (player
+# move sent -> engine move received) percentiles for each client count.
+#   python -m benchmarks.server_load --clients 1,2,4,8 --engines 2
+# without --connect a server is started in this process (UCI engine from STOCKFISH_PATH or
+# --engine, otherwise the built-in engine).
+
+import argparse, asyncio, json, os, random, time
+import chess
+
+from game_server import HOST, EnginePool, GameServer
+from instrumentation import percentile
+
+
+async def client(host, port, index, moves, time_control, skill, seed):
+    rng = random.Random(seed + index)
+    reader, writer = await asyncio.open_connection(host, port)
+    latencies = []
+    games = 0
+
+    async def events():
+        line = await reader.readline()
+        if not line:
+            raise ConnectionError("server closed the connection")
+        return json.loads(line)
+
+    while len(latencies) < moves:
+        games += 1
+        game_id = f"load{index}-{games}"
+        board = chess.Board()
+        writer.write((json.dumps({"cmd": "new", "game": game_id, "color": "white",
+                                  "time_control": time_control, "skill": skill}) + "\n").encode())
+        over = False
+        while not over and len(latencies) < moves:
+            move = rng.choice(list(board.legal_moves))
+            board.push(move)
+            sent = time.perf_counter()
+            writer.write((json.dumps({"cmd": "move", "game": game_id, "uci": move.uci()}) + "\n").encode())
+            await writer.drain()
+            while True:
+                event = await events()
+                if event.get("game") != game_id:
+                    continue
+                if event["event"] == "over":
+                    over = True
+                    break
+                if event["event"] == "error":
+                    raise RuntimeError(event["message"])
+                if event["event"] == "move" and event["by"] == "engine":
+                    latencies.append(time.perf_counter() - sent)
+                    board.push_uci(event["uci"])
+                    over = board.is_game_over()
+                    break
+        writer.write((json.dumps({"cmd": "close", "game": game_id}) + "\n").encode())
+    writer.close()
+    await writer.wait_closed()
+    return latencies
+
+
+async def run(args):
+    server = listener = None
+    host, port = HOST, None
+    if args.connect:
+        host, _, port = args.connect.rpartition(":")
+        port = int(port)
+    else:
+        pool = await EnginePool(args.engine, args.engines).start()
+        # no opening book: every reply goes through the engine pool
+        server = GameServer(pool, book=False)
+        listener = await asyncio.start_server(server.handle, HOST, 0)
+        port = listener.sockets[0].getsockname()[1]
+
+    print(f"{'clients':>7} {'moves':>6} {'moves/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    for count in args.clients:
+        start = time.perf_counter()
+        results = await asyncio.gather(*[
+            client(host, port, i, args.moves, args.time_control, args.skill, args.seed) for i in range(count)])
+        elapsed = time.perf_counter() - start
+        latencies = sorted(l for result in results for l in result)
+        print(f"{count:7} {len(latencies):6} {len(latencies) / elapsed:8.1f} "
+              f"{percentile(latencies, 0.50) * 1000:8.1f} {percentile(latencies, 0.95) * 1000:8.1f} "
+              f"{percentile(latencies, 0.99) * 1000:8.1f} {latencies[-1] * 1000:8.1f}")
+
+    if listener is not None:
+        listener.close()
+        await listener.wait_closed()
+        await server.pool.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the game server.")
+    parser.add_argument("--clients", default="1,2,4,8", help="comma separated client counts")
+    parser.add_argument("--moves", type=int, default=20, help="engine moves per client")
+    parser.add_argument("--connect", metavar="HOST:PORT", help="test a running server instead")
+    parser.add_argument("--engine", default=os.environ.get("STOCKFISH_PATH"))
+    parser.add_argument("--engines", type=int, default=2)
+    parser.add_argument("--time-control", default="60+0")
+    parser.add_argument("--skill", type=int, default=0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    args.clients = [int(n) for n in args.clients.split(",")]
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+# startup and resize cost of the sprite atlas compared with load_images, and of a drag resize.
+#   python -m benchmarks.sprite_atlas
+
+import os, tempfile, time
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import pygame
+from chessV2 import WINDOW, load_images
+from sprite_atlas import SpriteAtlas
+
+
+def timed(fn, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main():
+    pygame.init()
+    pygame.display.set_mode((WINDOW, WINDOW))
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        def cold():
+            for name in os.listdir(cache_dir):
+                os.remove(os.path.join(cache_dir, name))
+            SpriteAtlas(cache_dir=cache_dir).images(100)
+
+        def warm():
+            SpriteAtlas(cache_dir=cache_dir).images(100)
+
+        atlas = SpriteAtlas(cache_dir=cache_dir)
+        for size in (60, 80, 100):
+            atlas.images(size)
+
+        print(f"load_images:               {timed(load_images):7.2f} ms")
+        print(f"atlas, empty disk cache:   {timed(cold):7.2f} ms")
+        print(f"atlas, from disk cache:    {timed(warm):7.2f} ms")
+        print(f"resize, in-memory atlas:   {timed(lambda: atlas.images(80)):7.2f} ms")
+
+    # a window dragged through 40 sizes: each step scales the atlas in memory, the real atlas
+    # is only built for the last size
+    with tempfile.TemporaryDirectory() as cache_dir:
+        atlas = SpriteAtlas(cache_dir=cache_dir)
+        atlas.images(100)
+        steps = []
+        for size in range(60, 100):
+            start = time.perf_counter()
+            atlas.resized(size)
+            steps.append((time.perf_counter() - start) * 1000)
+        start = time.perf_counter()
+        atlas.settled(float("inf"))
+        settle = (time.perf_counter() - start) * 1000
+        print(f"drag resize, per step:     {sum(steps) / len(steps):7.2f} ms (worst {max(steps):.2f} ms)")
+        print(f"settled, real atlas:       {settle:7.2f} ms")
+        print(f"atlas files on disk:       {len(os.listdir(cache_dir)):7}")
+    pygame.quit()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,294 @@
+# benchmark suite for the hot paths, with machine-readable results and a regression check.
+#   python -m benchmarks.suite                      run everything, print a table
+#   python -m benchmarks.suite --json results.json  also write the results as JSON
+#   python -m benchmarks.suite --save-baseline      store the results in benchmarks/baseline.json
+#   python -m benchmarks.suite --compare            exit 1 when anything is slower than the baseline
+# every benchmark reports its fastest run out of several: the slow ones are the noise (other
+# processes, the garbage collector, a busy host), the fastest is what the code costs. the whole
+# suite runs in --rounds rounds and keeps each benchmark's best, so its runs are spread over
+# time instead of all landing in one slow stretch. the baseline is machine specific and not
+# committed, --compare saves one when there is none yet.
+#
+# perft counts are checked against the known values, a wrong count fails the run.
+
+import argparse, json, os, platform, statistics, sys, threading, time
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import chess
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baseline.json")
+STUB_ENGINE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tools", "stub_uci.py")
+
+# (name, fen, depth, nodes), from the chessprogramming wiki perft results
+PERFT_POSITIONS = [
+    ("start", chess.STARTING_FEN, 3, 8902),
+    ("kiwipete", "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1", 2, 2039),
+    ("position 3", "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1", 3, 2812),
+    ("position 4", "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1", 3, 9467),
+    ("position 5", "rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8", 2, 1486),
+]
+
+# a short game with castling on both sides, captures and checks
+GAME = ("e4 e5 Nf3 Nc6 Bc4 Nf6 O-O Bc5 d4 exd4 e5 d5 exf6 dxc4 Re1+ Be6 Ng5 Qxf6 Nxe6 fxe6 "
+        "Qh5+ g6 Qxc5 O-O-O Bg5 Qxf2+ Kh1 Qxe1+").split()
+
+
+class RegressionError(Exception):
+    pass
+
+
+# fastest of at least `runs` runs, and of as many more as fit in min_seconds
+def best_time(fn, runs=5, min_seconds=0.2):
+    best = float("inf")
+    deadline = time.perf_counter() + min_seconds
+    done = 0
+    while done < runs or time.perf_counter() < deadline:
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+        done += 1
+    return best
+
+
+def game_boards():
+    board = chess.Board()
+    boards = [board.copy()]
+    for san in GAME:
+        board.push_san(san)
+        boards.append(board.copy())
+    return boards
+
+
+def perft(board, depth):
+    if depth == 1:
+        return board.legal_moves.count()
+    nodes = 0
+    for move in board.legal_moves:
+        board.push(move)
+        nodes += perft(board, depth - 1)
+        board.pop()
+    return nodes
+
+
+def bench_perft(results):
+    for name, fen, depth, expected in PERFT_POSITIONS:
+        board = chess.Board(fen)
+        count = perft(board, depth)
+        if count != expected:
+            raise RegressionError(f"perft {name} depth {depth}: {count} nodes, expected {expected}")
+        seconds = best_time(lambda: perft(board, depth))
+        results[f"perft {name} d{depth}"] = {"value": count / seconds / 1000, "unit": "knodes/s", "higher_is_better": True}
+
+
+def bench_board_from_chess(results):
+    from game_driver import board_from_chess
+    boards = game_boards()
+    seconds = best_time(lambda: [board_from_chess(b) for b in boards for _ in range(20)])
+    results["board_from_chess"] = {"value": seconds / (len(boards) * 20) * 1e6, "unit": "us/call"}
+
+
+# the incremental alternative the game uses: one mirror update per move, then undo
+def bench_board_mirror(results):
+    from board_mirror import BoardMirror
+    board = chess.Board()
+    moves = []
+    for san in GAME:
+        moves.append(board.push_san(san))
+    board.reset()
+    mirror = BoardMirror(board)
+
+    def replay():
+        for _ in range(20):
+            for move in moves:
+                mirror.push(board, move)
+                board.push(move)
+            for _ in moves:
+                board.pop()
+                mirror.pop()
+    seconds = best_time(replay)
+    results["board mirror push+pop"] = {"value": seconds / (len(moves) * 20) * 1e6, "unit": "us/move"}
+
+
+# endgame bitbase lookups, skipped until they were generated (python bitbase.py generate)
+def bench_bitbase(results):
+    from bitbase import open_bitbases
+    bitbases = open_bitbases()
+    if bitbases is None:
+        return
+    boards = [chess.Board(fen) for fen in ("8/8/8/4k3/8/8/8/K6R w - - 0 1", "8/8/8/4K3/8/8/8/k6q b - - 0 1",
+                                           "4k3/8/4K3/4P3/8/8/8/8 b - - 0 1")]
+    seconds = best_time(lambda: [bitbases.probe(b) for b in boards for _ in range(1000)])
+    results["bitbase probe"] = {"value": seconds / (len(boards) * 1000) * 1e6, "unit": "us/call"}
+    seconds = best_time(lambda: [bitbases.perfect_move(b) for b in boards for _ in range(20)])
+    results["bitbase move"] = {"value": seconds / (len(boards) * 20) * 1e6, "unit": "us/call"}
+    bitbases.close()
+
+
+def bench_rendering(results):
+    import pygame
+    from chessV2 import SQUARE, WINDOW, load_images, draw_board
+    from game_driver import board_from_chess
+    from renderer import BoardRenderer
+    from position_state import PositionState
+
+    pygame.display.init()
+    pygame.font.init()
+    screen = pygame.display.set_mode((WINDOW, WINDOW))
+
+    seconds = best_time(load_images)
+    results["load_images"] = {"value": seconds * 1000, "unit": "ms"}
+
+    images = load_images()
+    boards = game_boards()
+    states = [board_from_chess(b) for b in boards]
+
+    def full_frames():
+        for b, state in zip(boards, states):
+            draw_board(screen, state, images, None, b)
+    seconds = best_time(full_frames)
+    results["draw_board frame"] = {"value": seconds / len(boards) * 1000, "unit": "ms"}
+
+    positions = [PositionState(b) for b in boards]
+    renderer = BoardRenderer(images, SQUARE)
+
+    def dirty_frames():
+        for state, position in zip(states, positions):
+            renderer.render(screen, state, None, position)
+    seconds = best_time(dirty_frames)
+    results["renderer frame"] = {"value": seconds / len(boards) * 1000, "unit": "ms"}
+    pygame.quit()
+
+
+# request -> reply through the asyncio engine driver the game uses, against the stub engine
+def bench_engine(results, moves=20):
+    import chess.engine
+    from engine_async import AsyncEngineDriver
+
+    replied = threading.Event()
+    driver = AsyncEngineDriver([sys.executable, STUB_ENGINE], ponder=False, on_reply=replied.set).start()
+    limit = chess.engine.Limit(time=0.001)
+    boards = game_boards()[:moves]
+    try:
+        samples = []
+        for board in boards:
+            replied.clear()
+            start = time.perf_counter()
+            driver.request_move(board, limit)
+            if not replied.wait(10):
+                raise RegressionError("stub engine did not reply")
+            samples.append(time.perf_counter() - start)
+            driver.poll()
+    finally:
+        driver.quit()
+    results["engine round-trip"] = {"value": statistics.median(samples) * 1000, "unit": "ms"}
+
+
+BENCHMARKS = [bench_perft, bench_board_from_chess, bench_board_mirror, bench_bitbase, bench_rendering, bench_engine]
+
+
+# keeps the better of the two results of each benchmark
+def merge_best(best, results):
+    for name, result in results.items():
+        old = best.get(name)
+        if old is None:
+            best[name] = result
+        elif result.get("higher_is_better"):
+            if result["value"] > old["value"]:
+                best[name] = result
+        elif result["value"] < old["value"]:
+            best[name] = result
+
+
+def run_rounds(results, rounds):
+    for _ in range(rounds):
+        round_results = {}
+        for bench in BENCHMARKS:
+            try:
+                bench(round_results)
+            except RegressionError as e:
+                print("FAIL", e)
+                sys.exit(1)
+        merge_best(results, round_results)
+
+
+# names of the benchmarks that got worse than baseline by more than tolerance
+def regressions(results, baseline, tolerance):
+    worse = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        if result.get("higher_is_better"):
+            ratio = base["value"] / result["value"] if result["value"] else float("inf")
+        else:
+            ratio = result["value"] / base["value"] if base["value"] else 1.0
+        if ratio > 1 + tolerance:
+            worse.append((name, ratio))
+    return worse
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the benchmark suite.")
+    parser.add_argument("--json", metavar="PATH", help="write the results to PATH")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true", help="store the results as the new baseline")
+    parser.add_argument("--compare", action="store_true", help="fail when slower than the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="allowed slowdown before failing (0.5 = 50%%)")
+    parser.add_argument("--rounds", type=int, default=5, help="runs of the whole suite, the best result counts")
+    args = parser.parse_args()
+
+    results = {}
+    run_rounds(results, args.rounds)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+
+    # a slow stretch of the host can outlast a whole round, so what looks like a regression is
+    # measured again (twice at most) before it is reported
+    if args.compare:
+        for _ in range(2):
+            if not regressions(results, baseline, args.tolerance):
+                break
+            print("Slower than the baseline, measuring again")
+            run_rounds(results, args.rounds)
+
+    for name, result in results.items():
+        base = baseline.get(name)
+        change = f"  (baseline {base['value']:.3f})" if base else ""
+        print(f"{name:24} {result['value']:10.3f} {result['unit']}{change}")
+    # a benchmark whose inputs are missing here (bitbases not generated) is not a regression
+    for name in baseline:
+        if name not in results:
+            print(f"{name:24} {'skipped':>10}  (not run here)")
+
+    report = {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "chess": chess.__version__,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "results": results,
+    }
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    # the first --compare on a machine has nothing to compare with, it becomes the baseline
+    if args.compare and not baseline:
+        print("No baseline yet at", args.baseline)
+        args.save_baseline = True
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print("Baseline saved to", args.baseline)
+
+    if args.compare:
+        worse = regressions(results, baseline, args.tolerance)
+        for name, ratio in worse:
+            print(f"REGRESSION {name}: {ratio:.2f}x the baseline")
+        if worse:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+# tactical test suite for the built-in engine. every position has a single best move
+# (mates, forks, skewers, hanging pieces, promotion) that must be found within the time limit.
+#   python -m benchmarks.tactics [seconds per position]
+
+import sys, time
+import chess, chess.engine
+from builtin_engine import BuiltinEngine
+
+# (fen, best move in SAN, theme)
+POSITIONS = [
+    ("r1bqkbnr/pppp1ppp/2n5/4p3/2B1P3/5Q2/PPPP1PPP/RNB1K1NR w KQkq - 4 4", "Qxf7#", "mate in 1"),
+    ("6k1/5ppp/8/8/8/8/5PPP/3R2K1 w - - 0 1", "Rd8#", "back rank mate"),
+    ("3r2k1/8/8/8/8/8/5PPP/6K1 b - - 0 1", "Rd1#", "back rank mate, black"),
+    ("6rk/6pp/8/6N1/8/8/8/6K1 w - - 0 1", "Nf7#", "smothered mate"),
+    ("r2qkb1r/pp2nppp/3p4/2pNN1B1/2BnP3/3P4/PPP2PPP/R2bK2R w KQkq - 1 1", "Nf6+", "mate in 2"),
+    ("r3k3/8/8/1N6/8/8/8/4K3 w - - 0 1", "Nc7+", "knight fork"),
+    ("4k3/8/8/3q4/8/8/3R4/4K3 w - - 0 1", "Rxd5", "hanging queen"),
+    ("8/4q3/8/4k3/8/8/8/R5K1 w - - 0 1", "Re1+", "skewer"),
+    ("8/P7/8/8/8/8/k7/7K w - - 0 1", "a8=Q+", "promotion"),
+]
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 2.0
+    engine = BuiltinEngine()
+    solved = 0
+    nodes = 0
+    start = time.perf_counter()
+    for fen, best, theme in POSITIONS:
+        board = chess.Board(fen)
+        result = engine.play(board, chess.engine.Limit(time=seconds))
+        san = board.san(result.move)
+        ok = san == best
+        solved += ok
+        nodes += result.info["nodes"]
+        print(f"{'ok  ' if ok else 'FAIL'} {theme:24} expected {best:6} got {san:6} "
+              f"depth {result.info['depth']:2} nodes {result.info['nodes']}")
+    elapsed = time.perf_counter() - start
+    print(f"solved {solved}/{len(POSITIONS)} in {elapsed:.1f}s ({nodes / elapsed:.0f} nps)")
+    sys.exit(0 if solved == len(POSITIONS) else 1)
+
+
+if __name__ == "__main__":
+    main()
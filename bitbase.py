@@ -0,0 +1,427 @@
+import argparse, mmap, os, random, struct, time
+import chess
+
+# endgame bitbases for king + one piece against a lone king (KQK, KRK, KPK), generated locally
+# by retrograde analysis:
+#   python bitbase.py generate            writes bitbases/KQK.bb, KRK.bb, KPK.bb
+#   python bitbase.py verify --sample N   checks them against python-chess move generation
+# every position is indexed by (side to move, strong king, weak king, piece) with the strong
+# side as white. with a lone king the weak side can never win, so one bit per position is the
+# whole win/draw/loss answer: set means the strong side wins (a win with the strong side to
+# move, a loss with the weak side to move), clear means a draw or an impossible position.
+# a byte per position next to the bits holds the distance to mate in plies, which the move
+# picker needs to make progress. the 50-move rule is not taken into account.
+
+BITBASE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bitbases")
+ENDINGS = {"KQK": chess.QUEEN, "KRK": chess.ROOK, "KPK": chess.PAWN}
+# KPK is built on top of KQK and KRK (promotions), so they are generated first
+GENERATE_ORDER = ["KQK", "KRK", "KPK"]
+
+MAGIC = b"CHBB"
+HEADER = struct.Struct("<4sBB10x")
+SIZE = 2 * 64 * 64 * 64
+BITS_SIZE = SIZE // 8
+UNKNOWN = 255
+
+
+def index(stm, wk, bk, p):
+    return stm << 18 | wk << 12 | bk << 6 | p
+
+
+def path_for(name, directory=BITBASE_DIR):
+    return os.path.join(directory, name + ".bb")
+
+
+# squares attacked by the strong side's piece on sq, with the given occupied bitboard
+def piece_attacks(piece_type, sq, occupied):
+    if piece_type == chess.PAWN:
+        return chess.BB_PAWN_ATTACKS[chess.WHITE][sq]
+    attacks = 0
+    if piece_type in (chess.ROOK, chess.QUEEN):
+        attacks |= (chess.BB_RANK_ATTACKS[sq][occupied & chess.BB_RANK_MASKS[sq]] |
+                    chess.BB_FILE_ATTACKS[sq][occupied & chess.BB_FILE_MASKS[sq]])
+    if piece_type == chess.QUEEN:
+        attacks |= chess.BB_DIAG_ATTACKS[sq][occupied & chess.BB_DIAG_MASKS[sq]]
+    return attacks
+
+
+def piece_squares(piece_type):
+    if piece_type == chess.PAWN:
+        return range(chess.A2, chess.A8)
+    return range(64)
+
+
+# retrograde analysis of one ending. positions where the weak side is mated are lost at
+# distance 0; going backwards ply by ply, a strong-side position is won as soon as one move
+# reaches a lost position, a weak-side position is lost once every move reaches a won one.
+# buckets[d] holds the positions settled at distance d, so each distance is the shortest
+# (strong side) or longest (weak side) one. promotions are seeded from the KQK and KRK tables.
+# returns (bits, distances) as bytearrays.
+def generate(piece_type, promotions=None):
+    won = bytearray(SIZE)
+    dtm = bytearray([UNKNOWN]) * SIZE
+    # weak side to move: legal moves not yet known to lose, UNKNOWN once the position is a draw
+    count = bytearray([UNKNOWN]) * SIZE
+    buckets = [[]]
+    king = chess.BB_KING_ATTACKS
+    squares = chess.BB_SQUARES
+
+    def settle(idx, distance):
+        while len(buckets) <= distance:
+            buckets.append([])
+        buckets[distance].append(idx)
+
+    for wk in range(64):
+        for bk in range(64):
+            if bk == wk or king[wk] & squares[bk]:
+                continue
+            for p in piece_squares(piece_type):
+                if p == wk or p == bk:
+                    continue
+                occupied = squares[wk] | squares[bk] | squares[p]
+                in_check = bool(piece_attacks(piece_type, p, occupied) & squares[bk])
+
+                # weak king moves: it may take an undefended piece (a draw) but not walk into an attack
+                moves = 0
+                draw = False
+                for to in chess.scan_forward(king[bk] & ~king[wk]):
+                    if to == p:
+                        draw = True
+                        continue
+                    after = occupied & ~squares[bk] | squares[to]
+                    if not piece_attacks(piece_type, p, after) & squares[to]:
+                        moves += 1
+                black = index(1, wk, bk, p)
+                if not draw and moves:
+                    count[black] = moves
+                elif not draw and in_check:
+                    settle(black, 0)
+
+                if piece_type == chess.PAWN and promotions and chess.square_rank(p) == 6 and not in_check:
+                    promoted = p + 8
+                    if promoted == wk or promoted == bk:
+                        continue
+                    best = None
+                    for table in promotions:
+                        child = index(1, wk, bk, promoted)
+                        if table.won(child):
+                            distance = table.distance(child) + 1
+                            best = distance if best is None else min(best, distance)
+                    if best is not None:
+                        settle(index(0, wk, bk, p), best)
+
+    distance = 0
+    while distance < len(buckets):
+        for idx in buckets[distance]:
+            if won[idx]:
+                continue
+            won[idx] = 1
+            dtm[idx] = distance
+            stm, wk, bk, p = idx >> 18, idx >> 12 & 63, idx >> 6 & 63, idx & 63
+            if stm == 1:
+                # the strong side's last move reached this lost position
+                for before in strong_unmoves(piece_type, wk, bk, p):
+                    if not won[before]:
+                        settle(before, distance + 1)
+            else:
+                # the weak king's last move reached this won position
+                for s in chess.scan_forward(king[bk] & ~king[wk] & ~squares[p]):
+                    before = index(1, wk, s, p)
+                    if count[before] == UNKNOWN or won[before]:
+                        continue
+                    count[before] -= 1
+                    if count[before] == 0:
+                        settle(before, distance + 1)
+        distance += 1
+
+    bits = bytearray(BITS_SIZE)
+    for idx in range(SIZE):
+        if won[idx]:
+            bits[idx >> 3] |= 1 << (idx & 7)
+    return bits, dtm
+
+
+# strong-side-to-move positions whose one strong move leads to (wk, bk, p) with the weak side to move
+def strong_unmoves(piece_type, wk, bk, p):
+    squares = chess.BB_SQUARES
+    occupied = squares[wk] | squares[bk] | squares[p]
+    king = chess.BB_KING_ATTACKS
+
+    # the king came from a square next to it, not next to the weak king
+    for s in chess.scan_forward(king[wk] & ~king[bk] & ~occupied):
+        if not piece_attacks(piece_type, p, occupied & ~squares[wk] | squares[s]) & squares[bk]:
+            yield index(0, s, bk, p)
+
+    if piece_type == chess.PAWN:
+        sources = []
+        if chess.square_rank(p) >= 2 and not occupied & squares[p - 8]:
+            sources.append(p - 8)
+            if chess.square_rank(p) == 3 and not occupied & squares[p - 16]:
+                sources.append(p - 16)
+    else:
+        # sliders move back along the same lines they move forward
+        sources = list(chess.scan_forward(piece_attacks(piece_type, p, occupied) & ~occupied))
+    for s in sources:
+        before = occupied & ~squares[p] | squares[s]
+        if not piece_attacks(piece_type, s, before) & squares[bk]:
+            yield index(0, wk, bk, s)
+
+
+def write(path, piece_type, bits, dtm):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(HEADER.pack(MAGIC, 1, piece_type))
+        f.write(bits)
+        f.write(dtm)
+    os.replace(tmp, path)
+
+
+# one memory-mapped bitbase file: the header, SIZE bits, then SIZE distance bytes
+class BitbaseFile:
+
+    def __init__(self, path):
+        self.file = open(path, "rb")
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.piece_type = HEADER.unpack_from(self.map)
+        if magic != MAGIC or version != 1 or len(self.map) != HEADER.size + BITS_SIZE + SIZE:
+            self.close()
+            raise ValueError(f"{path} is not a bitbase file")
+
+    def won(self, idx):
+        return self.map[HEADER.size + (idx >> 3)] >> (idx & 7) & 1
+
+    def distance(self, idx):
+        return self.map[HEADER.size + BITS_SIZE + idx]
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+
+# the bitbases in one directory. probe() answers any position with a lone king against king
+# and one piece, plus bare kings; perfect_move() plays the fastest win, the longest defence or
+# a move that keeps the draw.
+
+class Bitbases:
+
+    def __init__(self, directory=BITBASE_DIR):
+        self.tables = {}
+        for name, piece_type in ENDINGS.items():
+            path = path_for(name, directory)
+            if os.path.exists(path):
+                self.tables[piece_type] = BitbaseFile(path)
+
+    # (wdl, plies to mate) for the side to move, wdl 1 win / 0 draw / -1 loss, None if not covered
+    def probe(self, board):
+        occupied = board.occupied
+        count = chess.popcount(occupied)
+        if count == 2:
+            return 0, None
+        if count != 3 or board.castling_rights:
+            return None
+        extra = occupied & ~board.kings
+        sq = chess.lsb(extra)
+        piece_type = board.piece_type_at(sq)
+        table = self.tables.get(piece_type)
+        if table is None:
+            return None
+        strong = chess.WHITE if board.occupied_co[chess.WHITE] & extra else chess.BLACK
+        # the tables have the strong side as white, flip the board for black
+        flip = 0 if strong == chess.WHITE else 56
+        wk, bk = board.king(strong) ^ flip, board.king(not strong) ^ flip
+        stm = 0 if board.turn == strong else 1
+        idx = index(stm, wk, bk, sq ^ flip)
+        if not table.won(idx):
+            return 0, None
+        return (1 if stm == 0 else -1), table.distance(idx)
+
+    # the best move by the tables, None when the position is not covered or is over
+    def perfect_move(self, board):
+        here = self.probe(board)
+        if here is None or board.is_game_over():
+            return None
+        wdl, _ = here
+        best = best_key = None
+        for move in board.legal_moves:
+            board.push(move)
+            try:
+                after = self.probe(board)
+            finally:
+                board.pop()
+            if after is None:
+                continue
+            # after the move the opponent is to move, their loss is our win
+            result, distance = -after[0], after[1]
+            if wdl == 1:
+                key = (result, -distance if result == 1 else 0)
+            elif wdl == -1:
+                key = (result, distance if result == -1 else 0)
+            else:
+                # in a draw the weak side takes the piece when it can
+                key = (result, 1 if board.is_capture(move) else 0)
+            if best_key is None or key > best_key:
+                best, best_key = move, key
+        return best
+
+    def close(self):
+        for table in self.tables.values():
+            table.close()
+
+
+# opens the bitbases if any were generated, otherwise returns None so the game just uses the engine
+def open_bitbases(directory=BITBASE_DIR):
+    if not any(os.path.exists(path_for(name, directory)) for name in ENDINGS):
+        return None
+    try:
+        return Bitbases(directory)
+    except Exception as e:
+        print("Could not load bitbases:", e)
+        return None
+
+
+def generate_all(directory=BITBASE_DIR, names=GENERATE_ORDER):
+    for name in names:
+        start = time.perf_counter()
+        promotions = None
+        if ENDINGS[name] == chess.PAWN:
+            promotions = [BitbaseFile(path_for(n, directory)) for n in ("KQK", "KRK")
+                          if os.path.exists(path_for(n, directory))]
+            if len(promotions) < 2:
+                raise SystemExit("KPK needs KQK and KRK, generate them first")
+        bits, dtm = generate(ENDINGS[name], promotions)
+        for table in promotions or []:
+            table.close()
+        write(path_for(name, directory), ENDINGS[name], bits, dtm)
+        wins = sum(bin(b).count("1") for b in bits)
+        longest = max(d for d in dtm if d != UNKNOWN)
+        print(f"{name}: {wins} won positions, longest mate {longest} plies, {time.perf_counter() - start:.1f}s")
+
+
+# the board for a table index, None for impossible positions
+def board_for(piece_type, idx):
+    stm, wk, bk, p = idx >> 18, idx >> 12 & 63, idx >> 6 & 63, idx & 63
+    if len({wk, bk, p}) < 3 or (piece_type == chess.PAWN and not chess.A2 <= p < chess.A8):
+        return None
+    board = chess.Board(None)
+    board.set_piece_at(wk, chess.Piece(chess.KING, chess.WHITE))
+    board.set_piece_at(bk, chess.Piece(chess.KING, chess.BLACK))
+    board.set_piece_at(p, chess.Piece(piece_type, chess.WHITE))
+    board.turn = chess.WHITE if stm == 0 else chess.BLACK
+    return board if board.is_valid() else None
+
+
+# exhaustive search: True if the side to move can force mate within depth plies
+def can_mate(board, depth):
+    if board.is_checkmate():
+        return False
+    if depth <= 0:
+        return False
+    for move in board.legal_moves:
+        board.push(move)
+        try:
+            if board.is_checkmate() or (depth >= 3 and must_lose(board, depth - 1)):
+                return True
+        finally:
+            board.pop()
+    return False
+
+
+# True if every move of the side to move (who is not mated) leads to mate within depth plies
+def must_lose(board, depth):
+    if board.is_checkmate():
+        return True
+    if depth <= 1 or board.is_stalemate() or board.is_insufficient_material():
+        return False
+    for move in board.legal_moves:
+        board.push(move)
+        try:
+            if not can_mate(board, depth - 1):
+                return False
+        finally:
+            board.pop()
+    return True
+
+
+# checks sampled positions two ways with python-chess as the independent move generator:
+# every position must agree with its successors (a win has a successor lost one ply sooner and
+# none sooner, a loss has every successor won and the slowest one ply sooner, a draw has
+# neither), and positions with short mates are confirmed by an exhaustive mate search.
+def verify(directory=BITBASE_DIR, sample=20000, search_depth=5, seed=0):
+    bitbases = Bitbases(directory)
+    rng = random.Random(seed)
+    failures = 0
+    for name, piece_type in ENDINGS.items():
+        if piece_type not in bitbases.tables:
+            print(f"{name}: not generated")
+            continue
+        checked = searched = 0
+        start = time.perf_counter()
+        while checked < sample:
+            board = board_for(piece_type, rng.randrange(SIZE))
+            if board is None:
+                continue
+            checked += 1
+            error = check_position(bitbases, board)
+            wdl, distance = bitbases.probe(board)
+            if error is None and wdl != 0 and 0 < distance <= search_depth:
+                searched += 1
+                if wdl == 1 and not (can_mate(board, distance) and not can_mate(board, distance - 2)):
+                    error = f"search does not find mate in {distance} plies"
+                if wdl == -1 and not (must_lose(board, distance) and not must_lose(board, distance - 2)):
+                    error = f"search does not find a loss in {distance} plies"
+            if error is not None:
+                failures += 1
+                if failures <= 10:
+                    print(f"{name} {board.fen()}: {error}")
+        print(f"{name}: {checked} positions checked, {searched} confirmed by search, {time.perf_counter() - start:.1f}s")
+    bitbases.close()
+    return failures
+
+
+# None if the probe of board agrees with the probes of its successors, otherwise the problem
+def check_position(bitbases, board):
+    wdl, distance = bitbases.probe(board)
+    if board.is_checkmate():
+        return None if (wdl, distance) == (-1, 0) else f"mate probed as {wdl}"
+    children = []
+    for move in board.legal_moves:
+        board.push(move)
+        after = bitbases.probe(board)
+        board.pop()
+        if after is None:
+            # a promotion to a bishop or knight, always a draw
+            after = (0, None)
+        children.append(after)
+    if wdl == 1:
+        lost = [d for w, d in children if w == -1]
+        if not lost or min(lost) != distance - 1:
+            return f"win in {distance} but the fastest lost successor is {min(lost) if lost else None}"
+    elif wdl == -1:
+        if any(w != 1 for w, _ in children) or max(d for _, d in children) != distance - 1:
+            return f"loss in {distance} but not every successor is won one ply sooner"
+    elif any(w == -1 for w, _ in children):
+        return "draw with a lost successor"
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate and verify KQK/KRK/KPK endgame bitbases.")
+    parser.add_argument("--dir", default=BITBASE_DIR)
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("generate", help="build the bitbases by retrograde analysis")
+    check = sub.add_parser("verify", help="check the bitbases against move generation and search")
+    check.add_argument("--sample", type=int, default=20000, help="positions to check per ending")
+    check.add_argument("--search-depth", type=int, default=5, help="confirm mates up to this many plies by search")
+    args = parser.parse_args()
+
+    if args.command == "generate":
+        generate_all(args.dir)
+    else:
+        failures = verify(args.dir, args.sample, args.search_depth)
+        print("OK" if not failures else f"{failures} positions failed")
+        raise SystemExit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
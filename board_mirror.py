@@ -0,0 +1,82 @@
+import os, sys
+import chess
+
+# with CHESS_DEBUG=1 in the environment every update is checked against the real board
+DEBUG = bool(os.environ.get("CHESS_DEBUG"))
+
+# one interned string per piece ("wp" ... "bk"), the same objects the sprite dicts are keyed by
+CODES = {(color, piece_type): sys.intern(("w" if color == chess.WHITE else "b") + chess.piece_symbol(piece_type))
+         for color in chess.COLORS for piece_type in chess.PIECE_TYPES}
+
+
+# flat 64-entry copy of the board in screen order: index = row * 8 + col with row 0 at rank 8,
+# which is square ^ 56. it is kept up to date from the squares each move touches (from/to,
+# the castling rook, the pawn taken en passant, the promoted piece) instead of being rebuilt
+# from piece_map() after every move, and every change is recorded so pop() can undo it.
+
+class BoardMirror:
+
+    def __init__(self, board=None):
+        self.squares = [None] * 64
+        self.history = []
+        if board is not None:
+            self.reset(board)
+
+    def reset(self, board):
+        squares = self.squares
+        for i in range(64):
+            squares[i] = None
+        for sq, piece in board.piece_map().items():
+            squares[sq ^ 56] = CODES[piece.color, piece.piece_type]
+        self.history.clear()
+
+    # call before board.push(move). returns the screen indices that changed
+    def push(self, board, move):
+        squares = self.squares
+        delta = []
+
+        def put(sq, code):
+            i = sq ^ 56
+            delta.append((i, squares[i]))
+            squares[i] = code
+
+        if move:
+            piece = squares[move.from_square ^ 56]
+            color = chess.WHITE if piece[0] == "w" else chess.BLACK
+            if board.is_castling(move):
+                rank = chess.square_rank(move.from_square)
+                kingside = board.is_kingside_castling(move)
+                rook = CODES[color, chess.ROOK]
+                # python-chess also accepts castling written as the king taking its own rook
+                rook_from = move.to_square if squares[move.to_square ^ 56] is rook else chess.square(7 if kingside else 0, rank)
+                put(move.from_square, None)
+                put(rook_from, None)
+                put(chess.square(6 if kingside else 2, rank), piece)
+                put(chess.square(5 if kingside else 3, rank), rook)
+            else:
+                if board.is_en_passant(move):
+                    put(move.to_square - 8 if color == chess.WHITE else move.to_square + 8, None)
+                put(move.from_square, None)
+                put(move.to_square, CODES[color, move.promotion] if move.promotion else piece)
+
+        self.history.append(delta)
+        if DEBUG:
+            after = board.copy(stack=False)
+            after.push(move)
+            self.check(after)
+        return frozenset(i for i, _ in delta)
+
+    # undoes the last push, returns the screen indices that changed
+    def pop(self):
+        delta = self.history.pop()
+        squares = self.squares
+        for i, old in reversed(delta):
+            squares[i] = old
+        return frozenset(i for i, _ in delta)
+
+    def check(self, board):
+        for sq in chess.SQUARES:
+            piece = board.piece_at(sq)
+            expected = CODES[piece.color, piece.piece_type] if piece else None
+            assert self.squares[sq ^ 56] == expected, \
+                f"board mirror out of sync on {chess.square_name(sq)}: {self.squares[sq ^ 56]} != {expected}"
@@ -0,0 +1,415 @@
+import queue, threading, time
+import chess, chess.engine
+
+from engine_async import EngineReply
+
+# built-in pure-python engine, used when no UCI engine can be started.
+# iterative deepening alpha-beta with a transposition table, quiescence search and
+# TT move / MVV-LVA / killer / history move ordering, searched under a hard time budget.
+# play(board, limit) has the same shape as chess.engine.SimpleEngine.play.
+
+MATE = 100000
+INF = 10 * MATE
+
+VALUES = {chess.PAWN: 100, chess.KNIGHT: 320, chess.BISHOP: 330, chess.ROOK: 500, chess.QUEEN: 900, chess.KING: 0}
+
+# piece-square tables from white's point of view, written rank 8 first like a diagram
+PST_DIAGRAM = {
+    chess.PAWN: [
+        0, 0, 0, 0, 0, 0, 0, 0,
+        50, 50, 50, 50, 50, 50, 50, 50,
+        10, 10, 20, 30, 30, 20, 10, 10,
+        5, 5, 10, 25, 25, 10, 5, 5,
+        0, 0, 0, 20, 20, 0, 0, 0,
+        5, -5, -10, 0, 0, -10, -5, 5,
+        5, 10, 10, -20, -20, 10, 10, 5,
+        0, 0, 0, 0, 0, 0, 0, 0,
+    ],
+    chess.KNIGHT: [
+        -50, -40, -30, -30, -30, -30, -40, -50,
+        -40, -20, 0, 0, 0, 0, -20, -40,
+        -30, 0, 10, 15, 15, 10, 0, -30,
+        -30, 5, 15, 20, 20, 15, 5, -30,
+        -30, 0, 15, 20, 20, 15, 0, -30,
+        -30, 5, 10, 15, 15, 10, 5, -30,
+        -40, -20, 0, 5, 5, 0, -20, -40,
+        -50, -40, -30, -30, -30, -30, -40, -50,
+    ],
+    chess.BISHOP: [
+        -20, -10, -10, -10, -10, -10, -10, -20,
+        -10, 0, 0, 0, 0, 0, 0, -10,
+        -10, 0, 5, 10, 10, 5, 0, -10,
+        -10, 5, 5, 10, 10, 5, 5, -10,
+        -10, 0, 10, 10, 10, 10, 0, -10,
+        -10, 10, 10, 10, 10, 10, 10, -10,
+        -10, 5, 0, 0, 0, 0, 5, -10,
+        -20, -10, -10, -10, -10, -10, -10, -20,
+    ],
+    chess.ROOK: [
+        0, 0, 0, 0, 0, 0, 0, 0,
+        5, 10, 10, 10, 10, 10, 10, 5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        0, 0, 0, 5, 5, 0, 0, 0,
+    ],
+    chess.QUEEN: [
+        -20, -10, -10, -5, -5, -10, -10, -20,
+        -10, 0, 0, 0, 0, 0, 0, -10,
+        -10, 0, 5, 5, 5, 5, 0, -10,
+        -5, 0, 5, 5, 5, 5, 0, -5,
+        0, 0, 5, 5, 5, 5, 0, -5,
+        -10, 5, 5, 5, 5, 5, 0, -10,
+        -10, 0, 5, 0, 0, 0, 0, -10,
+        -20, -10, -10, -5, -5, -10, -10, -20,
+    ],
+    chess.KING: [
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -20, -30, -30, -40, -40, -30, -30, -20,
+        -10, -20, -20, -20, -20, -20, -20, -10,
+        20, 20, 0, 0, 0, 0, 20, 20,
+        20, 30, 10, 0, 0, 10, 30, 20,
+    ],
+}
+
+# PST[color][piece_type][square] including the material value, indexed by python-chess squares
+PST = {chess.WHITE: {}, chess.BLACK: {}}
+for _pt, _table in PST_DIAGRAM.items():
+    PST[chess.WHITE][_pt] = [VALUES[_pt] + _table[chess.square_mirror(sq)] for sq in chess.SQUARES]
+    PST[chess.BLACK][_pt] = [VALUES[_pt] + _table[sq] for sq in chess.SQUARES]
+
+TT_EXACT, TT_LOWER, TT_UPPER = 0, 1, 2
+MAX_PLY = 64
+
+
+class SearchTimeout(Exception):
+    pass
+
+
+# static evaluation from the side to move's point of view
+def evaluate(board):
+    score = 0
+    for pt in (chess.PAWN, chess.KNIGHT, chess.BISHOP, chess.ROOK, chess.QUEEN, chess.KING):
+        white_table = PST[chess.WHITE][pt]
+        black_table = PST[chess.BLACK][pt]
+        for sq in chess.scan_forward(board.pieces_mask(pt, chess.WHITE)):
+            score += white_table[sq]
+        for sq in chess.scan_forward(board.pieces_mask(pt, chess.BLACK)):
+            score -= black_table[sq]
+    return score if board.turn == chess.WHITE else -score
+
+
+class BuiltinEngine:
+
+    def __init__(self, tt_size=1 << 20):
+        self.tt = {}
+        self.tt_size = tt_size
+        self.options = {}
+        self.nodes = 0
+        self.deadline = None
+        self.node_limit = None
+        self.stop_event = threading.Event()
+
+    def configure(self, options):
+        self.options.update(options)
+
+    def quit(self):
+        self.tt.clear()
+
+    # interrupts a search running in another thread, it returns its best move so far
+    def stop(self):
+        self.stop_event.set()
+
+    # seconds the search may use: a share of the side's clock, at most the limit's time
+    def budget(self, board, limit):
+        clock = limit.white_clock if board.turn == chess.WHITE else limit.black_clock
+        inc = (limit.white_inc if board.turn == chess.WHITE else limit.black_inc) or 0
+        if clock is not None:
+            moves_left = limit.remaining_moves or 30
+            share = max(0.01, min(clock / moves_left + inc * 0.8, clock * 0.5))
+            return share if limit.time is None else min(share, limit.time)
+        return limit.time
+
+    def play(self, board, limit, **kwargs):
+        board = board.copy()
+        start = time.perf_counter()
+        budget = self.budget(board, limit)
+        self.deadline = start + budget if budget is not None else None
+        self.node_limit = limit.nodes
+        max_depth = limit.depth or MAX_PLY
+        self.stop_event.clear()
+
+        self.nodes = 0
+        self.killers = [[None, None] for _ in range(MAX_PLY + 1)]
+        self.history = {}
+        if len(self.tt) > self.tt_size:
+            self.tt.clear()
+
+        legal = list(board.legal_moves)
+        if not legal:
+            return chess.engine.PlayResult(None, None)
+
+        best_move, best_score, depth_done = legal[0], 0, 0
+        # a single legal move needs no search
+        if len(legal) == 1:
+            max_depth = 1
+
+        root_ply = len(board.move_stack)
+        for depth in range(1, max_depth + 1):
+            try:
+                score = self.search(board, depth, -INF, INF, 0)
+            except SearchTimeout:
+                # the timeout unwinds the search without popping its moves
+                while len(board.move_stack) > root_ply:
+                    board.pop()
+                break
+            entry = self.tt.get(board._transposition_key())
+            if entry is not None and entry[3] is not None:
+                best_move = entry[3]
+            best_score, depth_done = score, depth
+            if abs(score) >= MATE - MAX_PLY:
+                break
+            # the next iteration would not finish in the remaining time
+            if self.deadline is not None and time.perf_counter() > start + (self.deadline - start) * 0.5:
+                break
+
+        elapsed = time.perf_counter() - start
+        pv = self.principal_variation(board, depth_done)
+        if not pv or pv[0] != best_move:
+            pv = [best_move]
+        info = {
+            "depth": depth_done,
+            "nodes": self.nodes,
+            "time": elapsed,
+            "nps": int(self.nodes / elapsed) if elapsed > 0 else 0,
+            "score": chess.engine.PovScore(self.to_score(best_score), board.turn),
+            "pv": pv,
+        }
+        return chess.engine.PlayResult(best_move, pv[1] if len(pv) > 1 else None, info)
+
+    def to_score(self, score):
+        if score >= MATE - MAX_PLY:
+            return chess.engine.Mate((MATE - score + 1) // 2)
+        if score <= -(MATE - MAX_PLY):
+            return chess.engine.Mate(-((MATE + score) // 2))
+        return chess.engine.Cp(score)
+
+    def principal_variation(self, board, depth):
+        pv = []
+        b = board.copy(stack=False)
+        for _ in range(depth):
+            entry = self.tt.get(b._transposition_key())
+            if entry is None or entry[3] is None or entry[3] not in b.legal_moves:
+                break
+            pv.append(entry[3])
+            b.push(entry[3])
+        return pv
+
+    def check_time(self):
+        if self.stop_event.is_set():
+            raise SearchTimeout()
+        if self.deadline is not None and time.perf_counter() >= self.deadline:
+            raise SearchTimeout()
+        if self.node_limit is not None and self.nodes >= self.node_limit:
+            raise SearchTimeout()
+
+    # MVV-LVA for captures, then killers, then history
+    def order_moves(self, board, moves, tt_move, ply):
+        killers = self.killers[ply]
+        history = self.history
+        scored = []
+        for move in moves:
+            if move == tt_move:
+                key = 10000000
+            elif board.is_capture(move):
+                victim = board.piece_type_at(move.to_square) or chess.PAWN
+                attacker = board.piece_type_at(move.from_square)
+                key = 1000000 + VALUES[victim] * 10 - VALUES[attacker] // 10
+            elif move.promotion:
+                key = 900000 + VALUES[move.promotion]
+            elif move == killers[0]:
+                key = 800000
+            elif move == killers[1]:
+                key = 700000
+            else:
+                key = history.get((board.turn, move.from_square, move.to_square), 0)
+            scored.append((key, move))
+        scored.sort(key=lambda item: item[0], reverse=True)
+        return [move for _, move in scored]
+
+    def search(self, board, depth, alpha, beta, ply):
+        self.nodes += 1
+        if self.nodes & 1023 == 0:
+            self.check_time()
+
+        if ply > 0:
+            if board.halfmove_clock >= 100 or board.is_insufficient_material():
+                return 0
+            if board.halfmove_clock >= 4 and board.is_repetition(2):
+                return 0
+
+        in_check = board.is_check()
+        if in_check:
+            depth += 1
+        if depth <= 0 or ply >= MAX_PLY:
+            return self.quiesce(board, alpha, beta, ply)
+
+        key = board._transposition_key()
+        entry = self.tt.get(key)
+        tt_move = None
+        if entry is not None:
+            e_depth, e_flag, e_score, tt_move = entry
+            e_score = self.from_tt(e_score, ply)
+            if ply > 0 and e_depth >= depth:
+                if e_flag == TT_EXACT:
+                    return e_score
+                if e_flag == TT_LOWER and e_score >= beta:
+                    return e_score
+                if e_flag == TT_UPPER and e_score <= alpha:
+                    return e_score
+
+        moves = list(board.legal_moves)
+        if not moves:
+            return -MATE + ply if in_check else 0
+
+        alpha_orig = alpha
+        best_score = -INF
+        best_move = None
+        for move in self.order_moves(board, moves, tt_move, ply):
+            board.push(move)
+            score = -self.search(board, depth - 1, -beta, -alpha, ply + 1)
+            board.pop()
+
+            if score > best_score:
+                best_score = score
+                best_move = move
+            if score > alpha:
+                alpha = score
+            if alpha >= beta:
+                if not board.is_capture(move):
+                    killers = self.killers[ply]
+                    if killers[0] != move:
+                        killers[1] = killers[0]
+                        killers[0] = move
+                    hkey = (board.turn, move.from_square, move.to_square)
+                    self.history[hkey] = self.history.get(hkey, 0) + depth * depth
+                break
+
+        if best_score <= alpha_orig:
+            flag = TT_UPPER
+        elif best_score >= beta:
+            flag = TT_LOWER
+        else:
+            flag = TT_EXACT
+        self.tt[key] = (depth, flag, self.to_tt(best_score, ply), best_move)
+        return best_score
+
+    # mate scores are stored relative to the node, so they stay right when reached at another ply
+    def to_tt(self, score, ply):
+        if score >= MATE - MAX_PLY:
+            return score + ply
+        if score <= -(MATE - MAX_PLY):
+            return score - ply
+        return score
+
+    def from_tt(self, score, ply):
+        if score >= MATE - MAX_PLY:
+            return score - ply
+        if score <= -(MATE - MAX_PLY):
+            return score + ply
+        return score
+
+    # captures and promotions only, until the position is quiet
+    def quiesce(self, board, alpha, beta, ply):
+        self.nodes += 1
+        if self.nodes & 1023 == 0:
+            self.check_time()
+
+        stand_pat = evaluate(board)
+        if stand_pat >= beta:
+            return stand_pat
+        if stand_pat > alpha:
+            alpha = stand_pat
+        if ply >= MAX_PLY:
+            return stand_pat
+
+        captures = list(board.generate_legal_captures())
+        for move in self.order_moves(board, captures, None, ply):
+            # delta pruning: even winning the piece cannot raise alpha
+            victim = board.piece_type_at(move.to_square) or chess.PAWN
+            if stand_pat + VALUES[victim] + 200 < alpha and not move.promotion:
+                continue
+            board.push(move)
+            score = -self.quiesce(board, -beta, -alpha, ply + 1)
+            board.pop()
+            if score >= beta:
+                return score
+            if score > alpha:
+                alpha = score
+        return alpha
+
+
+# runs the built-in engine on one long-lived worker thread and exposes the same
+# request_move / poll / cancel / quit interface as AsyncEngineDriver, so the game can
+# fall back to it without any other change.
+
+class BuiltinEngineDriver:
+
+    def __init__(self, options=None, on_reply=None):
+        self.engine = BuiltinEngine()
+        self.options = dict(options or {})
+        self.engine.configure(self.options)
+        self.on_reply = on_reply
+
+        self.requests = queue.Queue()
+        self.replies = queue.Queue()
+        self.generation = 0
+        self.thread = threading.Thread(target=self.run, name="builtin-engine", daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def run(self):
+        while True:
+            request = self.requests.get()
+            if request is None:
+                return
+            generation, board, limit = request
+            started = time.perf_counter()
+            try:
+                result = self.engine.play(board, limit)
+                move, info = result.move, result.info
+            except Exception as e:
+                print(f"Engine play failed: {e}")
+                move, info = None, {}
+            if generation != self.generation:
+                continue
+            self.replies.put(EngineReply(board.fen(), move, info, False, time.perf_counter() - started))
+            if self.on_reply is not None:
+                self.on_reply()
+
+    def request_move(self, board, limit):
+        self.requests.put((self.generation, board.copy(), limit))
+
+    def poll(self):
+        try:
+            return self.replies.get_nowait()
+        except queue.Empty:
+            return None
+
+    def cancel(self):
+        self.generation += 1
+        self.engine.stop()
+        while self.poll() is not None:
+            pass
+
+    def quit(self):
+        self.cancel()
+        self.requests.put(None)
+        self.thread.join(5)
@@ -1,14 +1,32 @@
+from startup_profiler import profiler
 import pygame, os, chess
-import threading, time
-import chess.engine, chess.pgn
-# import chess.polyglot
+import argparse, threading, time
+from opening_book import open_book
+from bitbase import open_bitbases
+from renderer import BoardRenderer
+from sprite_atlas import SpriteAtlas
+from position_state import PositionCache
+from game_driver import GameDriver
+from game_history import ALL_SQUARES
+from pgn_journal import GameJournal
+from instrumentation import metrics, MetricsOverlay
+from game_clock import DEFAULT_TIME_CONTROL, ChessClock, ClockFace, latency_budget
+from premove import PremoveQueue
 
 SQUARE = 100
 WINDOW = SQUARE * 8
 WIDTH = 800
 HEIGHT = 800
-game_over = False
-winner = None
+# the final position stays on screen this long before the end screen
+END_SCREEN_DELAY = 2
+
+# redraws are event driven, MAX_FPS only caps how fast a burst of events is rendered
+MAX_FPS = 60
+HISTORY_KEYS = (pygame.K_LEFT, pygame.K_RIGHT, pygame.K_HOME, pygame.K_END, pygame.K_z, pygame.K_y)
+# posted by the engine thread when a reply is queued or the engine has started
+ENGINE_EVENT = pygame.event.custom_type()
+
+profiler.mark("imports")
 
 
 # loads images for each chess piece and move marker. scales them to fit the board squares.
@@ -49,21 +67,47 @@ def starting_board():
         ['wr','wn','wb','wq','wk','wb','wn','wr']
     ]
 
-def end_screen(screen, winner):
+# SysFont searches the system fonts, so each size is only created once
+
+FONTS = {}
+
+def get_font(size):
+    font = FONTS.get(size)
+    if font is None:
+        font = FONTS[size] = pygame.font.SysFont(None, size)
+    return font
+
+
+def end_screen(screen, winner, reason="has been checkmated"):
 
     screen.fill((0, 0, 0))
-    font = pygame.font.SysFont(None, 72)
-    text = font.render(f"{winner} has been checkmated!", True, (255, 0, 0))
-    rect = text.get_rect(center=(WIDTH // 2, HEIGHT // 2))
+    font = get_font(72)
+    text = font.render(f"{winner} {reason}!", True, (255, 0, 0))
+    width, height = screen.get_size()
+    rect = text.get_rect(center=(width // 2, height // 2))
     screen.blit(text, rect)
 
-    small_font = pygame.font.SysFont(None, 36)
+    small_font = get_font(36)
     msg = small_font.render("Click screen for a rematch or close this window to exit", True, (200, 200, 200))
-    msg_rect = msg.get_rect(center=(WIDTH // 2, HEIGHT // 2 + 80))
+    msg_rect = msg.get_rect(center=(width // 2, height // 2 + 80))
     screen.blit(msg, msg_rect)
     # time.sleep(5)
 
 
+# the end screen's text for a game the game server ended, as (who, what happened)
+def server_end_text(result, reason):
+    if result == "1/2-1/2":
+        return "Draw by", reason.replace("_", " ")
+    loser = "White" if result == "0-1" else "Black"
+    if reason == "time":
+        return loser, "ran out of time"
+    if reason == "checkmate":
+        return loser, "has been checkmated"
+    if reason == "resignation":
+        return loser, "resigned"
+    return loser, f"lost by {reason.replace('_', ' ')}"
+
+
 # draws the chessboard and places the images of the pieces in their squares. 
 # It also highlights the legal moves for a selected piece using an marker image.
 
@@ -100,7 +144,7 @@ def draw_board(screen, board, images, legal_moves=None, board_obj=None):
 
             # --------------------------------
 
-            piece = board[row][col]
+            piece = board[row * 8 + col]
             if piece:
                 img = images.get(piece)
                 if img:
@@ -120,207 +164,666 @@ def draw_board(screen, board, images, legal_moves=None, board_obj=None):
                     if to_row == row and to_col == col:
                         screen.blit(images['identifier'], (col * SQUARE, row * SQUARE))
 
-def game():
-        global game_over, winner
-        pygame.init()
-        screen = pygame.display.set_mode((WINDOW, WINDOW))
+# starts the engine: the UCI engine at path if it can be spawned, otherwise the built-in one.
+# the engine modules are imported here, so none of them is on the path to the first frame.
+
+def load_engine(path, options, on_reply=None):
+    import chess.engine
+    from engine_cache import EngineCache
+    from engine_async import AsyncEngineDriver
+    from builtin_engine import BuiltinEngineDriver
+
+    try:
+        # one asyncio engine driver for the whole session, it ponders while the player thinks.
+        # results are cached by position, so positions seen in earlier games reply instantly
+        return AsyncEngineDriver(path, options, cache=EngineCache(), on_reply=on_reply).start()
+    except Exception as e:
+        # no subprocess needed, the built-in engine is always available
+        print("Could not load engine:", e)
+        print("Using the built-in engine instead")
+        return BuiltinEngineDriver(options, on_reply=on_reply).start()
+
+
+# starts the UCI engine at path for the analysis mode, None if it can not be spawned
+def load_analysis(path, lines, on_update=None):
+    from analysis import AnalysisEngine
+    try:
+        return AnalysisEngine(path, lines, on_update=on_update).start()
+    except Exception as e:
+        print("Could not start the analysis engine:", e)
+        return None
+
+
+def game(profile_startup=False, metrics_path=None, build=None, time_control=DEFAULT_TIME_CONTROL, skill=0, server=None,
+         analysis_lines=3):
+        profiler.enabled = profile_startup
+
+        # only the subsystems the game uses, pygame.init() would also start audio and joysticks
+        pygame.display.init()
+        pygame.font.init()
+        screen = pygame.display.set_mode((WINDOW, WINDOW), pygame.RESIZABLE)
         pygame.display.set_caption("Chess game")
+        profiler.mark("window")
 
-        images = load_images()
-        board_obj = chess.Board()
-
-        move_count = 1
-        pending_white_move = None
+        # pre-scaled sprites, cached on disk per square size and kept in memory for recent sizes
+        atlas = SpriteAtlas()
+        renderer = BoardRenderer(atlas.images(SQUARE), SQUARE)
+        profiler.mark("sprites")
 
-        # create PGN
-        game = chess.pgn.Game()
-        game.headers["Event"] = "Python Chess Game"
-        game.headers["White"] = "Player"
-        game.headers["Black"] = "Engine"
-        node = game
+        # board, PGN and end-of-game logic live in the headless driver.
+        # legal moves, check and checkmate status for the current position are rebuilt once per push
+        # every move is streamed to game.journal by a background writer, finished games are
+        # appended to the game.pgn archive
+        journal = GameJournal()
+        driver = GameDriver(white="Player", black="Engine", positions=PositionCache(), journal=journal)
+        board_obj = driver.board
 
         # Engine path
-        STOCKFISH_PATH = r"C:\\Users\\ameri\\Downloads\\stockfish\\stockfish\\stockfish-windows-x86-64-avx2.exe"
+        STOCKFISH_PATH = os.environ.get("STOCKFISH_PATH", r"C:\\Users\\ameri\\Downloads\\stockfish\\stockfish\\stockfish-windows-x86-64-avx2.exe")
         play_vs_engine = True
         engine_color = chess.BLACK
 
+        # opening book, book moves are played instantly without asking the engine.
+        # with a game server (--server) the server plays the book and every engine move
+        use_book = server is None
+        book_mode = "weighted"   # or "best"
+        book_max_ply = 16
+        book = open_book(mode=book_mode, max_ply=book_max_ply) if use_book else None
+        # KQK/KRK/KPK bitbases (python bitbase.py generate), their positions are played perfectly
+        # without asking the engine
+        bitbases = open_bitbases() if use_book else None
+        profiler.mark("opening book")
+
+        # the engine is started in the background while the first board is already on screen.
+        # a move asked for before it is up waits in engine_pending
         engine = None
-        engine_lock = threading.Lock()
         engine_thinking = False
-
+        engine_pending = False
+        engine_asked = None
+
+        # both sides play on the clock. the engine gets both clocks and the increment, and never
+        # thinks longer than the latency budget of its skill level
+        clock = ChessClock.from_time_control(time_control)
+        engine_budget = latency_budget(skill)
+
+        # pygame.event.post is safe to call from other threads
+        def wake_up():
+            pygame.event.post(pygame.event.Event(ENGINE_EVENT))
+
+        # remote is the game server's address, None for the local engine
+        def start_engine(remote=None):
+            nonlocal engine
+            with profiler.phase("engine start"):
+                started = None
+                if remote is not None:
+                    from game_client import RemoteEngineDriver, parse_address
+                    try:
+                        started = RemoteEngineDriver(parse_address(remote), time_control, skill, on_reply=wake_up).start()
+                    except OSError as e:
+                        print(f"Could not connect to {remote}: {e}")
+                engine = started or load_engine(STOCKFISH_PATH, {"Skill Level": skill}, on_reply=wake_up)
+            # a move may be waiting in engine_pending
+            wake_up()
+
+        engine_loader = None
         if play_vs_engine:
-            try:
-                engine = chess.engine.SimpleEngine.popen_uci(STOCKFISH_PATH)
-                engine.configure({"Skill Level": 0})
-            except Exception as e:
-                print("Could not load engine:", e)
-                engine = None
-
-        def board_from_chess(b):
-            state = [[None for _ in range(8)] for _ in range(8)]
-            for sq, piece in b.piece_map().items():
-                file = chess.square_file(sq)
-                rank = chess.square_rank(sq)
-                row = 7 - rank
-                col = file
-                color = 'w' if piece.color == chess.WHITE else 'b'
-                p = piece.symbol().lower()
-                code = color + {'p':'p','r':'r','n':'n','b':'b','q':'q','k':'k'}[p]
-                state[row][col] = code
-            return state
-
-        board_state = board_from_chess(board_obj)
-        selected_legal_moves = []
+            engine_loader = threading.Thread(target=start_engine, args=(server,), name="engine-start", daemon=True)
+            engine_loader.start()
+
+        # the driver (and board_obj) is only changed here, on the main thread. the renderer and the
+        # click handlers read `view`, the read-only snapshot published after the last move, and the
+        # engine searches its own copy of the board and hands the reply back through a queue
+        view = driver.snapshot
+        # screen indices whose pieces changed since the last frame, from the board mirror
+        board_changes = set(view.changed)
+        selected_targets = frozenset()
         selected_square = None
-
-        clock = pygame.time.Clock()
+        # set when the game ends, the end screen replaces the final position at this time
+        game_over_at = None
+        end_loser = end_reason = None
+        clock.start(chess.WHITE)
+
+        # clicks while the engine thinks queue premoves, right click clears them
+        premoves = PremoveQueue(not engine_color)
+
+        def play(move):
+            nonlocal view, game_over_at, end_loser, end_reason
+            driver.push(move)
+            clock.press()
+            view = driver.snapshot
+            board_changes.update(view.changed)
+
+            if view.is_checkmate:
+                clock.stop()
+                game_over_at = time.perf_counter() + END_SCREEN_DELAY
+                end_loser, end_reason = view.checkmated, "has been checkmated"
+
+                # archive the game in game.pgn
+                driver.finish()
+
+        # plays the player's move and asks for the reply
+        def play_human(move):
+            play(move)
+            engine_turn()
+
+        # book moves, bitbase moves and the only legal move are played right away, otherwise the
+        # engine searches in the background and ENGINE_EVENT wakes the loop for its reply
+        def engine_turn():
+            nonlocal engine_thinking, engine_pending, engine_asked
+            if game_over_at is not None or not play_vs_engine or view.turn != engine_color:
+                return
+
+            engine_move = view.position.only_move if server is None else None
+            if engine_move is None and book:
+                engine_move = book.pick(board_obj)
+            if engine_move is None and bitbases:
+                engine_move = bitbases.perfect_move(board_obj)
+            if engine_move is not None:
+                apply_engine_move(engine_move)
+            else:
+                engine_thinking = True
+                engine_asked = time.perf_counter()
+                engine_pending = engine is None
+                if engine is not None:
+                    engine.request_move(board_obj, clock.limit(engine_budget))
+
+        # plays the engine's (or book's) move, then the first premove if it is still legal
+        def apply_engine_move(engine_move):
+            play(engine_move)
+
+            # Print moves in a readable formate
+            print(driver.move_line())
+
+            if game_over_at is not None:
+                premoves.clear()
+                return
+            premove = premoves.pop_legal(board_obj)
+            if premove is not None:
+                play_human(premove)
+
+        # ctrl+z takes back the player's last move (and the engine's reply), ctrl+y plays them again.
+        # the engine's move is replayed as it was, it is only asked again when there is none
+        def take_back():
+            nonlocal engine_thinking, engine_pending, view, selected_square, selected_targets
+            if game_over_at is not None or driver.ply == 0 or driver is not game_driver:
+                return
+            if engine_thinking and engine is not None:
+                engine.cancel()
+            engine_thinking = engine_pending = False
+            premoves.clear()
+            driver.pop()
+            board_changes.update(driver.changed)
+            while play_vs_engine and driver.turn == engine_color and driver.ply:
+                driver.pop()
+                board_changes.update(driver.changed)
+            view = driver.snapshot
+            selected_square = None
+            selected_targets = frozenset()
+            clock.stop()
+            clock.start(driver.turn)
+
+        def redo():
+            move = driver.history.redo_move()
+            if move is None or game_over_at is not None or engine_thinking or driver is not game_driver:
+                return
+            play(move)
+            reply = driver.history.redo_move()
+            if reply is not None and play_vs_engine and view.turn == engine_color and game_over_at is None:
+                play(reply)
+                print(driver.move_line())
+            else:
+                engine_turn()
+
+        # Left/Right step through the game, Home/End jump to the start and back to the live board.
+        # an earlier ply is shown from the history's checkpoints, the game itself does not move
+        # review_board is the reviewed position as a board of its own, for the analysis
+        review = None
+        review_board = None
+
+        def show_ply(ply):
+            nonlocal review, review_board, selected_square, selected_targets
+            reviewing = review is not None
+            if ply >= driver.ply:
+                review = review_board = None
+                board_changes.update(ALL_SQUARES)
+            else:
+                review = driver.view(max(0, ply))
+                review_board = chess.Board(review.fen)
+                board_changes.update(review.changed if reviewing else ALL_SQUARES)
+            selected_square = None
+            selected_targets = frozenset()
+
+        # "p" switches to the puzzle mode and back: the puzzles puzzle_miner.py found in finished
+        # games, played on a driver of their own, so nothing goes to the journal, and with the
+        # clock stopped. a wrong move is not played, a right one is answered by the solution's
+        # reply. "n" skips to the next puzzle. the puzzles are loaded the first time
+        game_driver = driver
+        puzzle_driver = None
+        puzzles = None
+        puzzle_overlay = None
+
+        def show_puzzle():
+            nonlocal view, review, selected_square, selected_targets
+            driver.reset(puzzles.puzzle.fen)
+            view = driver.snapshot
+            review = None
+            board_changes.update(ALL_SQUARES)
+            selected_square = None
+            selected_targets = frozenset()
+
+        def toggle_puzzles():
+            nonlocal driver, board_obj, puzzle_driver, puzzles, puzzle_overlay, engine_thinking, engine_pending
+            nonlocal view, review, selected_square, selected_targets
+            if puzzles is None:
+                from puzzles import PUZZLES_PATH, PuzzleOverlay, PuzzleSession, PuzzleStore
+                session = PuzzleSession(PuzzleStore(PUZZLES_PATH)) if os.path.exists(PUZZLES_PATH) else None
+                if session is None or session.puzzle is None:
+                    print("No puzzles yet, find some with: python puzzle_miner.py game.pgn")
+                    if session is not None:
+                        session.store.close()
+                    return
+                puzzles = session
+                puzzle_overlay = PuzzleOverlay(puzzles, renderer.square)
+                overlays.append(puzzle_overlay)
+                puzzle_driver = GameDriver(white="Player", black="Player", event="Puzzle", positions=game_driver.positions)
+            renderer.invalidate_area(puzzle_overlay.toggle())
+            if puzzle_overlay.visible:
+                if engine_thinking and engine is not None:
+                    engine.cancel()
+                engine_thinking = engine_pending = False
+                premoves.clear()
+                clock.stop()
+                driver = puzzle_driver
+                board_obj = driver.board
+                show_puzzle()
+            else:
+                driver = game_driver
+                board_obj = driver.board
+                view = driver.snapshot
+                review = None
+                board_changes.update(ALL_SQUARES)
+                selected_square = None
+                selected_targets = frozenset()
+                clock.start(driver.turn)
+                engine_turn()
+
+        def puzzle_move(move):
+            nonlocal view
+            accepted, reply = puzzles.try_move(board_obj, move)
+            for played in (move, reply) if accepted else ():
+                if played is not None:
+                    driver.push(played)
+                    view = driver.snapshot
+                    board_changes.update(view.changed)
+
+        # game database (python game_db.py import ...), opened the first time "s" is pressed
+        game_db = None
+
+        # F3 shows frame and move timings, F4 writes them to metrics.csv
+        overlay = MetricsOverlay()
+        clock_faces = [ClockFace(clock, chess.WHITE, SQUARE), ClockFace(clock, chess.BLACK, SQUARE)]
+        # everything drawn over the board, in drawing order
+        overlays = clock_faces + [overlay]
+
+        # "a" toggles the analysis mode: a second engine analyses the position on the board in the
+        # background and its best lines are drawn under the other overlays. the engine and its
+        # overlay are loaded the first time, and the search follows the board from the main loop
+        analysis = None
+        analysis_overlay = None
+        analysis_fen = None
+
+        def start_analysis():
+            nonlocal analysis
+            analysis = load_analysis(STOCKFISH_PATH, analysis_lines, on_update=wake_up)
+            analysis_overlay.analysis = analysis
+            wake_up()
+
+        # the loop sleeps in pygame.event.wait() until something happens: input, a window event,
+        # or ENGINE_EVENT from the engine thread. it only wakes up on a timer while something on
+        # screen changes by itself (the metrics overlay), and never renders faster than MAX_FPS.
+        # mouse motion is not used, so it does not wake the loop either
+        pygame.event.set_blocked(pygame.MOUSEMOTION)
+        frame_clock = pygame.time.Clock()
         running = True
+        end_screen_drawn = False
+        events = []
 
         while running:
-            screen.fill((0, 0, 0))
+            frame_start = time.perf_counter()
+            game_over = game_over_at is not None and frame_start >= game_over_at
+
+            # a flag fall ends the game, the side still on the clock wins
+            if game_over_at is None and clock.flagged(frame_start) is not None:
+                loser = clock.flagged(frame_start)
+                clock.stop(frame_start)
+                if engine_thinking and engine is not None:
+                    engine.cancel()
+                engine_thinking = engine_pending = False
+                premoves.clear()
+                game_over_at = frame_start + END_SCREEN_DELAY
+                end_loser = "White" if loser == chess.WHITE else "Black"
+                end_reason = "ran out of time"
+                driver.finish("0-1" if loser == chess.WHITE else "1-0")
+
+            # Engine reply, replies for a position that is no longer on the board are dropped
+            if engine_thinking and engine is not None:
+                if engine_pending:
+                    engine.request_move(board_obj, clock.limit(engine_budget))
+                    engine_pending = False
+                reply = engine.poll()
+                if reply is not None:
+                    engine_thinking = False
+                    # a half-entered premove was selected on the old position
+                    selected_square = None
+                    selected_targets = frozenset()
+                    if reply.move is not None and reply.fen == view.fen:
+                        metrics.record("engine wait", time.perf_counter() - engine_asked)
+                        apply_engine_move(reply.move)
+                    elif reply.info.get("error") and reply.fen == view.fen:
+                        # the game server rejected the game: the local engine takes over
+                        print("Playing against the local engine instead")
+                        engine.quit()
+                        engine = None
+                        engine_loader = threading.Thread(target=start_engine, name="engine-start", daemon=True)
+                        engine_loader.start()
+                        engine_turn()
+
+            # the game server ended the game on its board (a flag fall, a draw), after the
+            # engine's last move above was played
+            ended = getattr(engine, "game_result", None)
+            ended = ended() if ended is not None else None
+            if ended is not None and game_over_at is None:
+                clock.stop(frame_start)
+                engine_thinking = engine_pending = False
+                premoves.clear()
+                game_over_at = frame_start + END_SCREEN_DELAY
+                end_loser, end_reason = server_end_text(*ended)
+                driver.finish(ended[0])
+
+            events_start = time.perf_counter()
+            metrics.record("engine poll", events_start - frame_start)
+
+            # the window stopped resizing: the scaled stand-in sprites make way for the real ones
+            settled = atlas.settled(events_start)
+            if settled is not None and settled[0] == renderer.square:
+                renderer.resize(*settled)
 
-            # End screen
-            if game_over:
-                end_screen(screen, winner)
-                pygame.display.flip()
+            # Main loop
+            for event in events:
+                if event.type == pygame.QUIT:
+                    running = False
 
-                for event in pygame.event.get():
-                    if event.type == pygame.QUIT:
-                        running = False
+                if event.type in (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED):
+                    renderer.invalidate()
+                    end_screen_drawn = False
+
+                # the board is rescaled to the largest square size that fits the window
+                if event.type == pygame.VIDEORESIZE:
+                    square = max(16, min(event.w, event.h) // 8)
+                    screen = pygame.display.get_surface()
+                    screen.fill((0, 0, 0))
+                    pygame.display.flip()
+                    if square != renderer.square:
+                        renderer.resize(square, atlas.resized(square))
+                        for face in clock_faces:
+                            face.resize(square)
+                        if analysis_overlay is not None:
+                            analysis_overlay.resize(square)
+                        if puzzle_overlay is not None:
+                            puzzle_overlay.resize(square)
+                    renderer.invalidate()
+                    end_screen_drawn = False
+
+                if event.type == pygame.KEYDOWN and event.key in HISTORY_KEYS:
+                    shown_ply = review.ply if review is not None else driver.ply
+                    if event.key == pygame.K_LEFT:
+                        show_ply(shown_ply - 1)
+                    elif event.key == pygame.K_RIGHT:
+                        show_ply(shown_ply + 1)
+                    elif event.key == pygame.K_HOME:
+                        show_ply(0)
+                    elif event.key == pygame.K_END:
+                        show_ply(driver.ply)
+                    elif getattr(event, "mod", 0) & pygame.KMOD_CTRL:
+                        show_ply(driver.ply)
+                        if event.key == pygame.K_z:
+                            take_back()
+                        else:
+                            redo()
+                    continue
 
+                # End screen
+                if game_over:
                     if event.type == pygame.MOUSEBUTTONDOWN:
                         # Reset everything
-                        board_obj.reset()
-                        board_state = board_from_chess(board_obj)
+                        if engine:
+                            engine.cancel()
+                        engine_thinking = False
+                        engine_pending = False
+                        # new board and PGN
+                        driver.reset()
+                        view = driver.snapshot
+                        review = None
+                        board_changes.update(view.changed)
                         selected_square = None
-                        selected_legal_moves = None
-                        game_over = False
-                        winner = None
+                        selected_targets = frozenset()
+                        game_over_at = None
+                        premoves.clear()
+                        clock.reset()
+                        clock.start(chess.WHITE)
+                    continue
+
+                # "s" prints the games and move statistics for the current position
+                if event.type == pygame.KEYDOWN and event.key == pygame.K_s:
+                    from game_db import DB_PATH, GameDatabase, print_stats
+                    if game_db is None and os.path.exists(DB_PATH):
+                        game_db = GameDatabase(DB_PATH)
+                    if game_db is not None:
+                        print_stats(game_db, board_obj)
+                    else:
+                        print("No game database, create one with: python game_db.py import game.pgn")
 
-                        # reset PGN
-                        game = chess.pgn.Game()
-                        node = game
+                if event.type == pygame.KEYDOWN and event.key == pygame.K_p and game_over_at is None:
+                    toggle_puzzles()
 
-                continue
+                if event.type == pygame.KEYDOWN and event.key == pygame.K_n and driver is puzzle_driver:
+                    puzzles.next()
+                    show_puzzle()
 
-            # Main loop
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:
-                    running = False
+                if event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+                    renderer.invalidate_area(overlay.toggle())
+
+                if event.type == pygame.KEYDOWN and event.key == pygame.K_a:
+                    if analysis_overlay is None:
+                        from analysis import AnalysisOverlay
+                        analysis_overlay = AnalysisOverlay(board_obj, renderer.square)
+                        overlays.insert(0, analysis_overlay)
+                        threading.Thread(target=start_analysis, name="analysis-start", daemon=True).start()
+                    renderer.invalidate_area(analysis_overlay.toggle())
+
+                if event.type == pygame.KEYDOWN and event.key == pygame.K_F4:
+                    metrics.export(metrics_path or "metrics.csv", build)
+                    print("Metrics written to", metrics_path or "metrics.csv")
 
                 if event.type == pygame.MOUSEBUTTONDOWN:
-                    if engine_thinking:
+                    if game_over_at is not None:
+                        continue
+
+                    # a click while looking at an earlier ply goes back to the game
+                    if review is not None:
+                        show_ply(driver.ply)
+                        continue
+
+                    # right click drops the selection and every queued premove
+                    if event.button == 3:
+                        premoves.clear()
+                        selected_square = None
+                        selected_targets = frozenset()
                         continue
 
                     x, y = event.pos
-                    col = x // SQUARE
-                    row = y // SQUARE
+                    col = x // renderer.square
+                    row = y // renderer.square
+                    if col > 7 or row > 7:
+                        continue
 
                     file = col
                     rank = 7 - row
                     sq = chess.square(file, rank)
 
-                    piece = board_obj.piece_at(sq)
+                    # during the engine's turn clicks queue premoves instead of moves
+                    if engine_thinking:
+                        if selected_square is None:
+                            if premoves.own_piece(board_obj, sq):
+                                selected_square = sq
+                                selected_targets = premoves.targets(board_obj, sq)
+                        else:
+                            premoves.add(board_obj, selected_square, sq)
+                            selected_square = None
+                            selected_targets = frozenset()
+                        continue
+
+                    piece = view.piece(sq)
 
                     # First click: select a piece
                     if selected_square is None:
-                        if piece and piece.color == board_obj.turn:
+                        if piece and piece[0] == ("w" if view.turn == chess.WHITE else "b"):
                             selected_square = sq
-                            selected_legal_moves = [
-                                m for m in board_obj.legal_moves if m.from_square == sq
-                            ]
+                            selected_targets = view.position.targets(sq)
                         else:
-                            selected_legal_moves = []
+                            selected_targets = frozenset()
 
                     else:
                         # Second click: attempt move
-                        move = None
-                        for m in board_obj.legal_moves:
-                            if m.from_square == selected_square and m.to_square == sq:
-                                move = m
-                                break
+                        move = view.position.move(selected_square, sq)
 
                         if move:
 
-                            san_str = board_obj.san(move)
-
-                            board_obj.push(move)
-                            board_state = board_from_chess(board_obj)
-
-                            node = node.add_variation(move)
-
-                            # Store white's move
-                            pending_white_move = san_str
-
-                            # looks for checkmate
-                            if board_obj.is_checkmate():
-                                winner = "White" if board_obj.turn == chess.WHITE else "Black"
-                                time.sleep(2)
-                                game_over = True
-
-                                # save PGN file after game
-                                with open("game.pgn", "w") as f:
-                                    print(game, file=f)
-
-                                continue
-
                             selected_square = None
-                            selected_legal_moves = []
-
-                            # Engine move
-                            if play_vs_engine and engine and board_obj.turn == engine_color:
-                                def engine_play():
-                                    nonlocal engine_thinking, board_state, running, node, move_count, pending_white_move
-                                    global game_over, winner
-
-                                    with engine_lock:
-                                        engine_thinking = True
-                                        try:
-                                            res = engine.play(board_obj, chess.engine.Limit(time=0.5))
-                                            # --- GET SAN BEFORE PUSH ---
-                                            san_str = board_obj.san(res.move)
-
-                                            board_obj.push(res.move)
-                                            board_state = board_from_chess(board_obj)
-
-                                            node = node.add_variation(res.move)
-
-                                            # Print moves in a readable formate
-                                            print(f"{move_count}. {pending_white_move} {san_str}")
-
-                                            move_count += 1
-                                            pending_white_move = None
-
-
-                                            if board_obj.is_checkmate():
-                                                winner = "White" if board_obj.turn == chess.WHITE else "Black"
-                                                time.sleep(2)
-                                                game_over = True
-
-                                                # save PGN file
-                                                with open("game.pgn", "w") as f:
-                                                    print(game, file=f)
-
-                                                return
-
-                                        except Exception as e:
-                                            print(f"Engine play failed: {e}")
-                                        finally:
-                                            engine_thinking = False
-
-                                t = threading.Thread(target=engine_play, daemon=True)
-                                t.start()
+                            selected_targets = frozenset()
+                            if driver is puzzle_driver:
+                                puzzle_move(move)
+                            else:
+                                play_human(move)
 
                         else:
                             selected_square = None
-                            selected_legal_moves = []
-
-            # draw the board
-            draw_board(screen, board_state, images, selected_legal_moves, board_obj)
-            pygame.display.flip()
-            clock.tick(30)
-
+                            selected_targets = frozenset()
+
+            # the analysis follows the position on screen (the reviewed one while stepping through
+            # the game) while its overlay is shown, and is stopped otherwise
+            if analysis is not None:
+                shown_board = review_board if review is not None else board_obj
+                analysis_overlay.board = shown_board
+                wanted = (review.fen if review is not None else view.fen) if analysis_overlay.visible else None
+                if wanted != analysis_fen:
+                    if wanted is None:
+                        analysis.stop()
+                    else:
+                        analysis.set_position(shown_board)
+                    analysis_fen = wanted
+
+            draw_start = time.perf_counter()
+            metrics.record("events", draw_start - events_start)
+
+            if game_over and review is None:
+                # the end screen is static, it is drawn once and then only after expose or resize
+                if not end_screen_drawn:
+                    end_screen(screen, end_loser, end_reason)
+                    pygame.display.flip()
+                    # the end screen covers the board, so it has to be repainted in full afterwards
+                    renderer.invalidate()
+                    end_screen_drawn = True
+                dirty = []
+            else:
+                end_screen_drawn = False
+
+                # the squares under an overlay are repainted whenever its text changes size or it is hidden
+                changed = [item.update() for item in overlays]
+                for area in changed:
+                    if area is not None:
+                        renderer.invalidate_area(area)
+
+                # draw the board, only the squares that changed since the last frame are repainted.
+                # an overlay is drawn again when it changed or a square under it was repainted
+                if review is not None:
+                    dirty = renderer.render(screen, review.pieces, None, review.position, changed=board_changes)
+                else:
+                    dirty = renderer.render(screen, view.pieces, selected_targets, view.position, premoves.squares(),
+                                            board_changes)
+                board_changes.clear()
+                for item, area in zip(overlays, changed):
+                    if item.visible and (area is not None or item.rect().collidelist(dirty) != -1):
+                        dirty.append(item.draw(screen))
+            update_start = time.perf_counter()
+            metrics.record("draw", update_start - draw_start)
+
+            if dirty:
+                pygame.display.update(dirty)
+            wait_start = time.perf_counter()
+            metrics.record("update", wait_start - update_start)
+            metrics.record("frame", wait_start - frame_start)
+            if dirty:
+                metrics.frame_done(wait_start)
+            profiler.frame_drawn()
+            if not running:
+                break
+
+            # sleep until the next event, the end screen, a flag fall, the next overlay refresh or
+            # the end of a window resize
+            frame_clock.tick(MAX_FPS)
+            wake_at = [] if game_over else [
+                t for t in [item.next_refresh() for item in overlays] +
+                [game_over_at, clock.flag_at(), atlas.next_refresh()]
+                if t is not None]
+            if not wake_at:
+                first = pygame.event.wait()
+            else:
+                first = pygame.event.wait(max(1, int((min(wake_at) - time.perf_counter()) * 1000)))
+            events = [first] + pygame.event.get()
+            metrics.record("wait", time.perf_counter() - wait_start)
+
+        if book:
+            book.close()
+        if bitbases:
+            bitbases.close()
+        # an unfinished game is archived with result "*"
+        journal.close()
+        if game_db is not None:
+            game_db.close()
+        if puzzles is not None:
+            puzzles.store.close()
+        if engine_loader is not None:
+            engine_loader.join(10)
+        if engine:
+            # only the UCI driver caches and ponders
+            if getattr(engine, "cache", None):
+                print("Engine cache:", engine.cache.stats())
+            if hasattr(engine, "ponder_hits"):
+                print(f"Ponder hits: {engine.ponder_hits}, misses: {engine.ponder_misses}")
+            engine.quit()
+        if analysis is not None:
+            analysis.quit()
+        if metrics_path:
+            metrics.export(metrics_path, build)
         pygame.quit()
 
 if __name__ == "__main__":
-    game()
+    parser = argparse.ArgumentParser(description="Play chess against the engine.")
+    parser.add_argument("--profile-startup", action="store_true",
+                        help="print the time to first frame, split by startup phase")
+    parser.add_argument("--metrics", metavar="PATH",
+                        help="write frame and move timings to PATH (.csv or .json) on exit")
+    parser.add_argument("--build", help="label stored with the exported timings, to compare builds")
+    parser.add_argument("--time-control", default=DEFAULT_TIME_CONTROL, metavar="MIN+INC",
+                        help="minutes per side plus seconds added per move (default %(default)s)")
+    parser.add_argument("--skill", type=int, default=0,
+                        help="engine skill level 0-20, also sets how long it may think per move")
+    parser.add_argument("--server", metavar="HOST:PORT",
+                        help="play against a game server (python game_server.py) instead of a local engine")
+    parser.add_argument("--analysis-lines", type=int, default=3, metavar="N",
+                        help="principal variations shown in the analysis mode (key a)")
+    args = parser.parse_args()
+    game(profile_startup=args.profile_startup, metrics_path=args.metrics, build=args.build,
+         time_control=args.time_control, skill=args.skill, server=args.server,
+         analysis_lines=args.analysis_lines)
@@ -0,0 +1,213 @@
+import asyncio, concurrent.futures, queue, threading, time
+import chess, chess.engine
+
+
+# result of one engine request, handed back to the pygame loop through a queue.
+# fen is the position that was searched, so the game can ignore replies that arrive after a reset.
+class EngineReply:
+
+    def __init__(self, fen, move, info=None, ponder_hit=False, elapsed=0.0):
+        self.fen = fen
+        self.move = move
+        self.info = info or {}
+        self.ponder_hit = ponder_hit
+        self.elapsed = elapsed
+
+
+# engine driver built on python-chess's asyncio UCI protocol. one event loop runs in a single
+# long-lived thread for the life of the game, instead of one thread per engine reply.
+#
+# after each reply the engine keeps searching the position reached by its predicted answer
+# (pondering) while the human thinks. if the human plays the predicted move, the ponder search
+# is stopped as soon as it has used the normal think time and its best move is played,
+# usually instantly. any other move stops the ponder search and starts a normal one.
+#
+# the pygame loop calls request_move() and then poll() once per frame, on_reply is called from
+# the engine thread whenever a reply is queued (used to wake up the main loop).
+
+class AsyncEngineDriver:
+
+    def __init__(self, command, options=None, cache=None, ponder=True, on_reply=None):
+        self.command = command
+        self.options = dict(options or {})
+        self.cache = cache
+        self.ponder_enabled = ponder
+        self.on_reply = on_reply
+
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="engine-loop", daemon=True)
+        self.replies = queue.Queue()
+
+        self.protocol = None
+        self.transport = None
+        # requests that are searching or waiting for the lock, all dropped by cancel()
+        self.searches = set()
+        # held while a search runs and while pondering is set up, so a request that arrives
+        # during protocol.analysis() waits instead of cancelling it halfway
+        self.lock = asyncio.Lock()
+        self.ponder_analysis = None
+        self.ponder_fen = None
+        self.ponder_started = 0.0
+
+        self.ponder_hits = 0
+        self.ponder_misses = 0
+
+    # spawns the engine and blocks until it answered uci/isready
+    def start(self, timeout=10):
+        self.thread.start()
+        future = asyncio.run_coroutine_threadsafe(self.open(), self.loop)
+        try:
+            future.result(timeout)
+        except BaseException:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            raise
+        return self
+
+    async def open(self):
+        self.transport, self.protocol = await chess.engine.popen_uci(self.command)
+        if self.options:
+            await self.protocol.configure(self.options)
+
+    def run(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    # asks for a move in the given position, the reply shows up in poll()
+    def request_move(self, board, limit):
+        return self.run(self.think(board.copy(), limit))
+
+    # next finished reply or None, never blocks
+    def poll(self):
+        try:
+            return self.replies.get_nowait()
+        except queue.Empty:
+            return None
+
+    # drops any running search and ponder, used on reset. an engine that does not stop within
+    # five seconds is left to finish on its own; its late reply is dropped by the fen check
+    def cancel(self):
+        try:
+            self.run(self.cancel_all()).result(5)
+        except concurrent.futures.TimeoutError:
+            print("Engine cancel timed out")
+        while self.poll() is not None:
+            pass
+
+    def quit(self):
+        if not self.thread.is_alive():
+            return
+        try:
+            self.run(self.shutdown()).result(5)
+        except Exception as e:
+            print("Engine shutdown failed:", e)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(5)
+
+    async def shutdown(self):
+        await self.cancel_all()
+        if self.protocol is not None:
+            await self.protocol.quit()
+
+    async def cancel_all(self):
+        searches = list(self.searches)
+        for task in searches:
+            task.cancel()
+        for task in searches:
+            try:
+                await task
+            except (asyncio.CancelledError, Exception):
+                pass
+        async with self.lock:
+            await self.stop_ponder()
+
+    async def think(self, board, limit):
+        task = asyncio.current_task()
+        self.searches.add(task)
+        started = time.perf_counter()
+        fen = board.fen()
+        try:
+            async with self.lock:
+                try:
+                    move, info, hit = await self.search(board, limit)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    print(f"Engine play failed: {e}")
+                    move, info, hit = None, {}, False
+
+                self.replies.put(EngineReply(fen, move, info, hit, time.perf_counter() - started))
+                if self.on_reply is not None:
+                    self.on_reply()
+
+                if move is not None and self.ponder_enabled:
+                    await self.start_ponder(board, move, info)
+        finally:
+            self.searches.discard(task)
+
+    async def search(self, board, limit):
+        fen = board.fen()
+
+        if self.cache is not None:
+            cached = self.cache.get(board, self.options, limit)
+            if cached is not None:
+                await self.stop_ponder()
+                info = {k: v for k, v in (("score", cached.score), ("depth", cached.depth)) if v is not None}
+                return cached.move, info, False
+
+        if self.ponder_analysis is not None:
+            if self.ponder_fen == fen:
+                move, info = await self.finish_ponder(limit)
+                if move is not None:
+                    self.ponder_hits += 1
+                    self.store(board, limit, move, info)
+                    return move, info, True
+            else:
+                self.ponder_misses += 1
+            await self.stop_ponder()
+
+        result = await self.protocol.play(board, limit, info=chess.engine.INFO_SCORE | chess.engine.INFO_PV)
+        self.store(board, limit, result.move, result.info)
+        return result.move, result.info, False
+
+    def store(self, board, limit, move, info):
+        if self.cache is not None and move is not None:
+            self.cache.put(board, self.options, limit, move, info.get("score"), info.get("depth"))
+
+    # starts an infinite search on the position after the engine's move and the predicted reply
+    async def start_ponder(self, board, move, info):
+        after = board.copy()
+        after.push(move)
+        pv = info.get("pv") or []
+        predicted = pv[1] if len(pv) > 1 else None
+        if predicted is None or predicted not in after.legal_moves:
+            return
+        after.push(predicted)
+        if after.is_game_over():
+            return
+        self.ponder_analysis = await self.protocol.analysis(after, info=chess.engine.INFO_SCORE | chess.engine.INFO_PV)
+        self.ponder_fen = after.fen()
+        self.ponder_started = time.perf_counter()
+
+    # ponder hit: let the search run up to the normal think time, then take its best move
+    async def finish_ponder(self, limit):
+        analysis = self.ponder_analysis
+        if limit.time is not None:
+            remaining = limit.time - (time.perf_counter() - self.ponder_started)
+            if remaining > 0:
+                await asyncio.sleep(remaining)
+        analysis.stop()
+        best = await analysis.wait()
+        info = dict(analysis.info)
+        self.ponder_analysis = None
+        self.ponder_fen = None
+        return best.move, info
+
+    async def stop_ponder(self):
+        analysis = self.ponder_analysis
+        self.ponder_analysis = None
+        self.ponder_fen = None
+        if analysis is not None:
+            analysis.stop()
+            try:
+                await analysis.wait()
+            except Exception:
+                pass
@@ -0,0 +1,168 @@
+import os, json, sqlite3, threading, time
+import chess, chess.engine, chess.polyglot
+from collections import OrderedDict
+
+CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'engine-cache.sqlite')
+
+
+# best move, score and depth the engine returned for one position
+class CachedResult:
+
+    def __init__(self, move, score=None, depth=None):
+        self.move = move
+        self.score = score
+        self.depth = depth
+
+
+# engine options and search limit as stable strings, so (position, options, limit) can be a key
+def options_key(options):
+    return json.dumps(options or {}, sort_keys=True)
+
+
+# clock readings change every move, so they are keyed by power-of-two buckets of seconds:
+# a position searched with about the same time left is a hit
+def limit_key(limit):
+    fields = ("time", "depth", "nodes", "mate", "white_clock", "black_clock", "white_inc", "black_inc", "remaining_moves")
+    parts = []
+    for name in fields:
+        value = getattr(limit, name, None)
+        if value is None:
+            continue
+        if name in ("white_clock", "black_clock"):
+            value = f"~{int(value).bit_length()}"
+        parts.append(f"{name}={value}")
+    return ",".join(parts)
+
+
+# two level cache of engine results: an in-memory LRU in front of a sqlite file.
+# keys are (zobrist hash, engine options, search limit). both levels are capped, the memory
+# level evicts the least recently used entry and the disk level drops its oldest tenth once full.
+
+class EngineCache:
+
+    def __init__(self, path=CACHE_PATH, max_memory=10000, max_disk=500000):
+        self.path = path
+        self.max_memory = max_memory
+        self.max_disk = max_disk
+        self.memory = OrderedDict()
+        self.lock = threading.Lock()
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        self.db = None
+        if path:
+            self.db = sqlite3.connect(path, check_same_thread=False)
+            self.db.execute("""
+                CREATE TABLE IF NOT EXISTS results (
+                    zobrist INTEGER NOT NULL,
+                    options TEXT NOT NULL,
+                    limits TEXT NOT NULL,
+                    move TEXT NOT NULL,
+                    cp INTEGER,
+                    mate INTEGER,
+                    depth INTEGER,
+                    used REAL NOT NULL,
+                    PRIMARY KEY (zobrist, options, limits)
+                )""")
+            self.db.execute("CREATE INDEX IF NOT EXISTS results_used ON results (used)")
+            self.db.commit()
+            self.disk_count = self.db.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    def key(self, board, options, limit):
+        # sqlite integers are signed 64 bit, zobrist hashes are unsigned
+        zobrist = chess.polyglot.zobrist_hash(board) - (1 << 63)
+        return (zobrist, options_key(options), limit_key(limit))
+
+    def get(self, board, options, limit):
+        key = self.key(board, options, limit)
+        from_disk = False
+        with self.lock:
+            row = self.memory.get(key)
+            if row is not None:
+                self.memory.move_to_end(key)
+            elif self.db is not None:
+                row = self.db.execute(
+                    "SELECT move, cp, mate, depth FROM results WHERE zobrist = ? AND options = ? AND limits = ?",
+                    key).fetchone()
+                if row is not None:
+                    from_disk = True
+                    self.remember(key, row)
+                    self.db.execute(
+                        "UPDATE results SET used = ? WHERE zobrist = ? AND options = ? AND limits = ?",
+                        (time.time(),) + key)
+
+            # a hash collision could hand back a move from another position, that is a miss
+            move = chess.Move.from_uci(row[0]) if row is not None else None
+            if move is None or move not in board.legal_moves:
+                self.misses += 1
+                return None
+            self.hits += 1
+            if from_disk:
+                self.disk_hits += 1
+
+        _, cp, mate, depth = row
+        score = None
+        if mate is not None:
+            score = chess.engine.PovScore(chess.engine.Mate(mate), board.turn)
+        elif cp is not None:
+            score = chess.engine.PovScore(chess.engine.Cp(cp), board.turn)
+        return CachedResult(move, score, depth)
+
+    def put(self, board, options, limit, move, score=None, depth=None):
+        key = self.key(board, options, limit)
+        cp = mate = None
+        if score is not None:
+            relative = score.relative if isinstance(score, chess.engine.PovScore) else score
+            if relative.is_mate():
+                mate = relative.mate()
+            else:
+                cp = relative.score()
+        row = (move.uci(), cp, mate, depth)
+
+        with self.lock:
+            self.remember(key, row)
+            if self.db is not None:
+                # only a new row counts towards max_disk, a position searched again is updated in place
+                cur = self.db.execute(
+                    "INSERT OR IGNORE INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    key + row + (time.time(),))
+                if cur.rowcount == 1:
+                    self.disk_count += 1
+                else:
+                    self.db.execute(
+                        "UPDATE results SET move = ?, cp = ?, mate = ?, depth = ?, used = ? "
+                        "WHERE zobrist = ? AND options = ? AND limits = ?",
+                        row + (time.time(),) + key)
+                if self.disk_count > self.max_disk:
+                    self.evict_disk()
+                self.db.commit()
+
+    def remember(self, key, row):
+        self.memory[key] = row
+        self.memory.move_to_end(key)
+        if len(self.memory) > self.max_memory:
+            self.memory.popitem(last=False)
+
+    def evict_disk(self):
+        drop = max(1, self.max_disk // 10)
+        self.db.execute(
+            "DELETE FROM results WHERE rowid IN (SELECT rowid FROM results ORDER BY used LIMIT ?)", (drop,))
+        self.disk_count = self.db.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "memory_entries": len(self.memory),
+            "disk_entries": self.disk_count if self.db is not None else 0,
+        }
+
+    def close(self):
+        if self.db is not None:
+            self.db.close()
+            self.db = None
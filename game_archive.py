@@ -0,0 +1,336 @@
+import argparse, mmap, os, struct, time
+import chess
+
+# compact binary archive of finished games, for the self-play and game.pgn volumes where PGN
+# text is too slow to parse and too big to keep:
+#   python game_archive.py convert game.pgn games.chga     appends the games of a PGN file
+#   python game_archive.py export games.chga out.pgn       writes them back as PGN
+#   python game_archive.py roundtrip game.pgn              checks PGN -> archive -> PGN
+#
+# layout: a file header, then one record per game, then an index of game offsets and a footer.
+#   record   fixed header fields (RECORD), the starting FEN for games that do not start from
+#            the initial position (a length byte and the text, padded to an even length), then
+#            one 16-bit word per ply: from | to << 6 | promotion << 12, promotion being the
+#            piece type - 1 (knight 1 ... queen 4) or 0
+#   index    INDEX_MAGIC, 4 bytes of padding and a u64 offset per game
+#   footer   offset of the index, number of games, MAGIC
+# only the mainline and the fixed headers are kept (Event, White, Black, Date, a numeric Round,
+# Result, FEN). the writer streams records as games arrive and writes the index on close; an
+# archive whose writer died before that is still readable, the reader rebuilds the index by
+# walking the records.
+
+MAGIC = b"CHGA"
+INDEX_MAGIC = b"CHGX"
+VERSION = 1
+FILE_HEADER = struct.Struct("<4sB3x")
+# plies, year, month, day, result, flags, round, white, black, event
+RECORD = struct.Struct("<IHBBBBH32s32s32s")
+FOOTER = struct.Struct("<QI4s")
+NAME_SIZE = 32
+
+RESULTS = ("*", "1-0", "0-1", "1/2-1/2")
+RESULT_CODES = {result: code for code, result in enumerate(RESULTS)}
+HAS_FEN = 1
+CHESS960 = 2
+
+# decoded moves by word, filled as words are seen
+MOVES = {}
+
+
+def encode_move(move):
+    return move.from_square | move.to_square << 6 | (move.promotion - 1 if move.promotion else 0) << 12
+
+
+def decode_move(word):
+    move = MOVES.get(word)
+    if move is None:
+        promotion = word >> 12
+        move = MOVES[word] = chess.Move(word & 63, word >> 6 & 63, promotion + 1 if promotion else None)
+    return move
+
+
+# utf-8 cut to the field size without splitting a character
+def pack_name(text):
+    return (text or "").encode("utf-8")[:NAME_SIZE].decode("utf-8", errors="ignore").encode("utf-8")
+
+
+def unpack_name(raw):
+    return raw.rstrip(b"\0").decode("utf-8", errors="replace")
+
+
+# "2024.05.17" -> (2024, 5, 17), unknown parts ("????.??.??") are 0
+def pack_date(date):
+    parts = (date or "").split(".")
+    values = [int(part) if part.isdigit() else 0 for part in parts[:3]]
+    values += [0] * (3 - len(values))
+    return min(values[0], 65535), min(values[1], 255), min(values[2], 255)
+
+
+def unpack_date(year, month, day):
+    return ".".join([f"{year:04}" if year else "????", f"{month:02}" if month else "??", f"{day:02}" if day else "??"])
+
+
+def pack_round(value):
+    return int(value) if value and value.isdigit() and int(value) < 65536 else 0
+
+
+def fen_field(fen):
+    if not fen:
+        return b""
+    raw = bytes([len(fen)]) + fen.encode("ascii")
+    return raw + b"\0" * (len(raw) % 2)
+
+
+# appends games to an archive, creating it if needed. add() writes the game straight to the
+# file; close() writes the index, so readers see the games once the writer is closed.
+
+class ArchiveWriter:
+
+    def __init__(self, path, append=True):
+        self.path = path
+        self.offsets = []
+        if append and os.path.exists(path) and os.path.getsize(path) > 0:
+            reader = ArchiveReader(path)
+            self.offsets = list(reader.offsets)
+            end = reader.data_end
+            reader.close()
+            self.file = open(path, "r+b")
+            # the old index goes, the new one is written after the new games
+            self.file.truncate(end)
+            self.file.seek(end)
+        else:
+            self.file = open(path, "wb")
+            self.file.write(FILE_HEADER.pack(MAGIC, VERSION))
+
+    @property
+    def count(self):
+        return len(self.offsets)
+
+    # moves: chess.Move objects from fen (or the initial position); headers: PGN header dict
+    def add(self, moves, headers, fen=None, chess960=False):
+        moves = list(moves)
+        if fen == chess.STARTING_FEN:
+            fen = None
+        if fen is not None and len(fen) > 255:
+            raise ValueError(f"FEN too long: {fen}")
+        year, month, day = pack_date(headers.get("Date"))
+        flags = (HAS_FEN if fen else 0) | (CHESS960 if chess960 else 0)
+        record = RECORD.pack(len(moves), year, month, day, RESULT_CODES.get(headers.get("Result"), 0), flags,
+                             pack_round(headers.get("Round")), pack_name(headers.get("White", "?")),
+                             pack_name(headers.get("Black", "?")), pack_name(headers.get("Event", "?")))
+        self.offsets.append(self.file.tell())
+        self.file.write(record + fen_field(fen) + struct.pack(f"<{len(moves)}H", *map(encode_move, moves)))
+
+    # mainline and headers of a chess.pgn.Game
+    def add_game(self, game):
+        headers = game.headers
+        fen = headers.get("FEN") if headers.get("SetUp", "1") == "1" else None
+        chess960 = headers.get("Variant", "").lower() in ("chess960", "chess 960", "fischerandom")
+        self.add(game.mainline_moves(), headers, fen, chess960)
+
+    def close(self):
+        index = self.file.tell()
+        self.file.write(INDEX_MAGIC + b"\0" * 4 + struct.pack(f"<{len(self.offsets)}Q", *self.offsets))
+        self.file.write(FOOTER.pack(index, len(self.offsets), MAGIC))
+        self.file.close()
+
+
+# random access to the games of an archive through a read-only memory map. headers(i) and
+# moves(i) only touch the bytes of game i; decode_all() decodes every move of the archive at
+# once with numpy.
+
+class ArchiveReader:
+
+    def __init__(self, path):
+        self.file = open(path, "rb")
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version = FILE_HEADER.unpack_from(self.map) if len(self.map) >= FILE_HEADER.size else (None, None)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError(f"{path} is not a game archive")
+        self.offsets, self.data_end = self.read_index()
+        self.count = len(self.offsets)
+
+    def read_index(self):
+        size = len(self.map)
+        if size >= FILE_HEADER.size + FOOTER.size:
+            index, count, magic = FOOTER.unpack_from(self.map, size - FOOTER.size)
+            if magic == MAGIC and index + 8 + count * 8 + FOOTER.size == size and \
+                    self.map[index:index + 4] == INDEX_MAGIC:
+                return struct.unpack_from(f"<{count}Q", self.map, index + 8), index
+        # no index (the writer did not close): walk the records up to the last complete one
+        offsets = []
+        offset = FILE_HEADER.size
+        while offset + RECORD.size <= size:
+            plies, _, month, day, result, flags = RECORD.unpack_from(self.map, offset)[:6]
+            if month > 12 or day > 31 or result >= len(RESULTS) or flags > HAS_FEN | CHESS960:
+                break
+            end = offset + RECORD.size + plies * 2
+            if flags & HAS_FEN:
+                if end >= size:
+                    break
+                end += len(fen_field("x" * self.map[offset + RECORD.size]))
+            if end > size:
+                break
+            offsets.append(offset)
+            offset = end
+        return tuple(offsets), offset
+
+    # (plies, flags, fen, offset of the first move word) of game i
+    def locate(self, i):
+        offset = self.offsets[i]
+        plies, flags = struct.unpack_from("<I", self.map, offset)[0], self.map[offset + 9]
+        offset += RECORD.size
+        fen = None
+        if flags & HAS_FEN:
+            length = self.map[offset]
+            fen = self.map[offset + 1:offset + 1 + length].decode("ascii")
+            offset += len(fen_field(fen))
+        return plies, flags, fen, offset
+
+    def headers(self, i):
+        _, year, month, day, result, flags, round_, white, black, event = RECORD.unpack_from(self.map, self.offsets[i])
+        headers = {"Event": unpack_name(event), "Date": unpack_date(year, month, day),
+                   "Round": str(round_) if round_ else "?", "White": unpack_name(white),
+                   "Black": unpack_name(black), "Result": RESULTS[result]}
+        if flags & CHESS960:
+            headers["Variant"] = "Chess960"
+        fen = self.locate(i)[2]
+        if fen:
+            headers["SetUp"] = "1"
+            headers["FEN"] = fen
+        return headers
+
+    def moves(self, i):
+        plies, _, _, offset = self.locate(i)
+        return [decode_move(word) for word in struct.unpack_from(f"<{plies}H", self.map, offset)]
+
+    # chess.pgn.Game of game i, moves are not checked for legality until it is exported
+    def game(self, i):
+        import chess.pgn
+        headers = self.headers(i)
+        game = chess.pgn.Game()
+        for name in ("Event", "Date", "Round", "White", "Black", "Result"):
+            game.headers[name] = headers[name]
+        if "FEN" in headers or "Variant" in headers:
+            board = chess.Board(headers.get("FEN", chess.STARTING_FEN), chess960="Variant" in headers)
+            game.setup(board)
+        node = game
+        for move in self.moves(i):
+            node = node.add_variation(move)
+        return game
+
+    # every move of the archive as numpy arrays: (starts, from, to, promotion) where the moves
+    # of game i are [starts[i], starts[i + 1]) and promotion is a piece type or 0. the words
+    # are gathered with one fancy index over the whole map instead of a loop per game.
+    def decode_all(self):
+        import numpy as np
+        plies = np.zeros(self.count, dtype=np.int64)
+        firsts = np.zeros(self.count, dtype=np.int64)
+        for i in range(self.count):
+            count, _, _, offset = self.locate(i)
+            plies[i] = count
+            firsts[i] = offset // 2
+        starts = np.zeros(self.count + 1, dtype=np.int64)
+        np.cumsum(plies, out=starts[1:])
+        # word position of every move: the game's first word plus the move's number in the game
+        positions = np.repeat(firsts - starts[:-1], plies) + np.arange(starts[-1], dtype=np.int64)
+        words = np.frombuffer(self.map, dtype="<u2", count=self.data_end // 2)[positions]
+        promotion = (words >> 12).astype(np.uint8)
+        promotion[promotion > 0] += 1
+        return starts, (words & 63).astype(np.uint8), (words >> 6 & 63).astype(np.uint8), promotion
+
+    def close(self):
+        if getattr(self, "map", None) is not None:
+            self.map.close()
+        self.file.close()
+
+
+def read_pgn_games(path):
+    import chess.pgn
+    with open(path, encoding="utf-8", errors="replace") as f:
+        while True:
+            game = chess.pgn.read_game(f)
+            if game is None:
+                return
+            yield game
+
+
+def convert(pgn_path, archive_path):
+    writer = ArchiveWriter(archive_path)
+    start = time.perf_counter()
+    added = 0
+    for game in read_pgn_games(pgn_path):
+        writer.add_game(game)
+        added += 1
+    writer.close()
+    print(f"{added} games added to {archive_path} ({writer.count} in total) in {time.perf_counter() - start:.1f}s")
+
+
+def export(archive_path, pgn_path):
+    reader = ArchiveReader(archive_path)
+    with open(pgn_path, "w") as out:
+        for i in range(reader.count):
+            print(reader.game(i), file=out, end="\n\n")
+    print(f"{reader.count} games written to {pgn_path}")
+    reader.close()
+
+
+# writes the games of a PGN file to a scratch archive, reads them back and compares the kept
+# headers and the mainline of each, then the PGN export of each against the original's.
+# returns the number of games that differ
+def roundtrip(pgn_path, archive_path):
+    games = list(read_pgn_games(pgn_path))
+    writer = ArchiveWriter(archive_path, append=False)
+    for game in games:
+        writer.add_game(game)
+    writer.close()
+    reader = ArchiveReader(archive_path)
+    failures = 0
+    for i, original in enumerate(games):
+        copy = reader.game(i)
+        # names are cut to NAME_SIZE bytes and unknown date parts become "??", so compare with that
+        wanted = {name: pack_name(original.headers.get(name, "?")).decode("utf-8") for name in ("Event", "White", "Black")}
+        wanted["Date"] = unpack_date(*pack_date(original.headers.get("Date")))
+        wanted["Result"] = original.headers.get("Result", "*")
+        problems = [f"{name}: {wanted[name]!r} != {copy.headers[name]!r}" for name in wanted
+                    if wanted[name] != copy.headers[name]]
+        if list(copy.mainline_moves()) != list(original.mainline_moves()):
+            problems.append("moves differ")
+        elif copy.end().board().fen() != original.end().board().fen():
+            problems.append("final position differs")
+        if problems:
+            failures += 1
+            print(f"game {i + 1}: " + "; ".join(problems))
+    pgn_size = os.path.getsize(pgn_path)
+    print(f"{len(games)} games, {failures} mismatches; PGN {pgn_size} bytes, archive {len(reader.map)} bytes "
+          f"({len(reader.map) / max(1, pgn_size):.0%})")
+    reader.close()
+    os.remove(archive_path)
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Binary game archive with 16-bit moves.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    to_archive = sub.add_parser("convert", help="append the games of a PGN file to an archive")
+    to_archive.add_argument("pgn")
+    to_archive.add_argument("archive")
+    to_pgn = sub.add_parser("export", help="write the games of an archive as PGN")
+    to_pgn.add_argument("archive")
+    to_pgn.add_argument("pgn")
+    check = sub.add_parser("roundtrip", help="check that the games of a PGN file survive the archive")
+    check.add_argument("pgn")
+    check.add_argument("--scratch", default="roundtrip.chga", help="temporary archive path")
+    args = parser.parse_args()
+
+    if args.command == "convert":
+        convert(args.pgn, args.archive)
+    elif args.command == "export":
+        export(args.archive, args.pgn)
+    else:
+        raise SystemExit(1 if roundtrip(args.pgn, args.scratch) else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+import json, queue, socket, threading, time
+import chess
+
+from engine_async import EngineReply
+from game_server import HOST, PORT
+
+
+def parse_address(text):
+    host, _, port = text.rpartition(":")
+    return (host or HOST), int(port or PORT)
+
+
+# the pygame window as a thin client of game_server.py (python chessV2.py --server host:port).
+# it has the same interface as the local engine drivers: request_move() sends the moves the
+# server has not seen yet, the server plays the engine's reply on its own, and a reader thread
+# turns it into an EngineReply for poll(). the server's board, clocks and time budget decide
+# the engine's move; the limit passed in is not used.
+
+class RemoteEngineDriver:
+
+    def __init__(self, address, time_control, skill=0, on_reply=None):
+        self.address = address
+        self.time_control = time_control
+        self.skill = skill
+        self.on_reply = on_reply
+
+        self.sock = None
+        self.replies = queue.Queue()
+        self.lock = threading.Lock()
+        self.games = 0
+        self.game = None
+        self.sent = []
+        self.asked = None
+        # (result, reason) of server games that ended, see game_result()
+        self.results = queue.Queue()
+        self.thread = threading.Thread(target=self.run, name="game-client", daemon=True)
+
+    def start(self, timeout=5):
+        self.sock = socket.create_connection(self.address, timeout=timeout)
+        self.sock.settimeout(None)
+        self.thread.start()
+        return self
+
+    def send(self, request):
+        self.sock.sendall((json.dumps(request) + "\n").encode())
+
+    def request_move(self, board, limit=None):
+        moves = [move.uci() for move in board.move_stack]
+        with self.lock:
+            self.asked = (board.fen(), time.perf_counter())
+            # a new game, or a board the server does not know (rematch): start over from its moves
+            if self.game is None or moves[:len(self.sent)] != self.sent:
+                if self.game is not None:
+                    self.send({"cmd": "close", "game": self.game})
+                self.games += 1
+                self.game = f"g{self.games}"
+                self.sent = moves
+                color = "black" if board.turn == chess.WHITE else "white"
+                self.send({"cmd": "new", "game": self.game, "color": color, "moves": moves,
+                           "time_control": self.time_control, "skill": self.skill})
+                return
+            for uci in moves[len(self.sent):]:
+                self.sent.append(uci)
+                self.send({"cmd": "move", "game": self.game, "uci": uci})
+
+    def run(self):
+        for line in self.sock.makefile("r", encoding="utf-8"):
+            event = json.loads(line)
+            kind = event.get("event")
+            if kind == "error":
+                self.failed(event)
+                continue
+            if kind == "over":
+                self.ended(event)
+                continue
+            if kind != "move" or event.get("by") != "engine":
+                continue
+            with self.lock:
+                if event.get("game") != self.game or self.asked is None:
+                    continue
+                self.sent.append(event["uci"])
+                fen, asked = self.asked
+                self.asked = None
+            self.replies.put(EngineReply(fen, chess.Move.from_uci(event["uci"]), {},
+                                         False, time.perf_counter() - asked))
+            if self.on_reply is not None:
+                self.on_reply()
+
+    # the server rejected a request while a reply was awaited: the game is dropped and an
+    # EngineReply without a move, with the message as info["error"], tells the window to stop
+    # waiting. the next request_move() starts a new server game
+    def failed(self, event):
+        message = event.get("message", "unknown error")
+        print("Server:", message)
+        with self.lock:
+            if self.asked is None or event.get("game") not in (self.game, None):
+                return
+            fen, asked = self.asked
+            self.asked = None
+            self.send({"cmd": "close", "game": self.game})
+            self.game = None
+            self.sent = []
+        self.replies.put(EngineReply(fen, None, {"error": message}, False, time.perf_counter() - asked))
+        if self.on_reply is not None:
+            self.on_reply()
+
+    # the server ended the current game (flag fall, mate, a draw), whether or not a reply was
+    # awaited. the result goes to game_result(), the game itself is already closed on the server
+    def ended(self, event):
+        with self.lock:
+            if event.get("game") != self.game:
+                return
+            self.asked = None
+            self.game = None
+            self.sent = []
+        self.results.put((event.get("result", "*"), event.get("reason", "")))
+        if self.on_reply is not None:
+            self.on_reply()
+
+    # (result, reason) of the last game the server ended, or None. never blocks
+    def game_result(self):
+        try:
+            return self.results.get_nowait()
+        except queue.Empty:
+            return None
+
+    def poll(self):
+        try:
+            return self.replies.get_nowait()
+        except queue.Empty:
+            return None
+
+    # forgets the server game, the next request starts a new one
+    def cancel(self):
+        with self.lock:
+            if self.game is not None:
+                self.send({"cmd": "close", "game": self.game})
+            self.game = None
+            self.sent = []
+            self.asked = None
+        while self.poll() is not None:
+            pass
+
+    def quit(self):
+        try:
+            self.cancel()
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+        self.thread.join(2)
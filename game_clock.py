@@ -0,0 +1,163 @@
+import time
+import chess
+
+# time controls are written "minutes+increment", e.g. "5+3" is 5 minutes each plus 3 seconds a move
+DEFAULT_TIME_CONTROL = "5+3"
+
+# the longest the engine may think per move at each skill level (seconds), however much time
+# its clock has. weak levels reply quickly, strong ones are allowed to use their clock.
+SKILL_BUDGETS = {0: 0.3, 5: 0.6, 10: 1.5, 15: 3.0, 20: 6.0}
+
+
+def parse_time_control(text):
+    base, _, increment = text.partition("+")
+    return float(base) * 60, float(increment or 0)
+
+
+def latency_budget(skill, budgets=SKILL_BUDGETS):
+    levels = [level for level in budgets if level <= skill]
+    return budgets[max(levels) if levels else min(budgets)]
+
+
+# two-sided game clock with a Fischer increment. only the side to move has a running clock,
+# press() after every move adds the increment to the mover and starts the opponent's clock.
+# times are perf_counter seconds, every method takes an optional `now` so one frame reads
+# both clocks at the same instant.
+
+class ChessClock:
+
+    def __init__(self, base=300.0, increment=3.0):
+        self.base = base
+        self.increment = increment
+        self.reset()
+
+    @classmethod
+    def from_time_control(cls, text):
+        return cls(*parse_time_control(text))
+
+    def reset(self):
+        self.remaining = {chess.WHITE: self.base, chess.BLACK: self.base}
+        self.running = None
+        self.started = None
+
+    def start(self, color, now=None):
+        self.running = color
+        self.started = time.perf_counter() if now is None else now
+
+    # stops the running clock, e.g. when the game ends
+    def stop(self, now=None):
+        if self.running is None:
+            return
+        now = time.perf_counter() if now is None else now
+        self.remaining[self.running] = self.time_left(self.running, now)
+        self.running = None
+
+    def press(self, now=None):
+        mover = self.running
+        if mover is None:
+            return
+        now = time.perf_counter() if now is None else now
+        self.stop(now)
+        self.remaining[mover] += self.increment
+        self.start(not mover, now)
+
+    def time_left(self, color, now=None):
+        left = self.remaining[color]
+        if color == self.running:
+            left -= (time.perf_counter() if now is None else now) - self.started
+        return max(0.0, left)
+
+    # the side whose time has run out, or None
+    def flagged(self, now=None):
+        if self.running is not None and self.time_left(self.running, now) <= 0:
+            return self.running
+        return None
+
+    # perf_counter time at which the running side runs out of time
+    def flag_at(self):
+        if self.running is None:
+            return None
+        return self.started + self.remaining[self.running]
+
+    # search limit for the side to move: both clocks and increments, and at most `cap` seconds
+    def limit(self, cap=None, now=None):
+        import chess.engine
+        now = time.perf_counter() if now is None else now
+        return chess.engine.Limit(
+            time=cap,
+            white_clock=self.time_left(chess.WHITE, now), black_clock=self.time_left(chess.BLACK, now),
+            white_inc=self.increment, black_inc=self.increment)
+
+
+# "4:59", and "9.8" under ten seconds
+def format_time(seconds):
+    if seconds < 10:
+        return f"{int(seconds * 10) / 10:.1f}"
+    seconds = int(seconds)
+    return f"{seconds // 60}:{seconds % 60:02d}"
+
+
+# one side's clock drawn in a box at the right edge of its back rank. it follows the same
+# protocol as the metrics overlay: update() re-renders it when the text changed and returns the
+# area to repaint, next_refresh() says when the shown time changes next.
+
+class ClockFace:
+
+    def __init__(self, clock, color, square):
+        import pygame
+        self.pygame = pygame
+        self.clock = clock
+        self.color = color
+        self.square = square
+        self.font = pygame.font.SysFont(None, max(16, square // 3))
+        self.visible = True
+        self.surface = None
+        self.shown = None
+
+    # window resized, the face moves and is drawn at the new size
+    def resize(self, square):
+        covered = self.rect()
+        self.square = square
+        self.font = self.pygame.font.SysFont(None, max(16, square // 3))
+        self.shown = None
+        return covered
+
+    def rect(self):
+        if self.surface is None:
+            return self.pygame.Rect(0, 0, 0, 0)
+        board = self.square * 8
+        if self.color == chess.WHITE:
+            return self.surface.get_rect(bottomright=(board - 4, board - 4))
+        return self.surface.get_rect(topright=(board - 4, 4))
+
+    def next_refresh(self, now=None):
+        if self.clock.running != self.color:
+            return None
+        now = time.perf_counter() if now is None else now
+        left = self.clock.time_left(self.color, now)
+        step = 0.1 if left < 10 else 1.0
+        return now + (left % step or step)
+
+    def update(self, now=None):
+        left = self.clock.time_left(self.color, now)
+        running = self.clock.running == self.color
+        shown = (format_time(left), running)
+        if shown == self.shown:
+            return None
+        self.shown = shown
+        old = self.rect()
+
+        # the running clock is white on black, a stopped one grey on dark grey
+        text = self.font.render(shown[0], True, (255, 255, 255) if running else (150, 150, 150))
+        surface = self.pygame.Surface((text.get_width() + 12, text.get_height() + 6))
+        surface.fill((0, 0, 0) if running else (60, 60, 60))
+        if left <= 0:
+            surface.fill((160, 0, 0))
+        surface.blit(text, (6, 3))
+        self.surface = surface
+        return old.union(self.rect())
+
+    def draw(self, screen):
+        rect = self.rect()
+        screen.blit(self.surface, rect)
+        return rect
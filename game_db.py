@@ -0,0 +1,254 @@
+import argparse, io, os, sqlite3, time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import chess, chess.polyglot
+
+DB_PATH = "games.sqlite"
+
+# headers kept per game, the full PGN stays in the source file at the stored offset
+HEADERS = ("Event", "Date", "White", "Black", "Result")
+
+
+# zobrist hashes are unsigned 64 bit, sqlite integers are signed
+def position_key(board):
+    return chess.polyglot.zobrist_hash(board) - (1 << 63)
+
+
+# splits a PGN file, opened in binary mode, into (byte offset, game text) chunks without
+# parsing it. only one game is held in memory at a time, however big the file is.
+def iter_games(f, offset=0):
+    chunk = []
+    start = offset
+    seen_moves = False
+    for raw in f:
+        line = raw.decode("utf-8", errors="replace")
+        # a header line after movetext starts the next game
+        if line.startswith("[") and seen_moves:
+            yield start, "".join(chunk)
+            chunk = []
+            seen_moves = False
+            start = offset
+        if not chunk and not line.strip():
+            start = offset + len(raw)
+        else:
+            chunk.append(line)
+            if line.strip() and not line.startswith("["):
+                seen_moves = True
+        offset += len(raw)
+    if chunk:
+        yield start, "".join(chunk)
+
+
+def split_games(path):
+    with open(path, "rb") as f:
+        yield from iter_games(f)
+
+
+def batches(items, size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+# worker: parses a batch of games and returns their headers and (position, ply, move) rows
+def parse_batch(batch):
+    import chess.pgn
+    parsed = []
+    for offset, text in batch:
+        game = chess.pgn.read_game(io.StringIO(text))
+        if game is None:
+            continue
+        board = game.board()
+        rows = []
+        for ply, move in enumerate(game.mainline_moves()):
+            rows.append((position_key(board), ply, move.uci()))
+            board.push(move)
+        rows.append((position_key(board), len(rows), None))
+        parsed.append((offset, [game.headers.get(name, "?") for name in HEADERS], rows))
+    return parsed
+
+
+# on-disk game database: every game of every imported PGN, plus an index from zobrist hash
+# to (game id, ply), so "games reaching this position" and move statistics for a position are
+# a single indexed lookup. a game is identified by its source file and byte offset, so
+# importing an append-only game.pgn again only adds the games appended since.
+
+class GameDatabase:
+
+    def __init__(self, path=DB_PATH):
+        self.path = path
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS games (
+                id INTEGER PRIMARY KEY,
+                source TEXT NOT NULL,
+                offset INTEGER NOT NULL,
+                event TEXT, date TEXT, white TEXT, black TEXT, result TEXT,
+                plies INTEGER
+            );
+            CREATE TABLE IF NOT EXISTS positions (
+                zobrist INTEGER NOT NULL,
+                game_id INTEGER NOT NULL,
+                ply INTEGER NOT NULL,
+                move TEXT
+            );
+        """)
+        try:
+            self.db.execute("CREATE UNIQUE INDEX IF NOT EXISTS games_source_offset ON games (source, offset)")
+        except sqlite3.IntegrityError:
+            # a database from before games were unique: the first copy of each game stays
+            self.db.executescript("""
+                DELETE FROM games WHERE id NOT IN (SELECT MIN(id) FROM games GROUP BY source, offset);
+                DELETE FROM positions WHERE game_id NOT IN (SELECT id FROM games);
+                CREATE UNIQUE INDEX games_source_offset ON games (source, offset);
+            """)
+        self.db.execute("CREATE INDEX IF NOT EXISTS positions_zobrist ON positions (zobrist)")
+        self.db.commit()
+
+    # streams one or more PGN files into the database. parsing is fanned out over worker
+    # processes; at most workers * 2 batches are in flight, so memory stays bounded.
+    # games already in the database are skipped, the count returned is the new ones
+    def import_pgn(self, paths, workers=None, batch_size=200, progress=True):
+        workers = workers or os.cpu_count()
+        start = time.perf_counter()
+        games = positions = 0
+
+        # bulk inserts into an unindexed table are much faster, so the first import into an empty
+        # database builds the index once at the end. later imports keep it: rebuilding it would
+        # cost the whole table, and a crash mid-import would leave the database without it
+        if self.db.execute("SELECT 1 FROM positions LIMIT 1").fetchone() is None:
+            self.db.execute("DROP INDEX IF EXISTS positions_zobrist")
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for path in paths:
+                source = os.path.abspath(path)
+                pending = deque()
+                for batch in batches(split_games(path), batch_size):
+                    pending.append(pool.submit(parse_batch, batch))
+                    if len(pending) >= workers * 2:
+                        g, p = self.store(source, pending.popleft().result())
+                        games += g
+                        positions += p
+                        if progress:
+                            print(f"\r{games} games, {positions} positions", end="", flush=True)
+                while pending:
+                    g, p = self.store(source, pending.popleft().result())
+                    games += g
+                    positions += p
+
+        self.db.execute("CREATE INDEX IF NOT EXISTS positions_zobrist ON positions (zobrist)")
+        self.db.commit()
+        elapsed = time.perf_counter() - start
+        if progress:
+            print(f"\rimported {games} games, {positions} positions in {elapsed:.1f}s "
+                  f"({games / elapsed if elapsed else 0:.0f} games/s)")
+        return games
+
+    def store(self, source, parsed):
+        cur = self.db.cursor()
+        positions = 0
+        games = 0
+        for offset, headers, rows in parsed:
+            cur.execute(
+                "INSERT OR IGNORE INTO games (source, offset, event, date, white, black, result, plies) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (source, offset, *headers, len(rows) - 1))
+            if cur.rowcount != 1:
+                continue
+            game_id = cur.lastrowid
+            cur.executemany("INSERT INTO positions VALUES (?, ?, ?, ?)",
+                            [(key, game_id, ply, move) for key, ply, move in rows])
+            games += 1
+            positions += len(rows)
+        self.db.commit()
+        return games, positions
+
+    # games that reached the position, as (game id, ply, white, black, result, date). a game
+    # that repeats the position is listed once, with the first ply it was reached at
+    def games_with_position(self, board, limit=50):
+        return self.db.execute(
+            "SELECT g.id, MIN(p.ply), g.white, g.black, g.result, g.date FROM positions p "
+            "JOIN games g ON g.id = p.game_id WHERE p.zobrist = ? GROUP BY g.id ORDER BY g.id DESC LIMIT ?",
+            (position_key(board), limit)).fetchall()
+
+    # number of games that reached the position
+    def position_games(self, board):
+        return self.db.execute("SELECT COUNT(DISTINCT game_id) FROM positions WHERE zobrist = ?",
+                               (position_key(board),)).fetchone()[0]
+
+    # moves played from the position: {uci: (games, white wins, draws, black wins)}, most played
+    # first. each game counts once per move, however often it repeated the position
+    def move_stats(self, board):
+        rows = self.db.execute(
+            "SELECT move, COUNT(*), SUM(result = '1-0'), SUM(result = '1/2-1/2'), SUM(result = '0-1') "
+            "FROM (SELECT DISTINCT p.move, g.id, g.result FROM positions p JOIN games g ON g.id = p.game_id "
+            "WHERE p.zobrist = ? AND p.move IS NOT NULL) GROUP BY move ORDER BY COUNT(*) DESC",
+            (position_key(board),)).fetchall()
+        return {move: tuple(counts) for move, *counts in rows}
+
+    # original PGN text of a game, read back from its source file
+    def game_pgn(self, game_id):
+        row = self.db.execute("SELECT source, offset FROM games WHERE id = ?", (game_id,)).fetchone()
+        if row is None:
+            return None
+        source, offset = row
+        with open(source, "rb") as f:
+            f.seek(offset)
+            for _, text in iter_games(f, offset):
+                return text
+        return None
+
+    def count(self):
+        return self.db.execute("SELECT COUNT(*) FROM games").fetchone()[0]
+
+    def close(self):
+        self.db.close()
+
+
+# prints the move statistics of a position, used by the "s" key in the game window
+def print_stats(db, board):
+    stats = db.move_stats(board)
+    print(f"{db.position_games(board)} games in the database reach this position")
+    for uci, (games, white, draws, black) in list(stats.items())[:10]:
+        san = board.san(chess.Move.from_uci(uci))
+        print(f"  {san:7} {games:6} games  +{white or 0} ={draws or 0} -{black or 0}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import PGN files and search games by position.")
+    parser.add_argument("--db", default=DB_PATH)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    imp = sub.add_parser("import", help="stream PGN files into the database")
+    imp.add_argument("pgn", nargs="+")
+    imp.add_argument("--workers", type=int, default=os.cpu_count())
+    imp.add_argument("--batch-size", type=int, default=200)
+
+    query = sub.add_parser("query", help="games and move statistics for a position")
+    query.add_argument("--fen", default=chess.STARTING_FEN)
+    query.add_argument("--moves", default="", help="moves in SAN played from --fen")
+    query.add_argument("--limit", type=int, default=10)
+
+    args = parser.parse_args()
+    db = GameDatabase(args.db)
+    if args.command == "import":
+        db.import_pgn(args.pgn, workers=args.workers, batch_size=args.batch_size)
+    else:
+        board = chess.Board(args.fen)
+        for san in args.moves.split():
+            board.push_san(san)
+        start = time.perf_counter()
+        games = db.games_with_position(board, args.limit)
+        print_stats(db, board)
+        print(f"latest games ({(time.perf_counter() - start) * 1000:.1f} ms):")
+        for game_id, ply, white, black, result, date in games:
+            print(f"  #{game_id} {white} - {black} {result} {date} (ply {ply})")
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
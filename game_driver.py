@@ -0,0 +1,191 @@
+import chess, time
+from instrumentation import metrics
+from board_mirror import CODES, BoardMirror
+from game_history import GameHistory
+
+
+# the board as 64 piece codes ("wp", "bk", ...) or None in screen order (index square ^ 56),
+# rebuilt from scratch. the game keeps a BoardMirror up to date instead
+def board_from_chess(board):
+    squares = [None] * 64
+    for sq, piece in board.piece_map().items():
+        squares[sq ^ 56] = CODES[piece.color, piece.piece_type]
+    return tuple(squares)
+
+
+# read-only picture of the game after one ply: what the renderer draws and what clicks are
+# checked against. nothing in it changes after it is built, a move produces a new snapshot,
+# so it can be handed around (and kept) without locks or copies.
+
+class GameSnapshot:
+
+    # pieces is the board in screen order (see board_from_chess), changed the screen indices
+    # the last move touched. the moves themselves stay in the driver, so building a snapshot
+    # costs the same at any point of a long game
+    def __init__(self, board, ply, position=None, pieces=None, changed=None):
+        self.fen = board.fen()
+        self.turn = board.turn
+        self.ply = ply
+        self.last_move = board.peek() if board.move_stack else None
+        self.pieces = pieces if pieces is not None else board_from_chess(board)
+        self.changed = changed if changed is not None else frozenset(range(64))
+
+        # PositionState is never changed after it is built either
+        self.position = position
+        self.is_checkmate = position.is_checkmate if position is not None else board.is_checkmate()
+        # name of the side that has been checkmated, or None
+        self.checkmated = ("White" if board.turn == chess.WHITE else "Black") if self.is_checkmate else None
+
+    def piece(self, sq):
+        return self.pieces[sq ^ 56]
+
+
+# headless game state: the board, the moves played, whose turn it is and how the game ended.
+# no pygame in here, so the same logic runs in the window and in self-play workers.
+# when a PositionCache is passed in, position always holds the PositionState of the board.
+# the PGN tree is only built when it is asked for, so chess.pgn stays off the startup path.
+# with a GameJournal every move is also streamed to disk as it is played, and take-backs too.
+# the GameHistory keeps checkpoints for undo/redo and for looking at earlier plies (view()).
+# the board is only changed by the thread that owns the driver (the pygame main thread in the
+# game); everyone else reads the current snapshot, which is built on first use after a move.
+
+class GameDriver:
+
+    def __init__(self, white="Player", black="Engine", event="Python Chess Game", positions=None, journal=None,
+                 checkpoint_interval=16):
+        self.headers = {"Event": event, "White": white, "Black": black}
+        self.positions = positions
+        self.journal = journal
+        self.board = chess.Board()
+        self.mirror = BoardMirror()
+        self.history = GameHistory(checkpoint_interval)
+        self.reset()
+
+    # starts a new game on the same board object, from fen if given
+    def reset(self, fen=None):
+        if fen:
+            self.board.set_fen(fen)
+        else:
+            self.board.reset()
+        self.mirror.reset(self.board)
+        self.history.reset(self.board, self.mirror)
+        self.changed = frozenset(range(64))
+        self.sans = []
+        self.current = None
+        if self.journal is not None:
+            self.journal.start_game(self.headers)
+        self.position = self.positions.get(self.board) if self.positions is not None else None
+
+    @property
+    def snapshot(self):
+        if self.current is None:
+            self.current = GameSnapshot(self.board, len(self.sans), self.position, tuple(self.mirror.squares), self.changed)
+        return self.current
+
+    @property
+    def turn(self):
+        return self.board.turn
+
+    # plays a move and returns its SAN
+    def push(self, move):
+        start = time.perf_counter()
+        san = self.board.san(move)
+        metrics.record("san", time.perf_counter() - start)
+        start = time.perf_counter()
+        self.changed = self.mirror.push(self.board, move)
+        metrics.record("board mirror", time.perf_counter() - start)
+        self.board.push(move)
+        self.history.record(self.board, self.mirror, move)
+        self.sans.append(san)
+        self.current = None
+        if self.journal is not None:
+            self.journal.record_move(len(self.sans), move.uci(), san)
+        if self.positions is not None:
+            self.position = self.positions.get(self.board)
+        return san
+
+    # takes the last move back and returns it, it can be played again with redo()
+    def pop(self):
+        self.changed = self.mirror.pop()
+        move = self.board.pop()
+        self.history.unrecord()
+        self.sans.pop()
+        self.current = None
+        if self.journal is not None:
+            self.journal.record_undo(len(self.sans))
+        if self.positions is not None:
+            self.position = self.positions.get(self.board)
+        return move
+
+    # plays the last move taken back again, None if there is none
+    def redo(self):
+        move = self.history.redo_move()
+        if move is None:
+            return None
+        self.push(move)
+        return move
+
+    @property
+    def ply(self):
+        return len(self.sans)
+
+    # read-only snapshot of the game at an earlier ply, the board on the driver does not move.
+    # changed is relative to the position the previous view() showed
+    def view(self, ply):
+        if ply >= len(self.sans):
+            return self.snapshot
+        board, mirror, changed = self.history.seek(ply)
+        position = self.positions.get(board) if self.positions is not None else None
+        return GameSnapshot(board, ply, position, tuple(mirror.squares), changed)
+
+    # "1. e4 e5" for the last completed move pair
+    def move_line(self):
+        ply = len(self.sans)
+        number = (ply + 1) // 2
+        if ply % 2 == 0:
+            return f"{number}. {self.sans[-2]} {self.sans[-1]}"
+        return f"{number}. {self.sans[-1]}"
+
+    @property
+    def is_checkmate(self):
+        if self.position is not None:
+            return self.position.is_checkmate
+        return self.board.is_checkmate()
+
+    # name of the side that has been checkmated, or None
+    @property
+    def checkmated(self):
+        if not self.is_checkmate:
+            return None
+        return "White" if self.board.turn == chess.WHITE else "Black"
+
+    # any end of game: checkmate, stalemate, insufficient material, 75-move rule, fivefold repetition
+    def is_over(self, max_plies=None):
+        if max_plies is not None and len(self.sans) >= max_plies:
+            return True
+        return self.board.is_game_over()
+
+    def result(self):
+        return self.board.result(claim_draw=False)
+
+    # chess.pgn.Game with the headers and every move played so far
+    def pgn_game(self):
+        import chess.pgn
+        game = chess.pgn.Game.from_board(self.board)
+        for name, value in self.headers.items():
+            game.headers[name] = value
+        game.headers["Result"] = self.result()
+        return game
+
+    def pgn(self):
+        return str(self.pgn_game())
+
+    # ends the game in the journal, which appends it to the PGN archive. result overrides the
+    # board's result for games that end off the board (time forfeit)
+    def finish(self, result=None):
+        if self.journal is not None:
+            self.journal.finish_game(result or self.result())
+
+    def save_pgn(self, path="game.pgn"):
+        with open(path, "w") as f:
+            print(self.pgn(), file=f)
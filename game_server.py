@@ -0,0 +1,361 @@
+import argparse, asyncio, json, os, time
+from concurrent.futures import ProcessPoolExecutor
+import chess, chess.engine
+
+from game_driver import GameDriver
+from game_clock import DEFAULT_TIME_CONTROL, ChessClock, latency_budget
+from opening_book import open_book
+from bitbase import open_bitbases
+
+# local game server: many games against the engine at once, over TCP on localhost. every
+# connection can open any number of games; all of them share one bounded pool of engine
+# processes.
+#
+#   python game_server.py --engines 4 --engine stockfish
+#
+# protocol: one JSON object per line in each direction. requests have a "cmd":
+#   {"cmd": "new", "game": "g1", "color": "white", "time_control": "5+3", "skill": 0, "moves": []}
+#       starts a game ("game" is optional, "moves" replays a game up to the current position)
+#   {"cmd": "move", "game": "g1", "uci": "e2e4"}    plays the player's move
+#   {"cmd": "resign", "game": "g1"}, {"cmd": "close", "game": "g1"}, {"cmd": "stats"}
+# and the server sends events:
+#   {"event": "started", "game", "fen"}
+#   {"event": "move", "game", "by": "player" | "engine", "uci", "san", "fen", "clocks": [white, black], "elapsed"}
+#   {"event": "over", "game", "result", "reason"}, {"event": "stats", ...}, {"event": "error", "game", "message"}
+#
+# the engine's reply follows the player's move without being asked for. each game has its
+# own clocks, and the engine's search is limited by its clock and by the latency budget of the
+# game's skill level.
+
+HOST = "127.0.0.1"
+PORT = 8765
+
+
+# the built-in engine runs in worker processes when no UCI engine can be started
+worker_builtin = None
+
+
+def init_builtin():
+    global worker_builtin
+    from builtin_engine import BuiltinEngine
+    worker_builtin = BuiltinEngine()
+
+
+def builtin_play(root_fen, moves, limit):
+    board = chess.Board(root_fen)
+    for uci in moves:
+        board.push_uci(uci)
+    result = worker_builtin.play(board, limit)
+    return (result.move.uci() if result.move else None), {"depth": result.info.get("depth"), "nodes": result.info.get("nodes")}
+
+
+# a fixed number of engine processes shared by every game. requests wait in one FIFO queue and
+# each game has at most one request in it (its engine move), so the engines serve the waiting
+# games in turn and a busy game can not starve the others. the search limit is computed when an
+# engine picks the request up, so time spent queueing is already off the game's clock.
+
+class EnginePool:
+
+    def __init__(self, command=None, size=2, options=None):
+        self.command = command
+        self.size = size
+        self.options = dict(options or {})
+        self.engines = []
+        self.executor = None
+        self.queue = asyncio.Queue()
+        self.workers = []
+
+        self.served = 0
+        self.waited = 0.0
+        self.searched = 0.0
+        self.busy = 0
+
+    async def start(self):
+        if self.command:
+            try:
+                for _ in range(self.size):
+                    transport, protocol = await chess.engine.popen_uci(self.command)
+                    if self.options:
+                        await protocol.configure(self.options)
+                    self.engines.append((transport, protocol))
+            except Exception as e:
+                print("Could not start engine:", e)
+                await self.quit_engines()
+        if not self.engines:
+            print(f"Using {self.size} built-in engine processes")
+            self.executor = ProcessPoolExecutor(max_workers=self.size, initializer=init_builtin)
+        self.workers = [asyncio.create_task(self.work(slot)) for slot in range(self.size)]
+        return self
+
+    # the engine's move for the position; limit_for() is called when an engine is free.
+    # game is any object identifying the game, the engine is told when it switches games
+    async def play(self, game, board, limit_for, skill=None):
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((game, board.copy(), limit_for, skill, future, time.perf_counter()))
+        return await future
+
+    async def work(self, slot):
+        loop = asyncio.get_running_loop()
+        while True:
+            game, board, limit_for, skill, future, queued = await self.queue.get()
+            if future.done():
+                continue
+            started = time.perf_counter()
+            self.waited += started - queued
+            self.busy += 1
+            limit = limit_for()
+            try:
+                if self.engines:
+                    protocol = self.engines[slot][1]
+                    options = {"Skill Level": skill} if skill is not None and "Skill Level" in protocol.options else {}
+                    # game= sends ucinewgame whenever this engine switches to another game
+                    result = await protocol.play(board, limit, game=game, options=options)
+                    move, info = result.move, {"depth": result.info.get("depth"), "nodes": result.info.get("nodes")}
+                else:
+                    uci, info = await loop.run_in_executor(
+                        self.executor, builtin_play, board.root().fen(), [m.uci() for m in board.move_stack], limit)
+                    move = chess.Move.from_uci(uci) if uci else None
+                if not future.done():
+                    future.set_result((move, info))
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+            finally:
+                self.busy -= 1
+                self.served += 1
+                self.searched += time.perf_counter() - started
+
+    def stats(self):
+        served = self.served or 1
+        return {
+            "engines": self.size,
+            "builtin": not self.engines,
+            "busy": self.busy,
+            "queued": self.queue.qsize(),
+            "served": self.served,
+            "mean_wait_ms": self.waited / served * 1000,
+            "mean_search_ms": self.searched / served * 1000,
+        }
+
+    async def quit_engines(self):
+        for transport, protocol in self.engines:
+            try:
+                await asyncio.wait_for(protocol.quit(), 5)
+            except Exception:
+                transport.close()
+        self.engines = []
+
+    async def close(self):
+        for worker in self.workers:
+            worker.cancel()
+        await self.quit_engines()
+        if self.executor is not None:
+            self.executor.shutdown(cancel_futures=True)
+
+
+# one game on the server: the authoritative board, its clocks and the pending engine move
+class ServerGame:
+
+    def __init__(self, game_id, color, time_control, skill):
+        self.id = game_id
+        self.color = color
+        self.skill = skill
+        self.budget = latency_budget(skill)
+        white, black = ("Player", "Engine") if color == chess.WHITE else ("Engine", "Player")
+        self.driver = GameDriver(white=white, black=black, event="Server game")
+        self.clock = ChessClock.from_time_control(time_control)
+        self.engine_task = None
+        self.result = None
+
+
+class GameServer:
+
+    def __init__(self, pool, archive_path=None, book=True):
+        self.pool = pool
+        self.archive_path = archive_path
+        self.book = open_book() if book else None
+        self.bitbases = open_bitbases() if book else None
+        self.next_id = 0
+        self.games_started = 0
+
+    async def handle(self, reader, writer):
+        games = {}
+        lock = asyncio.Lock()
+
+        async def send(event):
+            async with lock:
+                writer.write((json.dumps(event) + "\n").encode())
+                await writer.drain()
+
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                    await self.dispatch(request, games, send)
+                except (ValueError, KeyError) as e:
+                    await send({"event": "error", "game": None, "message": f"bad request: {e}"})
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            # the client went away, or the server is shutting down
+            pass
+        finally:
+            for game in games.values():
+                self.stop_engine(game)
+            writer.close()
+
+    async def dispatch(self, request, games, send):
+        cmd = request["cmd"]
+        if cmd == "stats":
+            await send({"event": "stats", "games": self.games_started, **self.pool.stats()})
+            return
+        if cmd == "new":
+            await self.new_game(request, games, send)
+            return
+
+        game = games.get(request.get("game"))
+        if game is None:
+            await send({"event": "error", "game": request.get("game"), "message": "no such game"})
+        elif cmd == "move":
+            await self.player_move(game, request["uci"], send)
+        elif cmd == "resign":
+            await self.finish(game, "0-1" if game.color == chess.WHITE else "1-0", "resignation", send)
+        elif cmd == "close":
+            self.stop_engine(game)
+            del games[game.id]
+        else:
+            await send({"event": "error", "game": game.id, "message": f"unknown command {cmd}"})
+
+    async def new_game(self, request, games, send):
+        self.next_id += 1
+        game_id = str(request.get("game") or self.next_id)
+        if game_id in games:
+            self.stop_engine(games.pop(game_id))
+        color = chess.BLACK if request.get("color") == "black" else chess.WHITE
+        game = ServerGame(game_id, color, request.get("time_control", DEFAULT_TIME_CONTROL), request.get("skill", 0))
+        for uci in request.get("moves", []):
+            move = chess.Move.from_uci(uci) if len(uci) in (4, 5) else None
+            if move is None or not game.driver.board.is_legal(move):
+                await send({"event": "error", "game": game_id, "message": f"illegal move {uci}"})
+                return
+            game.driver.push(move)
+        games[game_id] = game
+        self.games_started += 1
+        game.clock.start(game.driver.turn)
+        await send({"event": "started", "game": game_id, "fen": game.driver.board.fen()})
+        if game.driver.turn != game.color:
+            self.start_engine(game, send)
+
+    async def player_move(self, game, uci, send):
+        board = game.driver.board
+        if game.result is not None or board.turn != game.color or game.engine_task is not None:
+            await send({"event": "error", "game": game.id, "message": "not your move"})
+            return
+        try:
+            move = chess.Move.from_uci(uci)
+        except ValueError:
+            move = None
+        if move is None or not board.is_legal(move):
+            await send({"event": "error", "game": game.id, "message": f"illegal move {uci}"})
+            return
+        if await self.flagged(game, send):
+            return
+        await self.push(game, move, "player", 0.0, send)
+        if game.result is None:
+            self.start_engine(game, send)
+
+    def start_engine(self, game, send):
+        game.engine_task = asyncio.create_task(self.engine_move(game, send))
+
+    def stop_engine(self, game):
+        if game.engine_task is not None:
+            game.engine_task.cancel()
+            game.engine_task = None
+
+    # the engine's reply: the book, the bitbases or the only legal move right away, otherwise a
+    # pooled search
+    async def engine_move(self, game, send):
+        started = time.perf_counter()
+        board = game.driver.board
+        try:
+            legal = list(board.legal_moves)
+            move = legal[0] if len(legal) == 1 else None
+            if move is None and self.book is not None:
+                move = self.book.pick(board)
+            if move is None and self.bitbases is not None:
+                move = self.bitbases.perfect_move(board)
+            if move is None:
+                move, _ = await self.pool.play(game, board, lambda: game.clock.limit(game.budget), game.skill)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            game.engine_task = None
+            await send({"event": "error", "game": game.id, "message": f"engine failed: {e}"})
+            return
+        game.engine_task = None
+        if move is None or await self.flagged(game, send):
+            return
+        await self.push(game, move, "engine", time.perf_counter() - started, send)
+
+    async def push(self, game, move, by, elapsed, send):
+        san = game.driver.push(move)
+        game.clock.press()
+        await send({
+            "event": "move", "game": game.id, "by": by, "uci": move.uci(), "san": san,
+            "fen": game.driver.board.fen(), "elapsed": elapsed,
+            "clocks": [game.clock.time_left(chess.WHITE), game.clock.time_left(chess.BLACK)],
+        })
+        if game.driver.is_over():
+            outcome = game.driver.board.outcome()
+            await self.finish(game, game.driver.result(), outcome.termination.name.lower(), send)
+
+    async def flagged(self, game, send):
+        loser = game.clock.flagged()
+        if loser is None:
+            return False
+        await self.finish(game, "0-1" if loser == chess.WHITE else "1-0", "time", send)
+        return True
+
+    async def finish(self, game, result, reason, send):
+        if game.result is not None:
+            return
+        game.result = result
+        game.clock.stop()
+        self.stop_engine(game)
+        if self.archive_path and game.driver.sans:
+            game_pgn = game.driver.pgn_game()
+            game_pgn.headers["Result"] = result
+            with open(self.archive_path, "a") as f:
+                print(game_pgn, file=f, end="\n\n")
+        await send({"event": "over", "game": game.id, "result": result, "reason": reason})
+
+
+async def serve(host=HOST, port=PORT, engine=None, engines=2, options=None, archive_path=None):
+    pool = await EnginePool(engine, engines, options).start()
+    server = GameServer(pool, archive_path)
+    listener = await asyncio.start_server(server.handle, host, port)
+    print(f"Serving games on {host}:{listener.sockets[0].getsockname()[1]} with {engines} engines")
+    try:
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        await pool.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve games against a shared engine pool.")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--engine", default=os.environ.get("STOCKFISH_PATH"), help="path of the UCI engine")
+    parser.add_argument("--engines", type=int, default=2, help="engine processes shared by all games")
+    parser.add_argument("--archive", help="append finished games to this PGN file")
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.host, args.port, args.engine, args.engines, archive_path=args.archive))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
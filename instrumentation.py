@@ -0,0 +1,157 @@
+import csv, json, threading, time
+from collections import deque
+
+# hot-path timings. every named series keeps its last `window` samples (seconds) in a ring
+# buffer; recording is one perf_counter pair and a deque append, cheap enough for every frame.
+# per frame: events, engine poll, draw, display update, the whole frame, and the time spent
+# waiting for the next event.
+# per move: engine wait, san, board mirror, pgn write (from the journal thread).
+
+FRAME_SERIES = ("events", "engine poll", "draw", "update", "frame", "wait")
+MOVE_SERIES = ("engine wait", "san", "board mirror", "pgn write")
+
+
+def percentile(sorted_samples, fraction):
+    if not sorted_samples:
+        return 0.0
+    index = min(len(sorted_samples) - 1, int(round(fraction * (len(sorted_samples) - 1))))
+    return sorted_samples[index]
+
+
+class Metrics:
+
+    def __init__(self, window=1000):
+        self.window = window
+        self.series = {}
+        self.totals = {}
+        self.lock = threading.Lock()
+        self.frame_times = deque(maxlen=window)
+
+    def record(self, name, seconds):
+        samples = self.series.get(name)
+        if samples is None:
+            with self.lock:
+                samples = self.series.setdefault(name, deque(maxlen=self.window))
+                self.totals.setdefault(name, 0)
+        samples.append(seconds)
+        self.totals[name] += 1
+
+    # called once per presented frame with the time it was shown, for the FPS figure
+    def frame_done(self, now=None):
+        self.frame_times.append(time.perf_counter() if now is None else now)
+
+    def fps(self):
+        times = self.frame_times
+        if len(times) < 2:
+            return 0.0
+        span = times[-1] - times[0]
+        return (len(times) - 1) / span if span > 0 else 0.0
+
+    # {"count", "p50", "p95", "p99", "max", "mean"} in milliseconds over the current window
+    def summary(self, name):
+        samples = sorted(self.series.get(name, ()))
+        if not samples:
+            return {"count": 0, "p50": 0.0, "p95": 0.0, "p99": 0.0, "max": 0.0, "mean": 0.0}
+        ms = 1000.0
+        return {
+            "count": self.totals[name],
+            "p50": percentile(samples, 0.50) * ms,
+            "p95": percentile(samples, 0.95) * ms,
+            "p99": percentile(samples, 0.99) * ms,
+            "max": samples[-1] * ms,
+            "mean": sum(samples) / len(samples) * ms,
+        }
+
+    def names(self):
+        known = [n for n in FRAME_SERIES + MOVE_SERIES if n in self.series]
+        return known + sorted(n for n in self.series if n not in known)
+
+    def export_json(self, path, build=None):
+        data = {
+            "build": build,
+            "exported": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "fps": self.fps(),
+            "series": {name: self.summary(name) for name in self.names()},
+        }
+        with open(path, "w") as f:
+            json.dump(data, f, indent=2)
+
+    # one row per metric, the same columns as the JSON summary
+    def export_csv(self, path, build=None):
+        with open(path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["build", "metric", "count", "p50_ms", "p95_ms", "p99_ms", "max_ms", "mean_ms"])
+            for name in self.names():
+                s = self.summary(name)
+                writer.writerow([build or "", name, s["count"]] +
+                                [f"{s[k]:.4f}" for k in ("p50", "p95", "p99", "max", "mean")])
+            writer.writerow([build or "", "fps", len(self.frame_times), f"{self.fps():.2f}", "", "", "", ""])
+
+    def export(self, path, build=None):
+        if path.endswith(".json"):
+            self.export_json(path, build)
+        else:
+            self.export_csv(path, build)
+
+
+metrics = Metrics()
+
+
+# on-screen table of p50/p95/p99 per series and the FPS. the text is re-rendered at most
+# every `refresh` seconds, in between the same surface is blitted again.
+
+class MetricsOverlay:
+
+    def __init__(self, refresh=0.5):
+        import pygame
+        self.pygame = pygame
+        self.font = pygame.font.SysFont(None, 20)
+        self.refresh = refresh
+        self.visible = False
+        self.surface = None
+        self.rendered_at = 0.0
+
+    # shows or hides the overlay, returns the area it covered so the board underneath is repainted
+    def toggle(self):
+        covered = self.rect()
+        self.visible = not self.visible
+        self.rendered_at = 0.0
+        return covered
+
+    # when the overlay wants to be redrawn next, None while it is hidden
+    def next_refresh(self):
+        return self.rendered_at + self.refresh if self.visible else None
+
+    def rect(self):
+        if self.surface is None:
+            return self.pygame.Rect(0, 0, 0, 0)
+        return self.surface.get_rect(topleft=(4, 4))
+
+    # rebuilds the surface when it is due, returns the area to repaint (old and new size) or None
+    def update(self, source=metrics):
+        now = time.perf_counter()
+        if not self.visible or now - self.rendered_at < self.refresh:
+            return None
+        self.rendered_at = now
+        old = self.rect()
+
+        lines = [f"FPS {source.fps():5.1f}      p50     p95     p99  ms"]
+        for name in source.names():
+            s = source.summary(name)
+            lines.append(f"{name:17} {s['p50']:7.2f} {s['p95']:7.2f} {s['p99']:7.2f}")
+        rendered = [self.font.render(line, True, (255, 255, 255)) for line in lines]
+        width = max(r.get_width() for r in rendered) + 12
+        height = sum(r.get_height() for r in rendered) + 10
+        surface = self.pygame.Surface((width, height), self.pygame.SRCALPHA)
+        surface.fill((0, 0, 0, 170))
+        y = 5
+        for r in rendered:
+            surface.blit(r, (6, y))
+            y += r.get_height()
+        self.surface = surface
+        return old.union(self.rect())
+
+    def draw(self, screen):
+        rect = self.rect()
+        screen.blit(self.surface, rect)
+        return rect
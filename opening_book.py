@@ -0,0 +1,105 @@
+import os, random, struct
+import chess, chess.polyglot
+
+BOOK_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'books', 'test-book.bin')
+
+# opening lines used to generate the small offline test book, one game per string in SAN.
+# lines repeated in several strings end up with a higher weight.
+TEST_BOOK_LINES = [
+    "e4 e5 Nf3 Nc6 Bb5 a6 Ba4 Nf6 O-O Be7",
+    "e4 e5 Nf3 Nc6 Bb5 Nf6 O-O Nxe4",
+    "e4 e5 Nf3 Nc6 Bc4 Bc5 c3 Nf6 d3 d6",
+    "e4 e5 Nf3 Nc6 d4 exd4 Nxd4 Nf6",
+    "e4 c5 Nf3 d6 d4 cxd4 Nxd4 Nf6 Nc3 a6",
+    "e4 c5 Nf3 Nc6 d4 cxd4 Nxd4 Nf6",
+    "e4 e6 d4 d5 Nc3 Nf6",
+    "e4 c6 d4 d5 Nc3 dxe4 Nxe4 Bf5",
+    "d4 d5 c4 e6 Nc3 Nf6 Bg5 Be7",
+    "d4 d5 c4 c6 Nf3 Nf6 Nc3 dxc4",
+    "d4 Nf6 c4 e6 Nf3 d5 Nc3 Be7",
+    "d4 Nf6 c4 g6 Nc3 Bg7 e4 d6",
+    "c4 e5 Nc3 Nf6 Nf3 Nc6",
+    "Nf3 d5 d4 Nf6 c4 e6",
+    "f3 e5 g4 Qh4#",
+]
+
+
+# opening book backed by a polyglot .bin file. python-chess memory-maps the file and
+# binary-searches the sorted entries by zobrist key, so a lookup never reads the whole book.
+# mode "weighted" picks a move at random in proportion to its weight, "best" always plays the
+# heaviest one. positions deeper than max_ply are never looked up.
+
+class OpeningBook:
+
+    def __init__(self, path=BOOK_PATH, max_ply=16, mode="weighted", seed=None):
+        self.path = path
+        self.max_ply = max_ply
+        self.mode = mode
+        self.random = random.Random(seed)
+        self.reader = chess.polyglot.open_reader(path)
+
+    # returns a book move for the position, or None when out of book
+    def pick(self, board):
+        if board.ply() >= self.max_ply:
+            return None
+        try:
+            if self.mode == "best":
+                entry = self.reader.find(board)
+            else:
+                entry = self.reader.weighted_choice(board, random=self.random)
+        except IndexError:
+            return None
+        return entry.move
+
+    # every book move for the position with its weight, heaviest first
+    def entries(self, board):
+        return sorted(((e.move, e.weight) for e in self.reader.find_all(board)), key=lambda e: -e[1])
+
+    def close(self):
+        self.reader.close()
+
+
+# opens the book if the file exists, otherwise returns None so the game just uses the engine
+def open_book(path=BOOK_PATH, **kwargs):
+    if not os.path.exists(path):
+        return None
+    try:
+        return OpeningBook(path, **kwargs)
+    except Exception as e:
+        print("Could not load opening book:", e)
+        return None
+
+
+# encodes a move the way polyglot stores it: to | from << 6 | promotion << 12,
+# castling is written as the king capturing its own rook.
+def polyglot_move(board, move):
+    to_sq = move.to_square
+    if board.is_castling(move):
+        rook_file = 7 if chess.square_file(move.to_square) > chess.square_file(move.from_square) else 0
+        to_sq = chess.square(rook_file, chess.square_rank(move.from_square))
+    promotion = move.promotion - 1 if move.promotion else 0
+    return to_sq | (move.from_square << 6) | (promotion << 12)
+
+
+# writes a polyglot book from SAN lines. identical (position, move) pairs are merged and their
+# weights summed, entries are sorted by key so the reader can binary-search them.
+def write_book(path, lines):
+    weights = {}
+    for line in lines:
+        board = chess.Board()
+        for san in line.split():
+            move = board.parse_san(san)
+            key = (chess.polyglot.zobrist_hash(board), polyglot_move(board, move))
+            weights[key] = weights.get(key, 0) + 1
+            board.push(move)
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "wb") as f:
+        for (key, raw_move), weight in sorted(weights.items()):
+            f.write(struct.pack(">QHHI", key, raw_move, min(weight, 0xFFFF), 0))
+    return len(weights)
+
+
+if __name__ == "__main__":
+    count = write_book(BOOK_PATH, TEST_BOOK_LINES)
+    print(f"wrote {count} entries to {BOOK_PATH}")
@@ -0,0 +1,207 @@
+import json, os, queue, threading, time
+from instrumentation import metrics
+
+JOURNAL_PATH = "game.journal"
+ARCHIVE_PATH = "game.pgn"
+
+
+# rebuilds the PGN text of one game from its journal records
+def build_pgn(headers, moves, result):
+    import chess, chess.pgn
+    board = chess.Board()
+    for uci in moves:
+        board.push_uci(uci)
+    game = chess.pgn.Game.from_board(board)
+    for name, value in headers.items():
+        game.headers[name] = value
+    game.headers["Result"] = result
+    return str(game)
+
+
+# reads a journal file and returns {game id: {"headers", "moves", "result", "archived"}} in file
+# order. a torn last line (crash in the middle of a write) is ignored.
+def read_journal(path):
+    games = {}
+    if not os.path.exists(path):
+        return games
+    with open(path) as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            kind, game_id = record.get("type"), record.get("game")
+            if kind == "start":
+                games[game_id] = {"headers": record.get("headers", {}), "moves": [], "result": None, "archived": False}
+            elif game_id in games and kind == "move":
+                games[game_id]["moves"].append(record["uci"])
+            elif game_id in games and kind == "undo":
+                del games[game_id]["moves"][record["ply"]:]
+            elif game_id in games and kind == "end":
+                games[game_id]["result"] = record["result"]
+            elif game_id in games and kind == "archived":
+                games[game_id]["archived"] = True
+    return games
+
+
+# append-only, crash-safe game journal. every move is queued as one JSON line and written by
+# a background thread, so the frame loop never touches the disk. writes are flushed right
+# away and fsynced in batches (at most every fsync_interval seconds, and always at the end of
+# a game). finished games are appended to a multi-game PGN archive; games left unfinished by
+# a crash are recovered into the archive the next time the journal is opened.
+
+class GameJournal:
+
+    def __init__(self, journal_path=JOURNAL_PATH, archive_path=ARCHIVE_PATH, fsync_interval=1.0):
+        self.journal_path = journal_path
+        self.archive_path = archive_path
+        self.fsync_interval = fsync_interval
+        self.records = queue.Queue()
+        self.game_id = None
+        self.games_archived = 0
+
+        self.recover()
+        self.file = open(journal_path, "a")
+        self.thread = threading.Thread(target=self.run, name="pgn-journal", daemon=True)
+        self.thread.start()
+
+    # --- called from the game (any thread), never blocks on disk ---
+
+    def start_game(self, headers):
+        self.game_id = f"{time.time():.6f}"
+        self.records.put({"type": "start", "game": self.game_id, "headers": dict(headers), "t": time.time()})
+
+    def record_move(self, ply, uci, san, fen=None, **meta):
+        record = {"type": "move", "game": self.game_id, "ply": ply, "uci": uci, "san": san, "t": time.time()}
+        if fen is not None:
+            record["fen"] = fen
+        record.update(meta)
+        self.records.put(record)
+
+    # the moves after ply were taken back
+    def record_undo(self, ply):
+        self.records.put({"type": "undo", "game": self.game_id, "ply": ply, "t": time.time()})
+
+    def finish_game(self, result):
+        if self.game_id is None:
+            return
+        self.records.put({"type": "end", "game": self.game_id, "result": result, "t": time.time()})
+        self.game_id = None
+
+    # PGN of the game in progress, rebuilt from the journal on demand
+    def current_pgn(self):
+        self.flush()
+        games = read_journal(self.journal_path)
+        if not games:
+            return None
+        game = list(games.values())[-1]
+        return build_pgn(game["headers"], game["moves"], game["result"] or "*")
+
+    # waits until everything queued so far is on disk
+    def flush(self):
+        done = threading.Event()
+        self.records.put(("flush", done))
+        done.wait(5)
+
+    def close(self, unfinished_result="*"):
+        if self.game_id is not None:
+            self.finish_game(unfinished_result)
+        self.records.put(None)
+        self.thread.join(10)
+        self.file.close()
+
+    # --- writer thread ---
+
+    def run(self):
+        games = {}
+        last_sync = time.monotonic()
+        dirty = False
+        while True:
+            timeout = max(0.0, self.fsync_interval - (time.monotonic() - last_sync)) if dirty else None
+            try:
+                item = self.records.get(timeout=timeout)
+            except queue.Empty:
+                item = "sync"
+
+            # take everything that is already queued in one batch
+            batch = [item]
+            while True:
+                try:
+                    batch.append(self.records.get_nowait())
+                except queue.Empty:
+                    break
+
+            start = time.perf_counter()
+            stop = False
+            sync = False
+            flushes = []
+            finished = []
+            for item in batch:
+                if item is None:
+                    stop = sync = True
+                elif item == "sync":
+                    sync = True
+                elif isinstance(item, tuple):
+                    flushes.append(item[1])
+                    sync = True
+                else:
+                    self.file.write(json.dumps(item) + "\n")
+                    dirty = True
+                    self.track(games, item, finished)
+                    if item["type"] == "end":
+                        sync = True
+
+            if dirty:
+                self.file.flush()
+                if sync or time.monotonic() - last_sync >= self.fsync_interval:
+                    os.fsync(self.file.fileno())
+                    last_sync = time.monotonic()
+                    dirty = False
+
+            for game in finished:
+                self.archive(game)
+                # marks the game as safely archived, so recovery never appends it twice
+                self.file.write(json.dumps({"type": "archived", "game": game["id"]}) + "\n")
+                self.file.flush()
+            if dirty or finished or sync:
+                metrics.record("pgn write", time.perf_counter() - start)
+            if finished and not games:
+                # everything in the journal is safely archived now
+                self.file.truncate(0)
+                self.file.seek(0)
+            for done in flushes:
+                done.set()
+            if stop:
+                return
+
+    def track(self, games, record, finished):
+        game_id = record["game"]
+        if record["type"] == "start":
+            games[game_id] = {"id": game_id, "headers": record["headers"], "moves": [], "result": None}
+        elif game_id in games and record["type"] == "move":
+            games[game_id]["moves"].append(record["uci"])
+        elif game_id in games and record["type"] == "undo":
+            del games[game_id]["moves"][record["ply"]:]
+        elif game_id in games and record["type"] == "end":
+            game = games.pop(game_id)
+            game["result"] = record["result"]
+            if game["moves"]:
+                finished.append(game)
+
+    def archive(self, game):
+        text = build_pgn(game["headers"], game["moves"], game["result"])
+        with open(self.archive_path, "a") as f:
+            f.write(text + "\n\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self.games_archived += 1
+
+    # archives games a previous session left in the journal, then starts a fresh journal
+    def recover(self):
+        games = read_journal(self.journal_path)
+        for game in games.values():
+            if game["moves"] and not game["archived"]:
+                game["result"] = game["result"] or "*"
+                self.archive(game)
+        if os.path.exists(self.journal_path):
+            os.remove(self.journal_path)
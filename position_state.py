@@ -0,0 +1,65 @@
+import chess
+import chess.polyglot
+from collections import OrderedDict
+
+
+# everything the UI needs to know about one position, computed once when the position is reached.
+# clicks, markers and end-of-game checks read from here instead of rescanning board.legal_moves.
+
+class PositionState:
+
+    def __init__(self, board, key=None):
+        self.key = chess.polyglot.zobrist_hash(board) if key is None else key
+        self.turn = board.turn
+
+        # from_square -> {to_square: [moves]}, promotions keep all four moves under the same to_square
+        self.moves_from = {}
+        legal = list(board.legal_moves)
+        for move in legal:
+            self.moves_from.setdefault(move.from_square, {}).setdefault(move.to_square, []).append(move)
+
+        self.target_sets = {sq: frozenset(targets) for sq, targets in self.moves_from.items()}
+        self.move_count = len(legal)
+        # the reply when there is no choice, nothing needs to be searched
+        self.only_move = legal[0] if len(legal) == 1 else None
+
+        self.king_square = board.king(board.turn)
+        self.is_check = board.is_check()
+        self.is_checkmate = self.is_check and not self.moves_from
+        self.is_stalemate = not self.is_check and not self.moves_from
+        self.check_square = self.king_square if self.is_check else None
+
+    # squares the piece on from_sq can move to
+    def targets(self, from_sq):
+        return self.target_sets.get(from_sq, frozenset())
+
+    # legal moves from one square to another, more than one only for promotions (queen first)
+    def moves(self, from_sq, to_sq):
+        return self.moves_from.get(from_sq, {}).get(to_sq, [])
+
+    def move(self, from_sq, to_sq):
+        moves = self.moves(from_sq, to_sq)
+        return moves[0] if moves else None
+
+
+# small LRU of PositionState keyed by zobrist hash, so positions reached again
+# (repetitions, rematches, the opening) are not rebuilt.
+
+class PositionCache:
+
+    def __init__(self, max_size=4096):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+
+    def get(self, board):
+        key = chess.polyglot.zobrist_hash(board)
+        state = self.entries.get(key)
+        if state is not None:
+            self.entries.move_to_end(key)
+            return state
+
+        state = PositionState(board, key)
+        self.entries[key] = state
+        if len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+        return state
@@ -0,0 +1,65 @@
+import chess
+
+
+# moves the player queues while the engine is thinking. they are entered against the board as it
+# would look after the moves already queued (the opponent's replies are unknown, so only the
+# piece's movement is checked, not legality). when the engine's move lands, the first premove is
+# matched against the legal moves of the new position and played at once; if it is no longer
+# legal the whole queue is dropped.
+
+class PremoveQueue:
+
+    def __init__(self, color, max_moves=4):
+        self.color = color
+        self.max_moves = max_moves
+        self.moves = []
+
+    def __bool__(self):
+        return bool(self.moves)
+
+    def clear(self):
+        self.moves = []
+
+    # the player's own view of the board: their side to move, with the queued moves made
+    def board_after(self, board):
+        board = board.copy(stack=False)
+        for move in self.moves:
+            board.turn = self.color
+            board.push(move)
+        board.turn = self.color
+        return board
+
+    # squares the piece on from_sq could move to after the queued moves
+    def targets(self, board, from_sq):
+        ahead = self.board_after(board)
+        return frozenset(m.to_square for m in ahead.pseudo_legal_moves if m.from_square == from_sq)
+
+    # the player's piece on sq after the queued moves, for the first click of a premove
+    def own_piece(self, board, sq):
+        piece = self.board_after(board).piece_at(sq)
+        return piece is not None and piece.color == self.color
+
+    # queues a move, pawns reaching the last rank become queens. returns False if it can't be queued
+    def add(self, board, from_sq, to_sq):
+        if len(self.moves) >= self.max_moves:
+            return False
+        ahead = self.board_after(board)
+        for move in ahead.pseudo_legal_moves:
+            if move.from_square == from_sq and move.to_square == to_sq and move.promotion in (None, chess.QUEEN):
+                self.moves.append(move)
+                return True
+        return False
+
+    # the next premove if it is legal on the board now, it is taken off the queue
+    def pop_legal(self, board):
+        if not self.moves or board.turn != self.color:
+            return None
+        move = self.moves.pop(0)
+        if board.is_legal(move):
+            return move
+        self.clear()
+        return None
+
+    # from and to squares of every queued move, highlighted on the board
+    def squares(self):
+        return frozenset(sq for move in self.moves for sq in (move.from_square, move.to_square))
@@ -0,0 +1,371 @@
+import argparse, io, multiprocessing.util, os, signal, time
+from collections import OrderedDict, deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+import chess, chess.engine
+
+from engine_cache import limit_key
+from game_db import position_key, split_games
+from puzzles import PUZZLES_PATH, PuzzleStore
+
+# finds the blunders in finished games and turns them into puzzles for the puzzle mode (key p):
+#   python puzzle_miner.py game.pgn --workers 8 --time 0.1
+#   python puzzle_miner.py selfplay.chga --depth 12      binary archives (game_archive.py) work too
+#
+# every ply of every game is evaluated by a pool of worker processes, each running one UCI
+# engine (keep the engine single threaded, then the throughput grows with the worker count).
+# the main process walks the games and hands out positions in batches. positions are deduped by
+# zobrist hash before they are sent: a position reached in many games, or twice in one, is
+# evaluated once, and evaluations are kept in the puzzle database, so the next run (and a rerun
+# of the same games with the same engine and limit) finds them there.
+#
+# a move is a blunder when it costs the mover at least --threshold centipawns and the mover was
+# not already lost before it nor still clearly better after it. the puzzle is the position after
+# the blunder, and its solution the engine's line there, cut to end on a move of the solver.
+#
+# a game is marked as mined in the same transaction as its puzzles, so an interrupted run
+# (ctrl+c) picks up at the first game that was not finished. Chess960 games are skipped.
+
+# evaluations are clipped to +-10 pawns, a mate counts as the clip
+CAP = 1000
+# not a blunder if the mover was already this far behind, or is still this far ahead after it
+LOST = 300
+PV_PLIES = 8
+SOLUTION_PLIES = 5
+MEMORY_EVALS = 200000
+
+worker_engine = None
+
+
+def init_worker(command, options):
+    global worker_engine
+    # ctrl+c is for the main process, which stops handing out work and saves what is done.
+    # the engine is started after this, so it ignores it too
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    worker_engine = chess.engine.SimpleEngine.popen_uci(command)
+    if options:
+        worker_engine.configure(options)
+    multiprocessing.util.Finalize(worker_engine, worker_engine.quit, exitpriority=10)
+
+
+# worker: (cp, mate, pv) for each FEN, from the side to move's point of view
+def evaluate_batch(fens, limit):
+    results = []
+    for fen in fens:
+        info = worker_engine.analyse(chess.Board(fen), limit, info=chess.engine.INFO_SCORE | chess.engine.INFO_PV)
+        pv = " ".join(move.uci() for move in info.get("pv", [])[:PV_PLIES])
+        score = info.get("score")
+        if score is None:
+            results.append((None, None, pv))
+        elif score.relative.is_mate():
+            results.append((None, score.relative.mate(), pv))
+        else:
+            results.append((score.relative.score(), None, pv))
+    return results
+
+
+# evaluation of a position where the game is over, None if it is not
+def final_eval(board):
+    if board.is_checkmate():
+        return None, 0, ""
+    if board.is_stalemate() or board.is_insufficient_material():
+        return 0, None, ""
+    return None
+
+
+# centipawns for the side to move, clipped to +-CAP. mate 0 is being mated
+def value(evaluation):
+    cp, mate, _ = evaluation
+    if mate is not None:
+        return CAP if mate > 0 else -CAP
+    if cp is None:
+        return None
+    return max(-CAP, min(CAP, cp))
+
+
+# the moves of pv that are legal from fen, cut to an odd length (ending on the solver's move)
+def solution_line(fen, pv):
+    board = chess.Board(fen)
+    line = []
+    for uci in pv.split()[:SOLUTION_PLIES]:
+        move = chess.Move.from_uci(uci)
+        if move not in board.legal_moves:
+            break
+        board.push(move)
+        line.append(move)
+    return line[:len(line) - (1 - len(line) % 2)] if line else []
+
+
+# (ply, move, swing, solution) for every blunder of a game. evals[i] is the evaluation of the
+# position before moves[i] (evals[-1] the final position), fens the positions themselves
+def find_blunders(fens, moves, evals, threshold):
+    blunders = []
+    for ply, move in enumerate(moves):
+        before, after = value(evals[ply]), value(evals[ply + 1])
+        if before is None or after is None:
+            continue
+        # both from the mover's point of view
+        after = -after
+        swing = before - after
+        if swing < threshold or before <= -LOST or after >= LOST:
+            continue
+        solution = solution_line(fens[ply + 1], evals[ply + 1][2])
+        if solution:
+            blunders.append((ply, move, swing, solution))
+    return blunders
+
+
+# one game on its way through the pool: the positions of every ply and the evaluations that
+# are still missing, by key (a repeated position is one key with several plies)
+class GameJob:
+
+    def __init__(self, source, number, headers, fens, keys, moves):
+        self.source = source
+        self.number = number
+        self.headers = headers
+        self.fens = fens
+        self.keys = keys
+        self.moves = moves
+        self.evals = [None] * len(fens)
+        self.slots = {}
+        for ply, key in enumerate(keys):
+            self.slots.setdefault(key, []).append(ply)
+
+    def fill(self, key, evaluation):
+        for ply in self.slots.pop(key, ()):
+            self.evals[ply] = evaluation
+
+    @property
+    def done(self):
+        return not self.slots
+
+
+# finished games in, puzzles out. one instance per run: it owns the database connection, the
+# queue of positions waiting for a worker and the games waiting for their positions.
+
+class PuzzleMiner:
+
+    def __init__(self, store, engine, limit, workers=None, options=None, threshold=200, batch_size=8, progress=True):
+        self.store = store
+        self.db = store.db
+        self.engine = engine
+        self.limit = limit
+        self.workers = workers or os.cpu_count()
+        self.options = options or {}
+        self.threshold = threshold
+        self.batch_size = batch_size
+        self.progress = progress
+        # evaluations are only reused for the same engine and search limit
+        self.limits = f"{os.path.basename(str(engine))}|{limit_key(limit)}"
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS evals (
+                zobrist INTEGER NOT NULL,
+                limits TEXT NOT NULL,
+                cp INTEGER, mate INTEGER, pv TEXT,
+                PRIMARY KEY (zobrist, limits)
+            );
+            CREATE TABLE IF NOT EXISTS mined (
+                source TEXT NOT NULL,
+                number INTEGER NOT NULL,
+                plies INTEGER, puzzles INTEGER,
+                PRIMARY KEY (source, number)
+            );
+        """)
+
+        # recently used evaluations, the database has all of them
+        self.memory = OrderedDict()
+        # positions no worker has yet: (key, fen); games waiting for a position, by key
+        self.queue = deque()
+        self.waiting = {}
+        self.games = self.plies = self.evaluated = self.cached = self.found = 0
+        self.started = self.reported = None
+
+    def recall(self, key):
+        evaluation = self.memory.get(key)
+        if evaluation is not None:
+            self.memory.move_to_end(key)
+        return evaluation
+
+    def remember(self, key, evaluation):
+        self.memory[key] = evaluation
+        if len(self.memory) > MEMORY_EVALS:
+            self.memory.popitem(last=False)
+
+    # (source, number, headers, board, moves) of every game in the files that was not mined yet
+    def read_games(self, paths):
+        for path in paths:
+            source = os.path.abspath(path)
+            done = {row[0] for row in self.db.execute("SELECT number FROM mined WHERE source = ?", (source,))}
+            if path.endswith(".chga"):
+                from game_archive import ArchiveReader
+                reader = ArchiveReader(path)
+                for number in range(reader.count):
+                    if number not in done:
+                        headers = reader.headers(number)
+                        if "Variant" not in headers:
+                            yield source, number, headers, chess.Board(headers.get("FEN", chess.STARTING_FEN)), reader.moves(number)
+                reader.close()
+                continue
+            import chess.pgn
+            for number, (_, text) in enumerate(split_games(path)):
+                if number in done:
+                    continue
+                game = chess.pgn.read_game(io.StringIO(text))
+                if game is None or "Variant" in game.headers:
+                    continue
+                yield source, number, dict(game.headers), game.board(), list(game.mainline_moves())
+
+    # walks a game, takes what is known from memory and the database and queues the rest
+    def start(self, source, number, headers, board, moves):
+        fens, keys = [board.fen()], [position_key(board)]
+        finals = {}
+        for move in moves:
+            board.push(move)
+            fens.append(board.fen())
+            keys.append(position_key(board))
+        final = final_eval(board)
+        if final is not None:
+            finals[keys[-1]] = final
+        job = GameJob(source, number, headers, fens, keys, moves)
+        self.plies += len(fens)
+
+        known = {}
+        for key in job.slots:
+            evaluation = finals.get(key) or self.recall(key)
+            if evaluation is not None:
+                known[key] = evaluation
+        unknown = [key for key in job.slots if key not in known]
+        for i in range(0, len(unknown), 500):
+            chunk = unknown[i:i + 500]
+            rows = self.db.execute(
+                f"SELECT zobrist, cp, mate, pv FROM evals WHERE limits = ? AND zobrist IN ({','.join('?' * len(chunk))})",
+                [self.limits] + chunk).fetchall()
+            for key, cp, mate, pv in rows:
+                known[key] = (cp, mate, pv)
+                self.remember(key, known[key])
+        self.cached += sum(len(job.slots[key]) for key in known)
+        for key, evaluation in known.items():
+            job.fill(key, evaluation)
+
+        for key in list(job.slots):
+            if key not in self.waiting:
+                self.waiting[key] = []
+                self.queue.append((key, fens[job.slots[key][0]]))
+            self.waiting[key].append(job)
+        if job.done:
+            self.finish(job)
+
+    # a worker's results: stored, handed to the games waiting for them
+    def store_results(self, batch, results):
+        rows = []
+        for (key, _), evaluation in zip(batch, results):
+            rows.append((key, self.limits) + evaluation)
+            self.remember(key, evaluation)
+            for job in self.waiting.pop(key, ()):
+                job.fill(key, evaluation)
+                if job.done:
+                    self.finish(job)
+        self.db.executemany("INSERT OR REPLACE INTO evals VALUES (?, ?, ?, ?, ?)", rows)
+        self.evaluated += len(batch)
+
+    def finish(self, job):
+        blunders = find_blunders(job.fens, job.moves, job.evals, self.threshold)
+        added = 0
+        for ply, move, swing, solution in blunders:
+            added += self.store.add(job.keys[ply + 1], job.fens[ply + 1], solution, move, swing, job.source,
+                                    job.number, ply, job.headers.get("White"), job.headers.get("Black"))
+        self.db.execute("INSERT OR REPLACE INTO mined VALUES (?, ?, ?, ?)", (job.source, job.number, len(job.moves), added))
+        self.games += 1
+        self.found += added
+
+    # mines the games of the files, returns the counters. ctrl+c stops after the batches the
+    # workers are on, everything finished so far is kept
+    def run(self, paths):
+        self.started = self.reported = time.perf_counter()
+        games = self.read_games(paths)
+        exhausted = False
+        in_flight = {}
+        interrupted = False
+        pool = ProcessPoolExecutor(max_workers=self.workers, initializer=init_worker, initargs=(self.engine, self.options))
+        try:
+            while True:
+                # enough positions queued to keep every worker busy, the rest of the games wait
+                while not exhausted and len(self.queue) < self.batch_size * self.workers * 2:
+                    game = next(games, None)
+                    if game is None:
+                        exhausted = True
+                    else:
+                        self.start(*game)
+                while self.queue and len(in_flight) < self.workers * 2:
+                    batch = [self.queue.popleft() for _ in range(min(self.batch_size, len(self.queue)))]
+                    in_flight[pool.submit(evaluate_batch, [fen for _, fen in batch], self.limit)] = batch
+                if not in_flight:
+                    break
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    self.store_results(in_flight.pop(future), future.result())
+                self.db.commit()
+                self.report()
+        except KeyboardInterrupt:
+            interrupted = True
+            for future in in_flight:
+                future.cancel()
+        finally:
+            self.db.commit()
+            pool.shutdown(wait=True, cancel_futures=True)
+        self.report(final=True, interrupted=interrupted)
+        return self.stats(interrupted)
+
+    def stats(self, interrupted=False):
+        elapsed = time.perf_counter() - self.started
+        return {"games": self.games, "plies": self.plies, "evaluated": self.evaluated, "cached": self.cached,
+                "puzzles": self.found, "seconds": elapsed,
+                "positions_per_second": self.evaluated / elapsed if elapsed else 0.0, "interrupted": interrupted}
+
+    def report(self, final=False, interrupted=False):
+        if not self.progress:
+            return
+        now = time.perf_counter()
+        if not final and now - self.reported < 1:
+            return
+        self.reported = now
+        stats = self.stats()
+        line = (f"{stats['games']} games, {stats['evaluated']} positions evaluated, {stats['cached']} from the cache, "
+                f"{stats['puzzles']} puzzles, {stats['positions_per_second']:.1f} positions/sec")
+        if not final:
+            print("\r" + line, end="", flush=True)
+            return
+        print(f"\r{line} in {stats['seconds']:.1f}s")
+        if interrupted:
+            print("interrupted, run the same command again to continue")
+
+
+def main():
+    from selfplay import parse_options
+    parser = argparse.ArgumentParser(description="Find blunders in finished games and store them as puzzles.")
+    parser.add_argument("paths", nargs="*", default=["game.pgn"], help="PGN files or binary archives (.chga)")
+    parser.add_argument("--engine", default=os.environ.get("STOCKFISH_PATH"), help="path of the UCI engine")
+    parser.add_argument("--option", action="append", help='engine option, e.g. "Hash=64"')
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--time", type=float, help="engine seconds per position (default 0.1)")
+    parser.add_argument("--depth", type=int)
+    parser.add_argument("--nodes", type=int)
+    parser.add_argument("--threshold", type=int, default=200, help="centipawns a move must lose to be a blunder")
+    parser.add_argument("--batch", type=int, default=8, help="positions per task sent to a worker")
+    parser.add_argument("--db", default=PUZZLES_PATH)
+    args = parser.parse_args()
+
+    if not args.engine:
+        parser.error("--engine (or STOCKFISH_PATH) is required")
+    if args.time is None and args.depth is None and args.nodes is None:
+        args.time = 0.1
+    limit = chess.engine.Limit(time=args.time, depth=args.depth, nodes=args.nodes)
+
+    store = PuzzleStore(args.db)
+    miner = PuzzleMiner(store, args.engine, limit, args.workers, parse_options(args.option), args.threshold, args.batch)
+    miner.run(args.paths)
+    print(f"{store.count()} puzzles in {args.db}")
+    store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+import sqlite3
+import chess
+
+PUZZLES_PATH = "puzzles.sqlite"
+
+
+# one mined puzzle: the position after a blunder and the line that punishes it. solution
+# alternates the solver's moves and the replies, and always ends with a move of the solver
+class Puzzle:
+
+    def __init__(self, id, fen, solution, blunder, swing, white, black, solved, failed):
+        self.id = id
+        self.fen = fen
+        self.solution = [chess.Move.from_uci(uci) for uci in solution.split()]
+        self.blunder = blunder
+        self.swing = swing
+        self.white = white
+        self.black = black
+        self.solved = solved
+        self.failed = failed
+
+
+# the puzzles found by puzzle_miner.py, in a sqlite file that also holds the miner's evaluation
+# cache and the games it has finished. puzzles are unique per position (zobrist hash), so a
+# blunder repeated in several games is one puzzle.
+
+class PuzzleStore:
+
+    def __init__(self, path=PUZZLES_PATH):
+        self.path = path
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS puzzles (
+                id INTEGER PRIMARY KEY,
+                zobrist INTEGER NOT NULL UNIQUE,
+                fen TEXT NOT NULL,
+                solution TEXT NOT NULL,
+                blunder TEXT NOT NULL,
+                swing INTEGER NOT NULL,
+                source TEXT, game INTEGER, ply INTEGER,
+                white TEXT, black TEXT,
+                solved INTEGER NOT NULL DEFAULT 0,
+                failed INTEGER NOT NULL DEFAULT 0
+            )""")
+        self.db.commit()
+
+    # returns True when the position was not a puzzle yet. the caller commits
+    def add(self, zobrist, fen, solution, blunder, swing, source=None, game=None, ply=None, white=None, black=None):
+        cur = self.db.execute(
+            "INSERT OR IGNORE INTO puzzles (zobrist, fen, solution, blunder, swing, source, game, ply, white, black) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (zobrist, fen, " ".join(move.uci() for move in solution), blunder.uci(), swing,
+             source, game, ply, white, black))
+        return cur.rowcount == 1
+
+    # unsolved ones first, the biggest blunders first
+    def puzzles(self):
+        rows = self.db.execute(
+            "SELECT id, fen, solution, blunder, swing, white, black, solved, failed FROM puzzles "
+            "ORDER BY solved > 0, swing DESC, id").fetchall()
+        return [Puzzle(*row) for row in rows]
+
+    def record(self, puzzle, solved):
+        column = "solved" if solved else "failed"
+        self.db.execute(f"UPDATE puzzles SET {column} = {column} + 1 WHERE id = ?", (puzzle.id,))
+        self.db.commit()
+
+    def count(self):
+        return self.db.execute("SELECT COUNT(*) FROM puzzles").fetchone()[0]
+
+    def close(self):
+        self.db.close()
+
+
+# the puzzle mode's state, without pygame: which puzzle is shown, how far into its solution the
+# player is, and whether the last attempt was right. the game window plays the moves on a
+# board of its own and asks try_move() what to do with each of the player's moves.
+
+class PuzzleSession:
+
+    def __init__(self, store):
+        self.store = store
+        self.puzzles = store.puzzles()
+        self.index = 0
+        self.step = 0
+        # "solve", "wrong" (the last try was not the solution) or "solved"
+        self.state = "solve"
+        self.missed = False
+
+    @property
+    def puzzle(self):
+        return self.puzzles[self.index] if self.puzzles else None
+
+    def board(self):
+        return chess.Board(self.puzzle.fen)
+
+    # moves to the next puzzle (wrapping around) and returns it
+    def next(self):
+        if not self.puzzles:
+            return None
+        self.index = (self.index + 1) % len(self.puzzles)
+        self.step = 0
+        self.state = "solve"
+        self.missed = False
+        return self.puzzle
+
+    # returns (accepted, reply): accepted is False for a wrong move, which is not played;
+    # reply is the opponent's answer to play after a right one, None when the puzzle is solved.
+    # any move that mates counts, even when the engine's line mates another way
+    def try_move(self, board, move):
+        if self.state == "solved":
+            return False, None
+        wanted = self.puzzle.solution[self.step]
+        board.push(move)
+        mates = board.is_checkmate()
+        board.pop()
+        if move != wanted and not mates:
+            self.state = "wrong"
+            if not self.missed:
+                self.missed = True
+                self.store.record(self.puzzle, False)
+            return False, None
+        self.step += 1
+        if mates or self.step >= len(self.puzzle.solution):
+            self.state = "solved"
+            if not self.missed:
+                self.store.record(self.puzzle, True)
+            return True, None
+        self.state = "solve"
+        reply = self.puzzle.solution[self.step]
+        self.step += 1
+        return True, reply
+
+    # the prompt shown over the board
+    def status(self):
+        if self.puzzle is None:
+            return "No puzzles yet: python puzzle_miner.py game.pgn"
+        side = "White" if chess.Board(self.puzzle.fen).turn == chess.WHITE else "Black"
+        number = f"Puzzle {self.index + 1}/{len(self.puzzles)}"
+        if self.state == "solved":
+            return f"{number}: solved! n for the next one"
+        if self.state == "wrong":
+            return f"{number}: not the best move, try again (n skips)"
+        return f"{number}: {side} to play, find the best move"
+
+
+# one line of text at the top of the board for the puzzle mode, same overlay protocol as the
+# clock faces: update() re-renders it when the text changed and returns the area to repaint
+
+class PuzzleOverlay:
+
+    def __init__(self, session, square):
+        import pygame
+        self.pygame = pygame
+        self.session = session
+        self.square = square
+        self.font = pygame.font.SysFont(None, max(16, square // 3))
+        self.visible = False
+        self.surface = None
+        self.shown = None
+
+    def toggle(self):
+        covered = self.rect()
+        self.visible = not self.visible
+        self.shown = None
+        self.surface = None
+        return covered
+
+    def resize(self, square):
+        covered = self.rect()
+        self.square = square
+        self.font = self.pygame.font.SysFont(None, max(16, square // 3))
+        self.shown = None
+        return covered
+
+    def next_refresh(self):
+        return None
+
+    def rect(self):
+        if self.surface is None:
+            return self.pygame.Rect(0, 0, 0, 0)
+        return self.surface.get_rect(midtop=(self.square * 4, 4))
+
+    def update(self):
+        if not self.visible:
+            return None
+        shown = (self.session.status(), self.session.state)
+        if shown == self.shown:
+            return None
+        self.shown = shown
+        old = self.rect()
+        color = {"solved": (20, 120, 40), "wrong": (150, 30, 30)}.get(shown[1], (0, 0, 0))
+        text = self.font.render(shown[0], True, (255, 255, 255))
+        surface = self.pygame.Surface((text.get_width() + 16, text.get_height() + 8))
+        surface.fill(color)
+        surface.blit(text, (8, 4))
+        self.surface = surface
+        return old.union(self.rect())
+
+    def draw(self, screen):
+        rect = self.rect()
+        screen.blit(self.surface, rect)
+        return rect
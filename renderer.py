@@ -0,0 +1,142 @@
+import pygame
+
+LIGHT = (255, 213, 153)
+DARK = (177, 110, 65)
+CHECK_COLOR = (255, 0, 0, 90)
+PREMOVE_COLOR = (40, 90, 220, 110)
+
+
+# incremental board renderer. the empty board is rendered once into a background
+# surface, and every frame only the squares whose contents changed are repainted.
+# render() returns the list of dirty rects so the caller can pass them to
+# pygame.display.update() instead of flipping the whole window.
+
+class BoardRenderer:
+
+    def __init__(self, images, square=100):
+        self.images = images
+        self.square = square
+        self.font = pygame.font.SysFont(None, 28)
+        self.background = self.render_background()
+
+        self.check_overlay = pygame.Surface((square, square), pygame.SRCALPHA)
+        self.check_overlay.fill(CHECK_COLOR)
+        self.premove_overlay = pygame.Surface((square, square), pygame.SRCALPHA)
+        self.premove_overlay.fill(PREMOVE_COLOR)
+
+        # what each of the 64 squares currently shows on screen, indexed row * 8 + col
+        self.drawn = [None] * 64
+        self.full_redraw = True
+        # squares an overlay covered, and the highlights of the last frame, for render(changed=...)
+        self.stale = set()
+        self.marked = frozenset()
+        self.queued = frozenset()
+        self.check_index = None
+
+    # pre-renders the 64 empty squares into one surface
+    def render_background(self):
+        size = self.square * 8
+        surface = pygame.Surface((size, size)).convert()
+        for row in range(8):
+            for col in range(8):
+                color = LIGHT if (row + col) % 2 == 0 else DARK
+                pygame.draw.rect(surface, color, (col * self.square, row * self.square, self.square, self.square))
+        return surface
+
+    # switches to a new square size (window resized), everything is repainted
+    def resize(self, square, images):
+        self.images = images
+        self.square = square
+        self.background = self.render_background()
+        self.check_overlay = pygame.Surface((square, square), pygame.SRCALPHA)
+        self.check_overlay.fill(CHECK_COLOR)
+        self.premove_overlay = pygame.Surface((square, square), pygame.SRCALPHA)
+        self.premove_overlay.fill(PREMOVE_COLOR)
+        self.invalidate()
+
+    # forces every square to be repainted on the next render (window exposed, end screen, reset)
+    def invalidate(self):
+        self.full_redraw = True
+
+    # forces the squares under an area to be repainted, e.g. after an overlay covered them
+    def invalidate_area(self, rect):
+        if rect.width <= 0 or rect.height <= 0:
+            return
+        first_col, first_row = max(0, rect.left // self.square), max(0, rect.top // self.square)
+        last_col, last_row = min(7, (rect.right - 1) // self.square), min(7, (rect.bottom - 1) // self.square)
+        for row in range(first_row, last_row + 1):
+            for col in range(first_col, last_col + 1):
+                self.drawn[row * 8 + col] = None
+                self.stale.add(row * 8 + col)
+
+    def square_rect(self, row, col):
+        return pygame.Rect(col * self.square, row * self.square, self.square, self.square)
+
+    # draws the board and returns the rects that changed since the last call.
+    # targets are the squares to mark for the selected piece and position is the PositionState
+    # of board_obj, which supplies the check highlight without recomputing it every frame.
+    # a square is repainted when its piece, its legal-move marker or its check highlight changed,
+    # which covers from/to squares, castling rooks, en passant victims and selection markers.
+    # premoves is the set of squares highlighted for queued premoves.
+    # board holds the 64 piece codes indexed row * 8 + col (square ^ 56). changed, when given, is
+    # the set of indices whose pieces changed since the last render (BoardMirror deltas); only
+    # those and the squares whose highlights changed are compared instead of all 64.
+    def render(self, screen, board, targets=None, position=None, premoves=frozenset(), changed=None):
+        check_index = None
+        if position is not None and position.check_square is not None:
+            check_index = position.check_square ^ 56
+
+        marked = frozenset()
+        if targets and self.images.get('identifier'):
+            marked = frozenset(to_sq ^ 56 for to_sq in targets)
+
+        queued = frozenset(sq ^ 56 for sq in premoves)
+
+        full = self.full_redraw
+        if full or changed is None:
+            indices = range(64)
+        else:
+            indices = set(changed)
+            indices |= self.stale
+            indices |= marked ^ self.marked
+            indices |= queued ^ self.queued
+            if check_index != self.check_index:
+                indices.update(i for i in (check_index, self.check_index) if i is not None)
+        self.stale.clear()
+        self.marked, self.queued, self.check_index = marked, queued, check_index
+
+        dirty = []
+        for index in indices:
+            row, col = divmod(index, 8)
+            state = (board[index], index in marked, index == check_index, index in queued)
+            if not full and self.drawn[index] == state:
+                continue
+            self.drawn[index] = state
+            rect = self.square_rect(row, col)
+            self.draw_square(screen, rect, state)
+            dirty.append(rect)
+
+        self.full_redraw = False
+        if full:
+            return [pygame.Rect(0, 0, self.square * 8, self.square * 8)]
+        return dirty
+
+    def draw_square(self, screen, rect, state):
+        piece, marked, in_check, premove = state
+        screen.blit(self.background, rect.topleft, rect)
+
+        if in_check:
+            screen.blit(self.check_overlay, rect.topleft)
+        if premove:
+            screen.blit(self.premove_overlay, rect.topleft)
+
+        if piece:
+            img = self.images.get(piece)
+            if img:
+                screen.blit(img, rect.topleft)
+            else:
+                lbl = self.font.render(piece, True, (255, 0, 0))
+                screen.blit(lbl, (rect.x + 8, rect.y + 8))
+
+        if marked:
+            screen.blit(self.images['identifier'], rect.topleft)
@@ -0,0 +1,133 @@
+import argparse, multiprocessing.util, os, random, time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import chess, chess.engine
+
+from game_driver import GameDriver
+from builtin_engine import BuiltinEngine
+
+# headless engine-vs-engine / engine-vs-player runner for strength and regression runs.
+# games are spread over a process pool, every worker process starts one engine and keeps it
+# for all the games it plays.
+#
+#   python selfplay.py --games 32 --workers 8 --engine stockfish --white engine --black random
+#
+# players: "engine" is the UCI engine, "builtin" the pure-python engine, "random" plays random legal moves.
+
+PLAYERS = ("engine", "builtin", "random")
+
+worker_engine = None
+worker_builtin = None
+
+
+def init_worker(engine_path, options):
+    global worker_engine, worker_builtin
+    worker_builtin = BuiltinEngine()
+    if engine_path:
+        worker_engine = chess.engine.SimpleEngine.popen_uci(engine_path)
+        if options:
+            worker_engine.configure(options)
+        # the engine's io thread would otherwise keep the worker alive at pool shutdown
+        multiprocessing.util.Finalize(worker_engine, worker_engine.quit, exitpriority=10)
+
+
+# the built-in player: a uniformly random legal move
+def random_move(board, rng):
+    return rng.choice(list(board.legal_moves))
+
+
+# plays one full game in a worker and returns its PGN and counters
+def play_game(index, white, black, move_time, max_plies, seed):
+    rng = random.Random(seed + index)
+    driver = GameDriver(white=white, black=black, event="Self-play")
+    driver.headers["Round"] = str(index + 1)
+    limit = chess.engine.Limit(time=move_time)
+    nodes = 0
+    start = time.perf_counter()
+
+    while not driver.is_over(max_plies):
+        player = white if driver.turn == chess.WHITE else black
+        if player in ("engine", "builtin"):
+            engine = worker_engine if player == "engine" else worker_builtin
+            result = engine.play(driver.board, limit, info=chess.engine.INFO_BASIC)
+            nodes += result.info.get("nodes", 0)
+            move = result.move
+        else:
+            move = random_move(driver.board, rng)
+        driver.push(move)
+
+    return {
+        "index": index,
+        "pgn": driver.pgn(),
+        "headers": dict(driver.headers),
+        "moves": list(driver.board.move_stack),
+        "result": driver.result(),
+        "plies": len(driver.sans),
+        "nodes": nodes,
+        "seconds": time.perf_counter() - start,
+    }
+
+
+def parse_options(pairs):
+    options = {}
+    for pair in pairs or []:
+        name, _, value = pair.partition("=")
+        options[name.strip()] = int(value) if value.strip().lstrip("-").isdigit() else value.strip()
+    return options
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run headless self-play games in parallel.")
+    parser.add_argument("--games", type=int, default=8)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--engine", default=os.environ.get("STOCKFISH_PATH"), help="path of the UCI engine")
+    parser.add_argument("--option", action="append", help='engine option, e.g. "Skill Level=5"')
+    parser.add_argument("--white", choices=PLAYERS, default="engine")
+    parser.add_argument("--black", choices=PLAYERS, default="engine")
+    parser.add_argument("--time", type=float, default=0.05, help="engine seconds per move")
+    parser.add_argument("--max-plies", type=int, default=400)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default="selfplay.pgn")
+    parser.add_argument("--binary", help="also append the games to this binary archive (see game_archive.py)")
+    args = parser.parse_args()
+
+    uses_engine = "engine" in (args.white, args.black)
+    if uses_engine and not args.engine:
+        parser.error("--engine (or STOCKFISH_PATH) is required when a side is played by the engine")
+    engine_path = args.engine if uses_engine else None
+
+    results = {"1-0": 0, "0-1": 0, "1/2-1/2": 0, "*": 0}
+    plies = nodes = 0
+    start = time.perf_counter()
+    archive = None
+    if args.binary:
+        from game_archive import ArchiveWriter
+        archive = ArchiveWriter(args.binary)
+
+    with open(args.out, "w") as out, ProcessPoolExecutor(
+            max_workers=args.workers, initializer=init_worker,
+            initargs=(engine_path, parse_options(args.option))) as pool:
+        futures = [pool.submit(play_game, i, args.white, args.black, args.time, args.max_plies, args.seed)
+                   for i in range(args.games)]
+        for future in as_completed(futures):
+            game = future.result()
+            print(game["pgn"], file=out, end="\n\n")
+            if archive is not None:
+                archive.add(game["moves"], dict(game["headers"], Result=game["result"]))
+            results[game["result"]] += 1
+            plies += game["plies"]
+            nodes += game["nodes"]
+            print(f"game {game['index'] + 1}: {game['result']} in {game['plies']} plies ({game['seconds']:.1f}s)")
+
+    if archive is not None:
+        archive.close()
+    elapsed = time.perf_counter() - start
+    print(f"{args.games} games in {elapsed:.1f}s with {args.workers} workers")
+    print(f"games/sec: {args.games / elapsed:.2f}   plies/sec: {plies / elapsed:.1f}   nodes/sec: {nodes / elapsed:.0f}")
+    print(f"results: +{results['1-0']} -{results['0-1']} ={results['1/2-1/2']}  (unfinished {results['*']})")
+    print(f"PGNs written to {args.out}")
+    if archive is not None:
+        print(f"games appended to {args.binary} ({archive.count} in total)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+import os, hashlib, time
+import pygame
+from collections import OrderedDict
+
+BASE = os.path.dirname(os.path.abspath(__file__))
+IMG_DIR = os.path.join(BASE, 'imgs')
+CACHE_DIR = os.path.join(BASE, '.cache', 'atlas')
+
+# the 12 pieces and the legal-move marker, in atlas order
+SPRITE_CODES = ['wp','wr','wn','wb','wq','wk','bp','br','bn','bb','bq','bk','identifier']
+
+
+# all sprites packed side by side into one surface, scaled once per square size.
+# a scaled atlas is cached on disk under a key made of the size and the source files'
+# mtimes, so later starts only decode one PNG instead of decoding and smoothscaling 13.
+# the last few sizes also stay in memory, so resizing the window back and forth is free,
+# and only the last keep_files sizes stay on disk.
+# while the window is being dragged, resized() scales an atlas already in memory (about a
+# millisecond) and the real one is only built for the size the window settles on.
+
+class SpriteAtlas:
+
+    def __init__(self, img_dir=IMG_DIR, cache_dir=CACHE_DIR, keep=4, keep_files=4, settle=0.3):
+        self.img_dir = img_dir
+        self.cache_dir = cache_dir
+        self.keep = keep
+        self.keep_files = keep_files
+        self.settle = settle
+        self.settle_size = None
+        self.settle_at = None
+        self.atlases = OrderedDict()
+        self.present = [code for code in SPRITE_CODES if os.path.exists(self.source_path(code))]
+        self.source_key = self.make_source_key()
+
+    def source_path(self, code):
+        return os.path.join(self.img_dir, f"{code}.png")
+
+    # changes whenever a source image is added, removed or touched
+    def make_source_key(self):
+        h = hashlib.sha1()
+        for code in self.present:
+            st = os.stat(self.source_path(code))
+            h.update(f"{code}:{st.st_mtime_ns}:{st.st_size};".encode())
+        return h.hexdigest()[:16]
+
+    def cache_path(self, size):
+        return os.path.join(self.cache_dir, f"atlas-{size}-{self.source_key}.png")
+
+    # scales every source image and packs them into one surface
+    def build(self, size):
+        atlas = pygame.Surface((size * len(self.present), size), pygame.SRCALPHA)
+        for i, code in enumerate(self.present):
+            img = pygame.image.load(self.source_path(code)).convert_alpha()
+            atlas.blit(pygame.transform.smoothscale(img, (size, size)), (i * size, 0))
+        return atlas
+
+    def load(self, size):
+        path = self.cache_path(size)
+        if os.path.exists(path):
+            try:
+                atlas = pygame.image.load(path).convert_alpha()
+                # the mtime orders the files for prune()
+                os.utime(path)
+                return atlas
+            except (OSError, pygame.error):
+                pass
+
+        atlas = self.build(size)
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            # write then rename, so a crash never leaves a half-written atlas behind
+            tmp = path + ".tmp.png"
+            pygame.image.save(atlas, tmp)
+            os.replace(tmp, path)
+            self.prune()
+        except (OSError, pygame.error) as e:
+            print("Could not cache sprite atlas:", e)
+        return atlas
+
+    # deletes the atlases of changed source images and all but the keep_files latest sizes
+    def prune(self):
+        files = []
+        for name in os.listdir(self.cache_dir):
+            if not (name.startswith("atlas-") and name.endswith(".png")):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            if name.endswith(f"-{self.source_key}.png"):
+                files.append((os.path.getmtime(path), path))
+            else:
+                os.remove(path)
+        files.sort(reverse=True)
+        for _, path in files[self.keep_files:]:
+            os.remove(path)
+
+    def atlas(self, size):
+        atlas = self.atlases.get(size)
+        if atlas is None:
+            atlas = self.load(size)
+            self.atlases[size] = atlas
+            if len(self.atlases) > self.keep:
+                self.atlases.popitem(last=False)
+        else:
+            self.atlases.move_to_end(size)
+        return atlas
+
+    # same dict load_images returns: piece code (and 'identifier') -> surface or None
+    def images(self, size):
+        return self.split(self.atlas(size), size)
+
+    # for a window resize: the atlas in memory, or one scaled from the closest bigger atlas in
+    # memory without touching the source images or the disk. the real atlas for the size
+    # follows from settled() once no resize came for `settle` seconds
+    def resized(self, size, now=None):
+        if size in self.atlases or not self.atlases:
+            self.settle_at = None
+            return self.images(size)
+        bigger = [s for s in self.atlases if s >= size]
+        source = self.atlases[min(bigger) if bigger else max(self.atlases)]
+        self.settle_size = size
+        self.settle_at = (time.perf_counter() if now is None else now) + self.settle
+        return self.split(pygame.transform.smoothscale(source, (size * len(self.present), size)), size)
+
+    # when the next settled() is due, for the event loop's wait
+    def next_refresh(self):
+        return self.settle_at
+
+    # (size, images) of the real atlas once the window stopped resizing, otherwise None
+    def settled(self, now):
+        if self.settle_at is None or now < self.settle_at:
+            return None
+        self.settle_at = None
+        return self.settle_size, self.images(self.settle_size)
+
+    def split(self, atlas, size):
+        imgs = {code: None for code in SPRITE_CODES}
+        for i, code in enumerate(self.present):
+            imgs[code] = atlas.subsurface((i * size, 0, size, size))
+        return imgs
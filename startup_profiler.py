@@ -0,0 +1,55 @@
+import time, threading
+from contextlib import contextmanager
+
+# time from process start (well, from the first import of this module, which chessV2 does
+# before anything else) to the first frame, split by phase. phases on the main thread are
+# recorded with mark(), background work (engine spawn) with the phase() context manager.
+
+class StartupProfiler:
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.last = self.start
+        self.marks = []
+        self.background = []
+        self.lock = threading.Lock()
+        self.enabled = False
+        self.first_frame = None
+
+    # ends the current main-thread phase and names it
+    def mark(self, name):
+        now = time.perf_counter()
+        self.marks.append((name, now - self.last))
+        self.last = now
+
+    @contextmanager
+    def phase(self, name):
+        begin = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            with self.lock:
+                self.background.append((name, begin - self.start, end - begin))
+            if self.enabled:
+                print(f"[startup] {name}: {(end - begin) * 1000:.1f} ms "
+                      f"(ready {(end - self.start) * 1000:.1f} ms after start)")
+
+    def frame_drawn(self):
+        if self.first_frame is not None:
+            return
+        self.mark("first frame")
+        self.first_frame = self.last - self.start
+        if self.enabled:
+            self.report()
+
+    def report(self):
+        print(f"[startup] time to first frame: {self.first_frame * 1000:.1f} ms")
+        for name, seconds in self.marks:
+            print(f"[startup]   {name:28} {seconds * 1000:8.1f} ms")
+        with self.lock:
+            for name, began, seconds in self.background:
+                print(f"[startup]   {name + ' (background)':28} {seconds * 1000:8.1f} ms, started at {began * 1000:.1f} ms")
+
+
+profiler = StartupProfiler()
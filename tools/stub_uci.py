@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+# minimal UCI engine used to test the engine plumbing without stockfish.
+# it answers the protocol (uci, isready, setoption, position, go, stop, ponderhit, quit),
+# streams info lines while searching (one per line with MultiPV) and picks a deterministic move:
+# the most valuable capture, otherwise the first legal move in uci order. the score is the
+# material balance for the side to move after that capture, so hanging a piece shows up as an
+# eval swing. the search "thinks" for the requested movetime or until the requested depth,
+# capped by the STUB_MAX_THINK environment variable (seconds).
+
+import os, sys, threading, time
+import chess
+
+VALUES = {chess.PAWN: 1, chess.KNIGHT: 3, chess.BISHOP: 3, chess.ROOK: 5, chess.QUEEN: 9, chess.KING: 0}
+MAX_THINK = float(os.environ.get("STUB_MAX_THINK", "0.2"))
+
+out_lock = threading.Lock()
+
+
+def out(line):
+    with out_lock:
+        sys.stdout.write(line + "\n")
+        sys.stdout.flush()
+
+
+def gain(board, m):
+    captured = board.piece_at(m.to_square)
+    return VALUES[captured.piece_type] if captured else (1 if board.is_en_passant(m) else 0)
+
+
+# legal moves best first: the most valuable capture, ties in uci order
+def ranked(board):
+    return sorted(sorted(board.legal_moves, key=lambda m: m.uci()), key=lambda m: gain(board, m), reverse=True)
+
+
+# material of the side to move minus the opponent's, in pawns
+def material(board):
+    return sum(VALUES[p.piece_type] * (1 if p.color == board.turn else -1) for p in board.piece_map().values())
+
+
+def pick(board):
+    moves = ranked(board)
+    return moves[0] if moves else None
+
+
+class Search:
+
+    def __init__(self, board, think, wait_for_stop, multipv=1, max_depth=None):
+        self.board = board
+        self.max_depth = max_depth
+        self.multipv = multipv
+        self.think = think
+        self.wait_for_stop = wait_for_stop
+        self.stop_event = threading.Event()
+        self.ponderhit_event = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        move = pick(self.board)
+        start = time.time()
+        depth = 0
+        balance = material(self.board)
+        while True:
+            depth += 1
+            for k, first in enumerate(ranked(self.board)[:self.multipv]):
+                after = self.board.copy(stack=False)
+                after.push(first)
+                reply = pick(after)
+                pv = first.uci() + (" " + reply.uci() if reply else "")
+                nodes = depth * 1000
+                line = f" multipv {k + 1}" if self.multipv > 1 else ""
+                score = 100 * (balance + gain(self.board, first)) - 10 * k
+                out(f"info depth {depth}{line} score cp {score} nodes {nodes} nps 100000 pv {pv}")
+            if self.max_depth is not None and depth >= self.max_depth and not self.wait_for_stop:
+                break
+            if self.stop_event.wait(0.02):
+                break
+            if self.ponderhit_event.is_set():
+                self.wait_for_stop = False
+                self.ponderhit_event.clear()
+                start = time.time()
+            if not self.wait_for_stop and time.time() - start >= self.think:
+                break
+
+        if move is None:
+            out("bestmove (none)")
+            return
+        after = self.board.copy(stack=False)
+        after.push(move)
+        reply = pick(after)
+        out(f"bestmove {move.uci()}" + (f" ponder {reply.uci()}" if reply else ""))
+
+
+def main():
+    board = chess.Board()
+    search = None
+    multipv = 1
+    for line in sys.stdin:
+        parts = line.split()
+        if not parts:
+            continue
+        cmd = parts[0]
+        if cmd == "uci":
+            out("id name StubUCI")
+            out("id author python-chess-game")
+            out("option name Skill Level type spin default 20 min 0 max 20")
+            out("option name Ponder type check default false")
+            out("option name MultiPV type spin default 1 min 1 max 500")
+            out("uciok")
+        elif cmd == "setoption" and "name" in parts and "value" in parts:
+            name = " ".join(parts[parts.index("name") + 1:parts.index("value")])
+            if name == "MultiPV":
+                multipv = max(1, int(parts[parts.index("value") + 1]))
+        elif cmd == "isready":
+            out("readyok")
+        elif cmd == "ucinewgame":
+            board = chess.Board()
+        elif cmd == "position":
+            if parts[1] == "startpos":
+                board = chess.Board()
+                rest = parts[2:]
+            else:
+                end = parts.index("moves") if "moves" in parts else len(parts)
+                board = chess.Board(" ".join(parts[2:end]))
+                rest = parts[end:]
+            for uci in rest[1:]:
+                board.push_uci(uci)
+        elif cmd == "go":
+            args = dict(zip(parts[1::2], parts[2::2]))
+            think = MAX_THINK
+            if "movetime" in args:
+                think = min(think, int(args["movetime"]) / 1000)
+            wait = "infinite" in parts or "ponder" in parts
+            depth = int(args["depth"]) if "depth" in args else None
+            search = Search(board.copy(), think, wait, multipv, depth)
+        elif cmd == "stop" and search:
+            search.stop_event.set()
+            search.thread.join()
+            search = None
+        elif cmd == "ponderhit" and search:
+            search.ponderhit_event.set()
+        elif cmd == "quit":
+            if search:
+                search.stop_event.set()
+            break
+
+
+if __name__ == "__main__":
+    main()